@@ -1,69 +1,118 @@
 #-----------------------------------------------------------------
-# pycparser: func_defs.py
+# File6: whole program caller/callee report
 #
-# Using pycparser for printing out all the functions defined in a
-# C file.
+# Builds the call graph of a C file or project once and ranks every
+# function by how exposed it is: fan-in, fan-out, how many functions
+# can reach it and how many entry points it is reachable from.
+# The top of the ranking is where to start triaging sinks.
 #
-# This is a simple example of traversing the AST generated by
-# pycparser. Call it from the root directory of pycparser.
-#
-# Eli Bendersky [http://eli.thegreenplace.net]
+# Started from pycparser's func_defs.py example by Eli Bendersky
 # License: BSD
 #-----------------------------------------------------------------
 from __future__ import print_function
-import sys
+import sys, os, json, argparse
 
 # This is not required if you've installed pycparser into
 # your site-packages/ with setup.py
 sys.path.extend(['.', '..'])
 
-from pycparser import c_parser, c_ast, parse_file
-
-nodelist=[]
-# A simple visitor for FuncDef nodes that prints the names and
-# locations of function definitions.
-class FuncDefVisitor(c_ast.NodeVisitor):
-    def __init__(self, funcname):
-        self.funcname = funcname
-    def visit_FuncDef(self, node):
-	count=0
-	count+=1
-	print(" ")	
-	print("#############In", node.decl.name , "function##########")
-	print(" ")
-	
-        #print('%s at %s in %s also %s in %s can we %s' % (node.decl.name, node.decl.coord, node.decl.storage,node.decl.funcspec, node.decl.bitsize, node.coord))
-	
-	print('%s at %s in %s ' % (node.decl.name, node.decl.coord,	node.decl.storage))
-
-	Caller=node.decl.name
-	for i, child in enumerate(node.body.block_items or []):
-			nodelist.append(("block_items[%d]" % i, child))
-			
-	#p=tuple(nodelist)
-	#print(p)
-	#print ("Harsha Rocks!!!")
-	callee= nodelist[0][1].name.name
-	location= node.decl.coord
-	if (str(callee) != str(Caller) and str(callee)== str(funcname)):
-		print(callee , "called by" , Caller , "at location" , location)
-	
-		
-	
-
-def show_func_defs(filename, funcname):
-    # Note that cpp is used. Provide a path to your own cpp or
-    # make sure one exists in PATH.
-    ast = parse_file(filename, use_cpp=True,
-                     cpp_args=r'-Iutils/fake_libc_include')
-
-    v = FuncDefVisitor(funcname)
-    v.visit(ast)
+from parseCache import ParseCache, DEFAULT_MAX_BYTES, parseFile
+from projectParser import parseProject
+from callMatrix import CallMatrix
+import profiler
+
+
+#What the report can be ranked by, see CallMatrix
+RANK_KEYS = ('entries', 'reachedBy', 'fanIn', 'reaches', 'fanOut');
+
+
+def loadIndex(path, cppArgs=(), processes=None, cache=None):
+	"""The CallSiteIndex of a C file, or of every C file of a directory / compile_commands.json"""
+	if (os.path.isfile(path) and path.endswith('.c')):
+		if (cache is not None):
+			return cache.parse(path, cppArgs=cppArgs)[1];
+		return parseFile(path, cppArgs=cppArgs)[1];
+	return parseProject(path, processes=processes, cppArgs=cppArgs, cache=cache).index;
+
+
+def callersOf(index, funcname):
+	"""'callee called by Caller at location' for every call to funcname"""
+	lines = [];
+	for site in index.callSites(funcname):
+		if (site.caller() != funcname):
+			lines.append(funcname + " called by " + str(site.caller()) + " at location " + str(site.node.coord) + (" (through a pointer)" if site.indirect else ""));
+	return lines;
+
+
+def report(index, matrix, rankBy='entries', top=None, definedOnly=False):
+	"""[{function, defined, calls, fanIn, fanOut, reachedBy, reaches, entries, recursive}] ranked by rankBy, the first 'top' of them"""
+	graph = matrix.graph;
+	rows = [];
+	for functionID in matrix.ranking(rankBy).tolist():
+		name = graph.functions[functionID];
+		defined = name in index.funcDefs;
+		if (definedOnly and not defined):
+			continue;
+		rows.append({
+			'function': name,
+			'defined': defined,
+			'calls': len(index.callSites(name)),
+			'fanIn': int(matrix.fanIn[functionID]),
+			'fanOut': int(matrix.fanOut[functionID]),
+			'reachedBy': int(matrix.reachedBy[functionID]),
+			'reaches': int(matrix.reaches[functionID]),
+			'entries': int(matrix.entries[functionID]),
+			'recursive': bool(matrix.recursive[functionID]),
+		});
+		if (top is not None and len(rows) >= top):
+			break;
+	return rows;
+
+
+def printReport(rows):
+	print("%5s  %-32s %7s %7s %7s %9s %9s %7s" % ("rank", "function", "calls", "fanIn", "fanOut", "reachedBy", "reaches", "entries"));
+	for rank, row in enumerate(rows):
+		name = row['function'] + ("" if row['defined'] else " (extern)") + (" (recursive)" if row['recursive'] else "");
+		print("%5d  %-32s %7d %7d %7d %9d %9d %7d" % (rank + 1, name, row['calls'], row['fanIn'], row['fanOut'], row['reachedBy'], row['reaches'], row['entries']));
 
 
 if __name__ == "__main__":
-    if len(sys.argv) > 1:
-        filename  = sys.argv[1]
-	funcname  = sys.argv[2]
-    show_func_defs(filename, funcname)
-    	
+	parser = argparse.ArgumentParser(description="Caller/callee report: ranks every function of a C file or project by fan-in, fan-out and reachability");
+	parser.add_argument('path', help="C file, directory of C files or compile_commands.json");
+	parser.add_argument('funcname', nargs='?', help="Also list every call to this function and who makes it");
+	parser.add_argument('--rank', choices=RANK_KEYS, default='entries', help="What the ranking is by, the other numbers break ties");
+	parser.add_argument('--top', type=int, default=30, help="Functions listed (0 for all of them)");
+	parser.add_argument('--defined-only', action='store_true', help="Leave out functions that are only called, never defined (library calls)");
+	parser.add_argument('--include', action='append', default=[], help="Extra include directory for cpp, e.g. utils/fake_libc_include");
+	parser.add_argument('--jobs', type=int, default=None, help="Processes used to parse a project (default: one per core)");
+	parser.add_argument('--cache-dir', help="Keep parsed ASTs in this directory and reuse them while the source is unchanged");
+	parser.add_argument('--cache-size', type=int, default=DEFAULT_MAX_BYTES // (1024 * 1024), help="Size cap of the parse cache in MB");
+	parser.add_argument('--json', help="Also write the ranked report as JSON to this file");
+	parser.add_argument('--profile', action='store_true', help="Print the time of every phase to stderr");
+	args = parser.parse_args();
+
+	profile = profiler.enable() if args.profile else None;
+	cache = ParseCache(args.cache_dir, args.cache_size * 1024 * 1024) if args.cache_dir else None;
+	index = loadIndex(args.path, ['-I' + directory for directory in args.include], args.jobs, cache);
+
+	with profiler.phase('callGraph'):
+		graph = index.callGraph();
+	with profiler.phase('matrix'):
+		matrix = CallMatrix(graph);
+
+	rows = report(index, matrix, args.rank, args.top or None, args.defined_only);
+	print(str(len(graph.functions)) + " functions, " + str(len(index.funcDefs)) + " defined, " + str(len(graph.members)) + " call graph components");
+	printReport(rows);
+
+	if (args.funcname):
+		print();
+		for line in callersOf(index, args.funcname) or [args.funcname + " is never called"]:
+			print(line);
+
+	if (args.json):
+		with open(args.json, 'w') as f:
+			json.dump(rows, f, indent=1);
+
+	if (profile is not None):
+		profile.finish();
+		print(profile.summary(), file=sys.stderr);
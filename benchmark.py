@@ -0,0 +1,335 @@
+from __future__ import print_function
+import sys, os, gc, time, json, random, shutil, platform, tempfile, subprocess, argparse
+
+# This is not required if you've installed pycparser into
+# your site-packages/ with setup.py
+sys.path.extend(['.', '..'])
+
+try:
+	import pycparser
+except ImportError:
+	print("Please install PyCParser");
+	sys.exit(1);
+
+from main import AnalysisSession
+from projectParser import parseProject
+from graphExport import exportCFG, FORMATS
+from cfgGraph import importNumPy
+import profiler
+
+
+#Every stage of a run, in the order they run
+STAGES = ('parse', 'trace', 'paths', 'export');
+
+#Control flow a call can be nested in, cycled through level by level
+CONSTRUCTS = ('if', 'switch', 'for', 'while');
+
+#Named sets of cases, a case being the arguments of generateProgram
+SUITES = {
+	'quick': [
+		{'name': 'small', 'functions': 200, 'fanIn': 2, 'fanOut': 2, 'depth': 2, 'recursion': 0.05, 'files': 1},
+		{'name': 'project', 'functions': 400, 'fanIn': 2, 'fanOut': 2, 'depth': 2, 'recursion': 0.05, 'files': 8},
+	],
+	'full': [
+		{'name': 'small', 'functions': 200, 'fanIn': 2, 'fanOut': 2, 'depth': 2, 'recursion': 0.05, 'files': 1},
+		{'name': 'project', 'functions': 400, 'fanIn': 2, 'fanOut': 2, 'depth': 2, 'recursion': 0.05, 'files': 8},
+		{'name': 'wideFanIn', 'functions': 1000, 'fanIn': 8, 'fanOut': 1, 'depth': 1, 'recursion': 0.0, 'files': 1},
+		{'name': 'deepNesting', 'functions': 500, 'fanIn': 2, 'fanOut': 2, 'depth': 8, 'recursion': 0.0, 'files': 1},
+		{'name': 'recursive', 'functions': 1000, 'fanIn': 3, 'fanOut': 2, 'depth': 2, 'recursion': 0.3, 'files': 4},
+		{'name': 'manyFiles', 'functions': 2000, 'fanIn': 3, 'fanOut': 3, 'depth': 2, 'recursion': 0.05, 'files': 32},
+	],
+	'scaling': [
+		{'name': 'scale' + str(n), 'functions': n, 'fanIn': 3, 'fanOut': 0, 'depth': 1, 'recursion': 0.0, 'files': 1} for n in (1250, 2500, 5000, 10000)
+	],
+};
+
+
+def nest(depth, salt, statement):
+	"""Lines of 'statement' wrapped in 'depth' levels of if/switch/for/while, which ones depending on salt"""
+	opening = [];
+	closing = [];
+	for level in range(depth):
+		kind = CONSTRUCTS[(salt + level) % len(CONSTRUCTS)];
+		indent = "\t" * (level + 1);
+		if (kind == 'if'):
+			opening.append(indent + "if (x > %d) {" % (salt + level));
+			closing.append([indent + "}"]);
+		elif (kind == 'switch'):
+			opening.append(indent + "switch (x %% %d) {" % (level + 2));
+			opening.append(indent + "case %d:" % (salt % (level + 2)));
+			closing.append([indent + "\tbreak;", indent + "}"]);
+		elif (kind == 'for'):
+			opening.append(indent + "for (i%d = 0; i%d < x; i%d++) {" % (level, level, level));
+			closing.append([indent + "}"]);
+		else:
+			opening.append(indent + "while (x > %d) {" % (salt + level));
+			closing.append([indent + "\tx--;", indent + "}"]);
+	return opening + ["\t" * (depth + 1) + statement] + [line for lines in closing[::-1] for line in lines];
+
+
+def generateProgram(functions, fanIn=2, fanOut=2, depth=2, recursion=0.0, files=1, seed=0):
+	"""
+	C source of a synthetic program :: returns ({file name: source}, (sink file name, sink line number))
+		functions: functions besides main, the sink and the leaves, f0 .. f<functions - 1>
+		fanIn: callers of every function, the function before it and fanIn - 1 random earlier ones
+		fanOut: calls every function makes to leaf functions that never reach the sink
+		depth: if/switch/for/while levels every call is nested in
+		recursion: fraction of the functions that also call one of the few functions before them, closing a cycle
+		files: the functions are split over this many files, sharing one header of prototypes
+	Every function calls the sink, the line traced from is the one inside the sink's body
+	The same arguments always give the same program
+	"""
+	rng = random.Random(seed);
+	leaves = 16;
+
+	callees = [[] for i in range(functions)];
+	for i in range(1, functions):
+		callers = set([i - 1]);
+		while (len(callers) < min(fanIn, i)):
+			callers.add(rng.randrange(i));
+		for caller in sorted(callers):
+			callees[caller].append(i);
+	for i in range(1, functions):
+		if (rng.random() < recursion):
+			callees[i].append(rng.randrange(max(0, i - 8), i));
+
+	header = ["void sink(int x);"];
+	header += ["void leaf%d(int x);" % i for i in range(leaves)];
+	header += ["void f%d(int x);" % i for i in range(functions)];
+	sources = {'synthetic.h': "\n".join(header) + "\n"};
+
+	files = max(1, min(files, functions));
+	perFile = (functions + files - 1) // files;
+	sink = None;
+	for fileNo in range(files):
+		fileName = "file%d.c" % fileNo;
+		lines = ['#include "synthetic.h"'];
+		for i in range(fileNo * perFile, min(functions, (fileNo + 1) * perFile)):
+			lines.append("void f%d(int x) {" % i);
+			if (depth):
+				lines.append("\tint " + ", ".join("i%d" % level for level in range(depth)) + ";");
+			lines += nest(depth, i, "sink(x);");
+			for k, callee in enumerate(callees[i]):
+				lines += nest(depth, i + k + 1, "f%d(x - 1);" % callee);
+			for k in range(fanOut):
+				lines.append("\tleaf%d(x);" % rng.randrange(leaves));
+			lines.append("}");
+
+		if (fileNo == 0):
+			lines.append("int main(int argc, char** argv) {");
+			lines.append("\tf0(argc);");
+			lines.append("\treturn 0;");
+			lines.append("}");
+
+		#The sink and the leaves go in the last file, so in a project its callers come from every other file
+		if (fileNo == files - 1):
+			for i in range(leaves):
+				lines.append("void leaf%d(int x) {" % i);
+				lines.append("\tint y = x;");
+				lines.append("}");
+			lines.append("void sink(int x) {");
+			sink = (fileName, len(lines) + 1);
+			lines.append("\tint y = x;");
+			lines.append("}");
+		sources[fileName] = "\n".join(lines) + "\n";
+
+	return (sources, sink);
+
+
+def writeProgram(directory, sources):
+	"""Write the files of generateProgram into directory"""
+	if (not os.path.isdir(directory)):
+		os.makedirs(directory);
+	for fileName, source in sources.items():
+		with open(os.path.join(directory, fileName), 'w') as f:
+			f.write(source);
+
+
+class StageTimer():
+	"""Times the stages of one run, and the peak memory of each when tracemalloc is on"""
+	def __init__(self, memory=False):
+		self.memory 	= memory;
+		self.seconds 	= {};	# Stage: seconds
+		self.peaks 		= {};	# Stage: peak bytes allocated while it ran
+
+	def run(self, stage, work):
+		"""work() as stage 'stage' :: returns what work returns"""
+		#Collections of the huge AST would land at random points of the timing
+		gc.collect();
+		gc.disable();
+		if (self.memory):
+			import tracemalloc;
+			tracemalloc.reset_peak();
+		try:
+			start = time.time();
+			result = work();
+			self.seconds[stage] = time.time() - start;
+		finally:
+			gc.enable();
+		if (self.memory):
+			self.peaks[stage] = tracemalloc.get_traced_memory()[1];
+		return result;
+
+
+def runStages(directory, sink, args, memory=False):
+	"""Parse, trace, walk the paths of and export one generated program :: returns (StageTimer, info about the results)"""
+	timer = StageTimer(memory);
+	sinkFile = os.path.join(directory, sink[0]);
+	info = {};
+
+	project = timer.run('parse', lambda: parseProject(directory, processes=args.jobs));
+	session = AnalysisSession(project);
+	root = timer.run('trace', lambda: session.parseForCFGs([(sinkFile, sink[1])])[0][2]);
+	info['cfgNodes'] = len(session.graph);
+	info['cfgEdges'] = len(session.graph.edgeFrom);
+	info['paths'] = timer.run('paths', lambda: sum(1 for path in session.iterPaths(sinkFile, sink[1], maxPaths=args.paths)));
+
+	exportFile = os.path.join(directory, "cfg." + args.format);
+	info['exported'] = timer.run('export', lambda: exportCFG(root, exportFile, args.format));
+	os.remove(exportFile);
+	return (timer, info);
+
+
+def median(values):
+	values = sorted(values);
+	middle = len(values) // 2;
+	return values[middle] if len(values) % 2 else (values[middle - 1] + values[middle]) / 2.0;
+
+
+def runCase(case, args):
+	"""
+	Generate a case's program and run every stage args.repeat times, plus once more under tracemalloc for the memory peaks
+	Returns its entry of the report
+	"""
+	params = dict((key, value) for key, value in case.items() if key != 'name');
+	sources, sink = generateProgram(seed=args.seed, **params);
+	directory = tempfile.mkdtemp(prefix='stffa-bench-');
+	try:
+		writeProgram(directory, sources);
+
+		runs = [];
+		phases = {};
+		for i in range(args.repeat):
+			profile = profiler.enable();
+			timer, info = runStages(directory, sink, args);
+			profiler.disable();
+			runs.append(timer.seconds);
+			phases = dict((name, totals[1]) for name, totals in profile.phases.items());
+
+		peaks = {};
+		if (args.memory):
+			import tracemalloc;
+			tracemalloc.start();
+			try:
+				peaks = runStages(directory, sink, args, memory=True)[0].peaks;
+			finally:
+				tracemalloc.stop();
+	finally:
+		shutil.rmtree(directory, ignore_errors=True);
+
+	return {
+		'params': params,
+		'lines': sum(source.count("\n") for source in sources.values()),
+		'seconds': dict((stage, median([run[stage] for run in runs])) for stage in STAGES),
+		'minSeconds': dict((stage, min(run[stage] for run in runs)) for stage in STAGES),
+		'phases': phases,	#Breakdown of the last run by profiler phase (cpp, parse, index, merge, trace, ...)
+		'peakBytes': peaks,
+		'info': info,
+	};
+
+
+def gitCommit():
+	"""The commit the tree is at, None outside of a git checkout"""
+	try:
+		return subprocess.check_output(['git', 'rev-parse', 'HEAD'], stderr=subprocess.STDOUT).decode('utf-8').strip();
+	except (OSError, subprocess.CalledProcessError):
+		return None;
+
+
+def printCase(name, entry):
+	seconds = entry['seconds'];
+	peak = ("%9.1f" % (max(entry['peakBytes'].values()) / (1024.0 * 1024.0))) if entry['peakBytes'] else "%9s" % "-";
+	print("%-14s %8d %6d %9.3f %9.3f %9.3f %9.3f %9d %s" % (name, entry['params']['functions'], entry['params']['files'],
+		seconds['parse'], seconds['trace'], seconds['paths'], seconds['export'], entry['info']['cfgNodes'], peak));
+
+
+def compareReports(old, new):
+	"""Print new/old of the median time of every stage of the cases both reports have"""
+	print();
+	print("Compared to " + str(old['meta'].get('commit')) + " (" + old['meta'].get('date', '?') + "), new/old:");
+	print("%-14s" % "case" + "".join("%9s" % stage for stage in STAGES));
+	for name, entry in new['cases'].items():
+		before = old['cases'].get(name);
+		if (before is None or before['params'] != entry['params']):
+			continue;
+		ratios = [];
+		for stage in STAGES:
+			ratios.append(entry['seconds'][stage] / before['seconds'][stage] if before['seconds'][stage] else float('nan'));
+		print("%-14s" % name + "".join("%9.2f" % ratio for ratio in ratios));
+
+
+if __name__ == "__main__":
+	parser = argparse.ArgumentParser(description="Benchmark suite: times parse, trace, paths and export on synthetic C programs and writes comparable reports");
+	parser.add_argument('--suite', choices=sorted(SUITES), default='quick', help="Set of cases to run");
+	parser.add_argument('--functions', type=int, help="Run one custom case with this many functions instead of a suite");
+	parser.add_argument('--fan-in', type=int, default=3, help="Custom case: callers of every function");
+	parser.add_argument('--fan-out', type=int, default=2, help="Custom case: calls every function makes to leaf functions");
+	parser.add_argument('--depth', type=int, default=2, help="Custom case: if/switch/for/while levels around every call");
+	parser.add_argument('--recursion', type=float, default=0.05, help="Custom case: fraction of functions that close a recursion cycle");
+	parser.add_argument('--files', type=int, default=1, help="Custom case: files the functions are split over");
+	parser.add_argument('--seed', type=int, default=0, help="Seed of the program generator, the same seed always gives the same programs");
+	parser.add_argument('--repeat', type=int, default=3, help="Timed runs of every case, the report has the median and the minimum");
+	parser.add_argument('--jobs', type=int, default=1, help="Processes used to parse each program");
+	parser.add_argument('--paths', type=int, default=1000, help="Most paths walked by the paths stage");
+	parser.add_argument('--format', choices=FORMATS, default='json', help="Format of the export stage");
+	parser.add_argument('--no-memory', dest='memory', action='store_false', help="Skip the extra tracemalloc run that measures memory peaks");
+	parser.add_argument('--report', help="Write the results as JSON to this file");
+	parser.add_argument('--compare', help="Earlier --report to compare the results with");
+	parser.add_argument('--keep', help="Only write the program of the custom case (or of every case of the suite) into this directory, don't run anything");
+	args = parser.parse_args();
+
+	cases = SUITES[args.suite];
+	if (args.functions is not None):
+		cases = [{'name': 'custom', 'functions': args.functions, 'fanIn': args.fan_in, 'fanOut': args.fan_out, 'depth': args.depth, 'recursion': args.recursion, 'files': args.files}];
+
+	if (args.keep):
+		for case in cases:
+			params = dict((key, value) for key, value in case.items() if key != 'name');
+			sources, sink = generateProgram(seed=args.seed, **params);
+			writeProgram(os.path.join(args.keep, case['name']), sources);
+			print(os.path.join(args.keep, case['name'], sink[0]) + ":" + str(sink[1]));
+		sys.exit(0);
+
+	report = {
+		'meta': {
+			'date': time.strftime('%Y-%m-%d %H:%M:%S'),
+			'commit': gitCommit(),
+			'python': platform.python_version(),
+			'pycparser': pycparser.__version__,
+			'platform': platform.platform(),
+			'suite': args.suite if args.functions is None else 'custom',
+			'seed': args.seed,
+			'repeat': args.repeat,
+			'jobs': args.jobs,
+		},
+		'cases': {},
+	};
+
+	#NumPy is imported the first time a CFG's edges are walked, which would land in the first case's timings
+	importNumPy();
+
+	#Medians of the stages in seconds, CFG nodes made by the trace and the highest memory peak of any stage
+	print("%-14s %8s %6s %9s %9s %9s %9s %9s %9s" % ("case", "funcs", "files", "parse", "trace", "paths", "export", "CFG nodes", "peak MB"));
+	for case in cases:
+		entry = runCase(case, args);
+		report['cases'][case['name']] = entry;
+		printCase(case['name'], entry);
+		sys.stdout.flush();
+
+	if (args.report):
+		with open(args.report, 'w') as f:
+			json.dump(report, f, indent=1, sort_keys=True);
+
+	if (args.compare):
+		with open(args.compare) as f:
+			compareReports(json.load(f), report);
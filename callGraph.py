@@ -0,0 +1,136 @@
+from __future__ import print_function
+from array import array
+
+
+#How the members of a recursion cycle are joined into the name of its component
+MEMBER_SEPARATOR = " <-> ";
+
+
+class CallGraph():
+	"""
+	Whole program call graph (caller -> callee) of a CallSiteIndex, condensed into its strongly connected components
+	Every recursion cycle becomes a single component, so the components form a DAG; topo holds them callers first
+	Built once per index and pickled along with it
+	"""
+	def __init__(self, index):
+		names = set(index.funcDefs);
+		for callee, sites in index.sites.items():
+			names.add(callee);
+			for site in sites:
+				names.add(site.caller());
+		self.functions 	= sorted(names);	#Every function name, defined or only called
+		self.functionIDs = dict((name, i) for i, name in enumerate(self.functions));
+
+		callees = [set() for name in self.functions];
+		for callee, sites in index.sites.items():
+			for site in sites:
+				callees[self.functionIDs[site.caller()]].add(self.functionIDs[callee]);
+		self.callees = [sorted(c) for c in callees];	#Function ID: IDs of the functions it calls
+
+		self.component 	= array('i', [0] * len(self.functions));	#Function ID: its component
+		self.members 	= [];	#Component: names of the functions in it
+		self.strongComponents();
+
+		#Components come out of Tarjan's algorithm callees first, so the reverse is a topological order
+		count = len(self.members);
+		self.topo 		= list(range(count - 1, -1, -1));
+		self.position 	= array('i', [count - 1 - c for c in range(count)]);	#Component: its index in topo
+
+		dagCallees = [set() for c in range(count)];
+		dagCallers = [set() for c in range(count)];
+		for caller, calleeIDs in enumerate(self.callees):
+			for callee in calleeIDs:
+				a, b = self.component[caller], self.component[callee];
+				if (a != b):
+					dagCallees[a].add(b);
+					dagCallers[b].add(a);
+		self.dagCallees = [tuple(sorted(c)) for c in dagCallees];
+		self.dagCallers = [tuple(sorted(c)) for c in dagCallers];
+
+		self.labels = [];	#Component: its name, the function itself unless it is a recursion cycle
+		for members in self.members:
+			self.labels.append(members[0] if len(members) == 1 else MEMBER_SEPARATOR.join(members));
+
+	def strongComponents(self):
+		"""Tarjan's algorithm without recursion, so deep call chains can't hit the recursion limit"""
+		count = len(self.functions);
+		index = [-1] * count;
+		lowLink = [0] * count;
+		onStack = [False] * count;
+		stack = [];
+		nextIndex = 0;
+
+		for start in range(count):
+			if (index[start] >= 0):
+				continue;
+
+			#Each frame is [function ID, position in its callee list]
+			work = [[start, 0]];
+			index[start] = lowLink[start] = nextIndex;
+			nextIndex += 1;
+			stack.append(start);
+			onStack[start] = True;
+			while (work):
+				frame = work[-1];
+				node, i = frame;
+				callees = self.callees[node];
+				if (i < len(callees)):
+					frame[1] += 1;
+					callee = callees[i];
+					if (index[callee] < 0):
+						index[callee] = lowLink[callee] = nextIndex;
+						nextIndex += 1;
+						stack.append(callee);
+						onStack[callee] = True;
+						work.append([callee, 0]);
+					elif (onStack[callee]):
+						lowLink[node] = min(lowLink[node], index[callee]);
+					continue;
+
+				work.pop();
+				if (work):
+					parent = work[-1][0];
+					lowLink[parent] = min(lowLink[parent], lowLink[node]);
+
+				#node is the root of a component, everything above it on the stack is in it
+				if (lowLink[node] == index[node]):
+					members = [];
+					while (True):
+						member = stack.pop();
+						onStack[member] = False;
+						self.component[member] = len(self.members);
+						members.append(self.functions[member]);
+						if (member == node):
+							break;
+					self.members.append(sorted(members));
+
+	def componentOf(self, function):
+		"""The component of a function, None if the index has never heard of it"""
+		functionID = self.functionIDs.get(function);
+		return self.component[functionID] if functionID is not None else None;
+
+	def label(self, function):
+		"""Name of the component function is in: the function itself, or its whole recursion cycle"""
+		component = self.componentOf(function);
+		return self.labels[component] if component is not None else function;
+
+	def callSitesInto(self, index, function):
+		"""Every CallSite into the component of function from outside of it, the calls that make up the recursion are left out"""
+		component = self.componentOf(function);
+		if (component is None):
+			return index.callSites(function);
+
+		members = self.members[component];
+		return [site for member in members for site in index.callSites(member) if self.componentOf(site.caller()) != component];
+
+	def mayReach(self, source, target):
+		"""False if source can't call target (directly or not) by topological order alone, True if it might"""
+		a, b = self.componentOf(source), self.componentOf(target);
+		if (a is None or b is None):
+			return False;
+		return self.position[a] <= self.position[b];
+
+
+def labelMembers(label):
+	"""The function names a component label stands for"""
+	return label.split(MEMBER_SEPARATOR);
@@ -0,0 +1,127 @@
+from __future__ import print_function
+from itertools import chain
+
+from cfgGraph import importNumPy
+
+
+#Components whose reach bits are propagated at once; the bit matrix is (components x COLUMN_CHUNK / 8) bytes
+COLUMN_CHUNK = 4096;
+
+
+class CallMatrix():
+	"""
+	A CallGraph as sparse NumPy arrays, for whole program numbers on every function at once
+		calls: CSR (indptr, indices) adjacency of function IDs, caller -> callee, every edge once
+		fanIn / fanOut: distinct callers / callees of every function, calls to itself left out
+		reachedBy / reaches: functions that can call it / that it can call, directly or not
+		entries: entry points (functions nothing else calls) that can reach it, itself included
+	Transitive counts are computed on the condensed DAG, propagating bitsets of components a topological level at a time
+	"""
+	def __init__(self, graph):
+		np = importNumPy();
+		self.graph = graph;
+		count = len(graph.functions);
+
+		lengths = np.fromiter((len(callees) for callees in graph.callees), dtype=np.int64, count=count);
+		self.indptr = np.zeros(count + 1, dtype=np.int64);
+		np.cumsum(lengths, out=self.indptr[1:]);
+		self.indices = np.fromiter(chain.from_iterable(graph.callees), dtype=np.int64, count=int(self.indptr[-1]));
+
+		callers = np.repeat(np.arange(count), lengths);
+		selfCall = callers == self.indices;
+		self.fanOut = np.bincount(callers[~selfCall], minlength=count);
+		self.fanIn = np.bincount(self.indices[~selfCall], minlength=count);
+
+		self.component = np.frombuffer(graph.component, dtype=np.int32).astype(np.int64) if count else np.zeros(0, dtype=np.int64);
+		self.sizes = np.array([len(members) for members in graph.members], dtype=np.int64);
+		self.recursive = (self.sizes[self.component] > 1) | (np.bincount(callers[selfCall], minlength=count) > 0);
+
+		#DAG edges of the components, caller -> callee
+		dagFrom = np.fromiter(chain.from_iterable([c] * len(callees) for c, callees in enumerate(graph.dagCallees)), dtype=np.int64);
+		dagTo = np.fromiter(chain.from_iterable(graph.dagCallees), dtype=np.int64);
+		down = self.levels(dagFrom, dagTo, graph.topo);
+		up = self.levels(dagTo, dagFrom, graph.topo[::-1]);
+
+		entryComponents = np.array([c for c in range(len(graph.members)) if not graph.dagCallers[c]], dtype=np.int64);
+		allComponents = np.arange(len(graph.members));
+
+		#Counts include the function's own component, which only reaches itself if it is recursive
+		ownCorrection = self.recursive.astype(np.int64) - 1;
+		self.reachedBy = self.propagate(down, allComponents)[self.component] + ownCorrection;
+		self.reaches = self.propagate(up, allComponents)[self.component] + ownCorrection;
+		self.entries = self.propagate(down, entryComponents)[self.component];
+
+	def levels(self, fromC, toC, topo):
+		"""
+		Edges fromC -> toC grouped for propagate() :: returns (level of every component, [(level, targets, sources, group starts)])
+		A component's level is one more than the deepest of the components with an edge into it, the edges are grouped by the level they go into
+		"""
+		np = importNumPy();
+		components = len(self.sizes);
+		parents = [[] for c in range(components)];
+		for a, b in zip(fromC.tolist(), toC.tolist()):
+			parents[b].append(a);
+
+		level = [0] * components;
+		for c in topo:
+			if (parents[c]):
+				level[c] = 1 + max(level[p] for p in parents[c]);
+
+		level = np.array(level, dtype=np.int64);
+		if (not len(toC)):
+			return (level, []);
+		edgeLevel = level[toC];
+		order = np.lexsort((toC, edgeLevel));
+		fromC, toC, edgeLevel = fromC[order], toC[order], edgeLevel[order];
+
+		groups = [];
+		bounds = np.flatnonzero(np.diff(edgeLevel)) + 1;
+		for start, end in zip(np.concatenate(([0], bounds)).tolist(), np.concatenate((bounds, [len(toC)])).tolist()):
+			targets = toC[start:end];
+			starts = np.concatenate(([0], np.flatnonzero(np.diff(targets)) + 1));
+			groups.append( (int(edgeLevel[start]), targets[starts], fromC[start:end], starts) );
+		return (level, groups);
+
+	def propagate(self, levels, columns):
+		"""For every component: the functions in the components of 'columns' it can be reached from (itself included)"""
+		np = importNumPy();
+		level, groups = levels;
+		components = len(self.sizes);
+		popcount = np.array([bin(i).count('1') for i in range(256)], dtype=np.uint8);
+		totals = np.zeros(components, dtype=np.int64);
+
+		#Nothing above the shallowest column of a chunk can be reached from it, so chunks of similar levels skip the most
+		columns = columns[np.argsort(level[columns], kind='stable')];
+
+		for start in range(0, len(columns), COLUMN_CHUNK):
+			chunk = columns[start:start + COLUMN_CHUNK];
+			positions = np.arange(len(chunk));
+			#64 columns to a word, so the ORs below touch 8 times fewer elements than bytes would
+			bits = np.zeros((components, (len(chunk) + 63) // 64), dtype=np.uint64);
+			bits[chunk, positions // 64] |= np.left_shift(np.uint64(1), (positions % 64).astype(np.uint64));
+
+			#Every level only has edges from lower levels, whose bits are already final
+			lowest = level[chunk].min();
+			for groupLevel, targets, sources, starts in groups:
+				if (groupLevel > lowest):
+					bits[targets] |= np.bitwise_or.reduceat(bits[sources], starts, axis=0);
+
+			if (hasattr(np, 'bitwise_count')):
+				totals += np.bitwise_count(bits).sum(axis=1, dtype=np.int64);
+			else:
+				totals += popcount[bits.view(np.uint8)].sum(axis=1, dtype=np.int64);
+
+			#Components of many functions (recursion cycles) count for every function in them
+			for position in np.flatnonzero(self.sizes[chunk] > 1).tolist():
+				reached = (bits[:, position // 64] & np.left_shift(np.uint64(1), np.uint64(position % 64))) != 0;
+				totals += reached.astype(np.int64) * (int(self.sizes[chunk[position]]) - 1);
+		return totals;
+
+	def ranking(self, key='entries'):
+		"""Function IDs sorted by key (fanIn, fanOut, reachedBy, reaches or entries), the rest of them breaking ties, highest first"""
+		np = importNumPy();
+		keys = ['entries', 'reachedBy', 'fanIn', 'reaches', 'fanOut'];
+		keys.remove(key);
+		keys.insert(0, key);
+		#lexsort sorts by its last key first
+		return np.lexsort([-getattr(self, name) for name in reversed(keys)]);
@@ -0,0 +1,380 @@
+from __future__ import print_function
+import sys, bisect
+
+try:
+	from pycparser import c_ast
+except ImportError:
+	print("Please install PyCParser");
+	sys.exit(1);
+
+from callGraph import CallGraph
+import profiler
+from pointsTo import PointsToIndex, slotOf, valuesOf
+
+
+#The AST node types that make up the condition/loop chain between a call and the function it is inside of
+CHAIN_NODE_TYPES = (c_ast.If, c_ast.Switch, c_ast.Case, c_ast.For, c_ast.While, c_ast.DoWhile, c_ast.TernaryOp);
+
+
+class CallSite():
+	"""
+	A single FuncCall inside of a FuncDef
+	chain is a tuple of (ast_node, conditionResult) pairs ordered from the call upward to the FuncDef
+	conditionResult is 0 (True) or 1 (False) for If and TernaryOp nodes (the side the call is on), and None for everything else
+	indirect calls (through a function pointer) have one CallSite per function the pointer may hold
+	"""
+	def __init__(self, callee, callNode, funcDefNode, chain, indirect=False):
+		self.callee 	= callee;		#The name of the function being called
+		self.node 		= callNode;		#The FuncCall node
+		self.funcDef 	= funcDefNode;	#The FuncDef node the call is inside of
+		self.chain 		= chain;		#Conditions and loops between the call and the FuncDef
+		self.indirect 	= indirect;		#Is callee only one of the targets of a function pointer call
+
+	def __repr__(self):
+		return ("%s called by %s at %s" % (self.callee, self.caller(), self.node.coord));
+
+	def caller(self):
+		"""The name of the function this call is inside of"""
+		return self.funcDef.decl.name;
+
+
+def calleeName(callNode):
+	"""The name of the function a FuncCall node calls, None if it isn't a direct call by identifier"""
+	if (isinstance(callNode.name, c_ast.ID)):
+		return callNode.name.name;
+	return None;
+
+
+def conditionChain(parentList, node=None):
+	"""
+	Walks parentList (the AST nodes above the FuncCall 'node', outermost first) upward until the enclosing FuncDef
+	Returns (funcDefNode, chain) or (None, ()) if the call is not inside of a function
+	"""
+	chain = [];
+	below = node;	#The node we came up from, tells us which side of an If we are on
+	for ancestor in reversed(parentList):
+		if (isinstance(ancestor, c_ast.FuncDef)):
+			return (ancestor, tuple(chain));
+
+		if (isinstance(ancestor, c_ast.If)):
+			#A call inside the condition itself runs no matter which way the If goes
+			if (below is ancestor.iftrue):
+				chain.append( (ancestor, 0) );
+			elif (below is ancestor.iffalse):
+				chain.append( (ancestor, 1) );
+
+		elif (isinstance(ancestor, c_ast.TernaryOp)):
+			#Same for a ternary, but a call in its condition is still kept
+			if (below is ancestor.iftrue):
+				chain.append( (ancestor, 0) );
+			elif (below is ancestor.iffalse):
+				chain.append( (ancestor, 1) );
+			else:
+				chain.append( (ancestor, None) );
+
+		elif (isinstance(ancestor, CHAIN_NODE_TYPES)):
+			chain.append( (ancestor, None) );
+
+		below = ancestor;
+
+	return (None, ());
+
+
+class CallSiteVisitor(c_ast.NodeVisitor):
+	"""
+	Single pass over the AST that records every FuncCall along with its FuncDef and condition chain,
+	the first node on every line, the line range of every FuncDef, and where function addresses flow (see pointsTo)
+	The walk (see walk()) keeps its own stack, so however deep the AST is (a condition of thousands of terms) Python's recursion limit is never hit
+	The visit_ methods only do the work of their node, walk() goes into the children
+	"""
+	def __init__(self, index):
+		self.index 		= index;
+		self.parentList = [];	#Nodes above the one we are visiting (works b/c generic_visit is DFS)
+		self.lastLine 	= 0;	#Highest line number seen inside of the FuncDef we are in
+		self.visited 	= 0;	#AST nodes walked
+
+	def walk(self, root):
+		"""Visit root and every node below it in preorder, parentList always holding the nodes above the one being visited"""
+		#Each entry is a node to visit, or (node,) once its children are done
+		stack = [root];
+		while (stack):
+			node = stack.pop();
+			if (isinstance(node, tuple)):
+				node = node[0];
+				self.parentList.pop(-1);
+				if (isinstance(node, c_ast.FuncDef)):
+					self.leaveFuncDef(node);
+				continue;
+
+			self.enter(node);
+			method = getattr(self, 'visit_' + node.__class__.__name__, None);
+			if (method is not None):
+				method(node);
+
+			self.parentList.append(node);
+			stack.append( (node,) );
+			stack.extend(child for c_name, child in reversed(node.children()));
+
+	def enter(self, node):
+		"""What every node gets: counted, and the first node on its line recorded"""
+		self.visited += 1;
+		#Nodes are seen in preorder, so the first one on a line is kept
+		coord = node.coord;
+		if (coord is not None and coord.line is not None and not isinstance(node, c_ast.FileAST)):
+			self.index.addLineNode(coord.file, coord.line, node);
+			if (coord.line > self.lastLine):
+				self.lastLine = coord.line;
+
+	def visit_FuncDef(self, node):
+		self.index.funcDefs[node.decl.name] = node;
+
+		#The function spans from its declaration to the last line any of its nodes are on
+		self.lastLine = node.coord.line if node.coord is not None else 0;
+
+	def leaveFuncDef(self, node):
+		if (node.coord is not None):
+			self.index.addFuncDefRange(node.coord.file, node.coord.line, self.lastLine, node);
+
+	def visit_FuncCall(self, node):
+		callee = calleeName(node);
+		funcDefNode, chain = conditionChain(self.parentList, node);
+		if (callee is not None):
+			if (funcDefNode is not None):
+				self.index.add(CallSite(callee, node, funcDefNode, chain));
+			self.index.pointsTo.addCallArgs(callee, node.args);
+		elif (funcDefNode is not None):
+			self.index.pointsTo.addIndirectCall(node, funcDefNode, chain);
+
+	def visit_Decl(self, node):
+		pointsTo = self.index.pointsTo;
+		if (isinstance(node.type, c_ast.FuncDecl)):
+			pointsTo.functions.add(node.name);
+		elif (node.init is not None and node.name is not None):
+			pointsTo.addInit(('var', node.name), node.type, node.init);
+
+	def visit_Assignment(self, node):
+		if (node.op == '='):
+			self.index.pointsTo.flow(slotOf(node.lvalue), valuesOf(node.rvalue));
+
+	def visit_Struct(self, node):
+		self.index.pointsTo.addStruct(node);
+
+	def visit_Typedef(self, node):
+		self.index.pointsTo.typedefs[node.name] = node.type;
+
+
+class CallSiteIndex():
+	"""
+	Maps each callee name to the list of CallSites that call it, built once per AST
+	Also indexes lines: the first AST node on each line, and the FuncDef line ranges of each file for binary searches
+	"""
+	def __init__(self):
+		self.sites 		= {};	# FunctionName: [List of CallSite calling that function]
+		self.funcDefs 	= {};	# FunctionName: FuncDef node
+		self.lineNodes 	= {};	# FileName: {LineNumber: first AST node on that line}
+		self.funcDefRanges 	= {};	# FileName: [(first line, last line, FuncDef node)]
+		self.sortedRanges 	= None;	# FileName: (sorted first lines, last lines, FuncDef nodes), built on the first lookup
+		self.callerSites 	= None;	# FunctionName: [List of CallSite inside of that function], built on the first calleeSites
+		self.graph 			= None;	#CallGraph of every call in the index, built by callGraph()
+		self.pointsTo 		= PointsToIndex();	#Function pointer flows, turned into indirect CallSites by resolveIndirectCalls()
+
+	def __contains__(self, callee):
+		return callee in self.sites;
+
+	def __len__(self):
+		return sum(len(s) for s in self.sites.values());
+
+	def add(self, site):
+		"""Record a CallSite"""
+		if (site.callee not in self.sites):
+			self.sites[site.callee] = [];
+		self.sites[site.callee].append(site);
+		self.callerSites = None;
+		self.graph = None;
+
+	def callSites(self, callee):
+		"""All CallSites that call 'callee', in AST order"""
+		return self.sites.get(callee, []);
+
+	def calleeSites(self, caller):
+		"""All CallSites inside of the function 'caller', for walking the call graph forward"""
+		if (self.callerSites is None):
+			#Filled before it is set, threads tracing in the same index only ever see it whole
+			callerSites = {};
+			for sites in self.sites.values():
+				for site in sites:
+					name = site.caller();
+					if (name not in callerSites):
+						callerSites[name] = [];
+					callerSites[name].append(site);
+			self.callerSites = callerSites;
+		return self.callerSites.get(caller, []);
+
+	def resolveIndirectCalls(self):
+		"""Replace the indirect CallSites with one per function each indirect call may call, from the current pointsTo"""
+		for callee in list(self.sites):
+			self.sites[callee] = [site for site in self.sites[callee] if not site.indirect];
+			if (not self.sites[callee]):
+				del self.sites[callee];
+		for target, callNode, funcDefNode, chain in self.pointsTo.resolve():
+			self.add(CallSite(target, callNode, funcDefNode, chain, indirect=True));
+
+	def findPointerCalls(self):
+		"""
+		Calls by the name of a function pointer variable or parameter (fp(x)) look like direct calls,
+		so once a file is walked they are moved over to pointsTo as indirect calls
+		"""
+		pointsTo = self.pointsTo;
+		for callee in list(self.sites):
+			if (callee in pointsTo.functions):
+				continue;
+			pointerSites = [];
+			for site in self.sites[callee]:
+				params = site.funcDef.decl.type.args;
+				isParam = params is not None and any(getattr(param, 'name', None) == callee for param in params.params);
+				if (isParam or ('var', callee) in pointsTo.flows):
+					pointerSites.append(site);
+			if (not pointerSites):
+				continue;
+
+			for site in pointerSites:
+				pointsTo.addIndirectCall(site.node, site.funcDef, site.chain);
+			self.sites[callee] = [site for site in self.sites[callee] if site not in pointerSites];
+			if (not self.sites[callee]):
+				del self.sites[callee];
+		self.callerSites = None;
+		self.graph = None;
+
+	def callGraph(self):
+		"""The CallGraph (recursion cycles condensed) of every call in the index, built the first time it is needed"""
+		if (self.graph is None):
+			self.graph = CallGraph(self);
+		return self.graph;
+
+	def addLineNode(self, filename, lineNo, node):
+		"""Record node as being on lineNo, unless an earlier node already is"""
+		lines = self.lineNodes.get(filename);
+		if (lines is None):
+			lines = self.lineNodes[filename] = {};
+		if (lineNo not in lines):
+			lines[lineNo] = node;
+
+	def addFuncDefRange(self, filename, firstLine, lastLine, funcDefNode):
+		"""Record that funcDefNode covers lines firstLine through lastLine of filename"""
+		if (filename not in self.funcDefRanges):
+			self.funcDefRanges[filename] = [];
+		self.funcDefRanges[filename].append( (firstLine, lastLine, funcDefNode) );
+		self.sortedRanges = None;
+
+	def enclosingFuncDef(self, filename, lineNo):
+		"""The FuncDef node lineNo of filename is inside of, found by binary search, None if it isn't in a function"""
+		if (self.sortedRanges is None):
+			sortedRanges = {};
+			for name, ranges in self.funcDefRanges.items():
+				ranges = sorted(ranges, key=lambda r: r[0]);
+				sortedRanges[name] = ([r[0] for r in ranges], [r[1] for r in ranges], [r[2] for r in ranges]);
+			self.sortedRanges = sortedRanges;
+
+		if (filename not in self.sortedRanges):
+			return None;
+		firstLines, lastLines, funcDefNodes = self.sortedRanges[filename];
+		i = bisect.bisect_right(firstLines, lineNo) - 1;
+		if (i >= 0 and lineNo <= lastLines[i]):
+			return funcDefNodes[i];
+		return None;
+
+	def lookupLine(self, filename, lineNo):
+		"""(first AST node on the line, name of the function it is in, FuncDef node) or None if no node is on that line"""
+		node = self.lineNodes.get(filename, {}).get(lineNo);
+		if (node is None):
+			return None;
+		funcDefNode = self.enclosingFuncDef(filename, lineNo);
+		return (node, funcDefNode.decl.name if funcDefNode is not None else None, funcDefNode);
+
+	def merge(self, other):
+		"""
+		Add every CallSite, FuncDef and line of another index (usually another file's) to this one
+		Function pointers can cross files, so resolveIndirectCalls() has to be run again once every index is merged
+		"""
+		for callee, sites in other.sites.items():
+			direct = [site for site in sites if not site.indirect];
+			if (not direct):
+				continue;
+			if (callee not in self.sites):
+				self.sites[callee] = [];
+			self.sites[callee].extend(direct);
+		self.callerSites = None;
+		self.graph = None;
+		self.funcDefs.update(other.funcDefs);
+		self.pointsTo.merge(other.pointsTo);
+
+		for filename, lines in other.lineNodes.items():
+			for lineNo, node in lines.items():
+				self.addLineNode(filename, lineNo, node);
+		for filename, ranges in other.funcDefRanges.items():
+			for firstLine, lastLine, funcDefNode in ranges:
+				self.addFuncDefRange(filename, firstLine, lastLine, funcDefNode);
+
+
+def pathFunctions(index, source, sink):
+	"""
+	Names of the functions on some call path from the function 'source' down to the function 'sink' (both included), empty if there is none
+	The forward cone of source and the backward cone of sink are grown a level at a time, always the one with the smaller frontier,
+	until one of them is complete; the other direction is then only walked inside of it, so neither cone is ever built in full
+	"""
+	def callees(function):
+		return [site.callee for site in index.calleeSites(function)];
+
+	def callers(function):
+		return [site.caller() for site in index.callSites(function)];
+
+	def expand(frontier, seen, step, within=None):
+		"""The next level of a breadth first search (only through functions in within, if given), adding it to seen"""
+		nextFrontier = [];
+		for function in frontier:
+			for neighbour in step(function):
+				if (neighbour not in seen and (within is None or neighbour in within)):
+					seen.add(neighbour);
+					nextFrontier.append(neighbour);
+		return nextFrontier;
+
+	#Callers always come before callees in the topological order of the condensed call graph
+	if (source != sink and not index.callGraph().mayReach(source, sink)):
+		return set();
+
+	forward = set([source]);
+	backward = set([sink]);
+	forwardFrontier = [source];
+	backwardFrontier = [sink];
+	while (forwardFrontier and backwardFrontier):
+		if (len(forwardFrontier) <= len(backwardFrontier)):
+			forwardFrontier = expand(forwardFrontier, forward, callees);
+		else:
+			backwardFrontier = expand(backwardFrontier, backward, callers);
+
+	#Whichever cone is complete bounds the search in the other direction
+	if (not forwardFrontier):
+		start, step, within = sink, callers, forward;
+	else:
+		start, step, within = source, callees, backward;
+	if (start not in within):
+		return set();
+
+	onPath = set([start]);
+	frontier = [start];
+	while (frontier):
+		frontier = expand(frontier, onPath, step, within);
+	return onPath;
+
+
+def buildCallSiteIndex(ast):
+	"""Walks the AST once and returns its CallSiteIndex, with its CallGraph built so it is pickled (and cached) along with it"""
+	index = CallSiteIndex();
+	v = CallSiteVisitor(index);
+	v.walk(ast);
+	profiler.count('astNodesVisited', v.visited);
+	index.pointsTo.finish();
+	index.findPointerCalls();
+	index.resolveIndirectCalls();
+	index.callGraph();
+	return index;
@@ -0,0 +1,218 @@
+from __future__ import print_function
+import sys
+from array import array
+from collections import namedtuple
+
+np = None;	#NumPy, only imported once a graph's CSR buffers are needed (tracing alone never needs them)
+
+
+def importNumPy():
+	"""Import NumPy into np the first time it is needed"""
+	global np;
+	if (np is None):
+		try:
+			import numpy;
+		except ImportError:
+			print("Please install numpy");
+			sys.exit(1);
+		np = numpy;
+	return np;
+
+
+#Where a CFG node came from in the source, kept instead of a reference to the AST node so the AST can be freed
+CFGCoord = namedtuple('CFGCoord', ['file', 'line', 'column', 'kind']);
+
+
+class CFGGraph():
+	"""
+	Compact store of a CFG: nodes are integer IDs into flat arrays, labels/files/kinds are interned in one string table,
+	and edges are kept as CSR (offsets + indices) NumPy buffers built from append-only edge arrays
+	CFGNode is the object view of a single node that the rest of STFFA works with
+	"""
+	def __init__(self):
+		self.strings 	= [];		#Interned labels, file names and AST node kinds
+		self.stringIDs 	= {};		# String: index in self.strings
+
+		#One entry per node
+		self.nodeLabel 	= array('i');
+		self.nodeFile 	= array('i');	#-1 when the node has no coordinates
+		self.nodeLine 	= array('i');
+		self.nodeColumn = array('i');
+		self.nodeKind 	= array('i');
+
+		#One entry per edge, in the order edges were added (parent -> child)
+		self.edgeFrom 	= array('i');
+		self.edgeTo 	= array('i');
+		self.edgeKeys 		= set();	#parent << 32 | child, for duplicate edge checks
+		self.parentLabels 	= set();	#child << 32 | label of a parent, for "does a parent have this function name" checks
+
+		#CSR buffers, rebuilt on demand after edges are added
+		self.csr = None;
+
+	def __len__(self):
+		return len(self.nodeLabel);
+
+	def intern(self, string):
+		"""Index of string in the string table, adding it the first time"""
+		try:
+			return self.stringIDs[string];
+		except KeyError:
+			self.stringIDs[string] = len(self.strings);
+			self.strings.append(sys.intern(string));
+			return self.stringIDs[string];
+
+	def addNode(self, label, astNode=None):
+		"""Add a node labelled 'label', keeping only the coordinates of astNode :: returns its CFGNode"""
+		nodeID = len(self.nodeLabel);
+		self.nodeLabel.append(self.intern(label));
+
+		coord = astNode.coord if astNode is not None else None;
+		if (coord is not None):
+			self.nodeFile.append(self.intern(str(coord.file)));
+			self.nodeLine.append(coord.line or 0);
+			self.nodeColumn.append(getattr(coord, 'column', None) or 0);
+			#The views of a flatIndex.FlatIndex carry their kind in a CFGCoord, AST nodes in their class
+			self.nodeKind.append(self.intern(coord.kind if isinstance(coord, CFGCoord) else astNode.__class__.__name__));
+		else:
+			self.nodeFile.append(-1);
+			self.nodeLine.append(0);
+			self.nodeColumn.append(0);
+			self.nodeKind.append(-1);
+
+		return CFGNode(self, nodeID);
+
+	def addEdge(self, parent, child, duplicates=True):
+		"""Add the edge parent -> child (node IDs), skipping it if it exists and not duplicates"""
+		key = (parent << 32) | child;
+		if (not duplicates and key in self.edgeKeys):
+			return;
+		self.edgeKeys.add(key);
+		self.parentLabels.add( (child << 32) | self.nodeLabel[parent] );
+		self.edgeFrom.append(parent);
+		self.edgeTo.append(child);
+		self.csr = None;
+
+	def hasParentLabelled(self, nodeID, label):
+		"""Does any parent of nodeID have the label 'label'"""
+		labelID = self.stringIDs.get(label);
+		return labelID is not None and ((nodeID << 32) | labelID) in self.parentLabels;
+
+	def label(self, nodeID):
+		return self.strings[self.nodeLabel[nodeID]];
+
+	def coord(self, nodeID):
+		"""CFGCoord of nodeID, None if it has none"""
+		if (self.nodeFile[nodeID] < 0):
+			return None;
+		return CFGCoord(self.strings[self.nodeFile[nodeID]], self.nodeLine[nodeID], self.nodeColumn[nodeID], self.strings[self.nodeKind[nodeID]]);
+
+	def buildCSR(self):
+		"""(childOffsets, childIndex, parentOffsets, parentIndex); neighbours keep the order their edges were added in"""
+		if (self.csr is None):
+			importNumPy();
+			nodes = len(self.nodeLabel);
+			#Copies, a view would stop the edge arrays from growing
+			edgeFrom = np.array(self.edgeFrom, dtype=np.int32);
+			edgeTo = np.array(self.edgeTo, dtype=np.int32);
+
+			byParent = np.argsort(edgeFrom, kind='stable');
+			byChild = np.argsort(edgeTo, kind='stable');
+			childOffsets = np.zeros(nodes + 1, dtype=np.int64);
+			np.cumsum(np.bincount(edgeFrom, minlength=nodes), out=childOffsets[1:]);
+			parentOffsets = np.zeros(nodes + 1, dtype=np.int64);
+			np.cumsum(np.bincount(edgeTo, minlength=nodes), out=parentOffsets[1:]);
+
+			self.csr = (childOffsets, edgeTo[byParent], parentOffsets, edgeFrom[byChild]);
+		return self.csr;
+
+	def childIDs(self, nodeID):
+		childOffsets, childIndex, parentOffsets, parentIndex = self.buildCSR();
+		return childIndex[childOffsets[nodeID]:childOffsets[nodeID + 1]];
+
+	def parentIDs(self, nodeID):
+		childOffsets, childIndex, parentOffsets, parentIndex = self.buildCSR();
+		return parentIndex[parentOffsets[nodeID]:parentOffsets[nodeID + 1]];
+
+	def __getstate__(self):
+		#array and NumPy buffers pickle compactly, the CSR is rebuilt on the other side
+		state = self.__dict__.copy();
+		state['csr'] = None;
+		return state;
+
+
+class CFGNode():
+	"""
+	Currently represents a function call
+	Root node: the vulnerable line, parents as empty, children as not empty, and info as the line's coordinates
+	'Root' is technically the vulnerable point we start at
+	The exit nodes will have children as empty and parents as not
+	A CFGNode is only a (graph, ID) view, everything about it lives in its CFGGraph
+	"""
+	__slots__ = ('graph', 'id');
+
+	def __init__(self, graph, nodeID):
+		self.graph 	= graph;	#The CFGGraph this node is in
+		self.id 	= nodeID;	#Index of this node in the graph
+
+	def __eq__(self, other):
+		return isinstance(other, CFGNode) and self.graph is other.graph and self.id == other.id;
+
+	def __ne__(self, other):
+		return not self.__eq__(other);
+
+	def __hash__(self):
+		return hash( (id(self.graph), self.id) );
+
+	def __repr__(self):
+		return self.function;
+
+	def __str__(self):
+		return self.function;
+
+	@property
+	def function(self):
+		"""The name of the function (or condition) this node represents"""
+		return self.graph.label(self.id);
+
+	@property
+	def uniqueID(self):
+		"""Unique within the graph (and so the AnalysisSession) that made this node"""
+		return str(self.id);
+
+	@property
+	def info(self):
+		"""CFGCoord (file, line, column, kind) of the AST node this node was made from"""
+		return self.graph.coord(self.id);
+
+	@property
+	def children(self):
+		"""List of CFGNode called by this function (who this function calls)"""
+		return [CFGNode(self.graph, int(i)) for i in self.graph.childIDs(self.id)];
+
+	@property
+	def parents(self):
+		"""List of CFGNode that call this function (who calls this function)"""
+		return [CFGNode(self.graph, int(i)) for i in self.graph.parentIDs(self.id)];
+
+	def has_parent(self, function):
+		"""Is any parent of this node for 'function'"""
+		return self.graph.hasParentLabelled(self.id, function);
+
+	def add_child(self, child, duplicates=True):
+		"""Add a child node to this node"""
+		self.graph.addEdge(self.id, child.id, duplicates=duplicates);
+
+	def add_children_depth(self, children, duplicates=True):
+		"""Adds a list of children vertically :: returns the last child in the list"""
+		lastNode = self;
+		for child in children:
+			lastNode.add_child(child, duplicates=duplicates);
+			lastNode = child;
+
+		return lastNode;
+
+	def print_tree(self, spaces):
+		"""Textual version of the CFG from this node downward"""
+		print(spaces*" " + self.__str__());	#2 spaces per level
+		for child in self.children:
+			child.print_tree(spaces + 2);
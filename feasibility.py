@@ -0,0 +1,371 @@
+from __future__ import print_function
+import sys
+
+try:
+	from pycparser import c_ast
+except ImportError:
+	print("Please install PyCParser");
+	sys.exit(1);
+
+
+#Range of the C int everything is folded in, a result outside of it is unknown (overflow, or a wider/unsigned type in C)
+INT_MIN = -2**31;
+INT_MAX = 2**31 - 1;
+
+#Declared types of the locals that are tracked: signed integers no wider than int, whose arithmetic (after promotion) is int's
+#Unsigned, char (signedness is up to the compiler), wider and floating point types are left alone, C would wrap or round them
+TRACKED_TYPES = {
+	('int',): (INT_MIN, INT_MAX),
+	('signed',): (INT_MIN, INT_MAX),
+	('signed', 'int'): (INT_MIN, INT_MAX),
+	('short',): (-2**15, 2**15 - 1),
+	('short', 'int'): (-2**15, 2**15 - 1),
+	('signed', 'short'): (-2**15, 2**15 - 1),
+	('signed', 'short', 'int'): (-2**15, 2**15 - 1),
+	('signed', 'char'): (-2**7, 2**7 - 1),
+};
+
+#C operators we can fold, on Python ints (results of comparisons and logic are 0/1 like in C)
+BINARY_OPS = {
+	'+': lambda a, b: a + b,
+	'-': lambda a, b: a - b,
+	'*': lambda a, b: a * b,
+	'/': lambda a, b: int(float(a) / b) if b else None,		#C division truncates toward zero
+	'%': lambda a, b: a - b * int(float(a) / b) if b else None,
+	'<': lambda a, b: int(a < b),
+	'>': lambda a, b: int(a > b),
+	'<=': lambda a, b: int(a <= b),
+	'>=': lambda a, b: int(a >= b),
+	'==': lambda a, b: int(a == b),
+	'!=': lambda a, b: int(a != b),
+	'&': lambda a, b: a & b,
+	'|': lambda a, b: a | b,
+	'^': lambda a, b: a ^ b,
+	'<<': lambda a, b: a << b if 0 <= b < 64 else None,
+	'>>': lambda a, b: a >> b if 0 <= b < 64 else None,
+};
+
+UNARY_OPS = {
+	'-': lambda a: -a,
+	'+': lambda a: a,
+	'!': lambda a: int(not a),
+	'~': lambda a: ~a,
+};
+
+#Statements after which nothing in the same case of a switch runs
+JUMPS = (c_ast.Break, c_ast.Return, c_ast.Continue, c_ast.Goto);
+
+
+def constantValue(node):
+	"""The value of an int or char Constant node, None for anything else (unsigned or long constants change how C compares)"""
+	if (node.type == 'char'):
+		text = node.value[1:-1];
+		if (len(text) == 1):
+			return ord(text);
+		escapes = {'\\n': 10, '\\t': 9, '\\r': 13, '\\0': 0, '\\\\': 92, "\\'": 39};
+		return escapes.get(text);
+
+	if (node.type != 'int' or node.value[-1:] in ('u', 'U', 'l', 'L')):
+		return None;
+	text = node.value;
+	try:
+		if (text.lower().startswith('0x')):
+			value = int(text, 16);
+		elif (text.startswith('0') and len(text) > 1):
+			value = int(text, 8);
+		else:
+			value = int(text);
+	except ValueError:
+		return None;
+	#A literal too big for int is a long (or unsigned) one
+	return value if value <= INT_MAX else None;
+
+
+def intValue(value):
+	"""value if it is a C int, None if the int arithmetic that made it would have overflowed"""
+	if (value is None or value < INT_MIN or value > INT_MAX):
+		return None;
+	return value;
+
+
+def evaluate(expr, env):
+	"""The int value of expr with the constants in env, None if it can't be known"""
+	if (isinstance(expr, c_ast.Constant)):
+		return constantValue(expr);
+	if (isinstance(expr, c_ast.ID)):
+		return env.get(expr.name);
+	if (isinstance(expr, c_ast.UnaryOp)):
+		if (expr.op not in UNARY_OPS):
+			return None;
+		value = evaluate(expr.expr, env);
+		return intValue(UNARY_OPS[expr.op](value)) if value is not None else None;
+	if (isinstance(expr, c_ast.BinaryOp)):
+		left = evaluate(expr.left, env);
+		#&& and || are known as soon as one side decides them
+		if (expr.op in ('&&', '||')):
+			right = evaluate(expr.right, env);
+			decides = 0 if expr.op == '&&' else 1;
+			if (left is not None and bool(left) == bool(decides)):
+				return decides;
+			if (right is not None and bool(right) == bool(decides)):
+				return decides;
+			if (left is not None and right is not None):
+				return 1 - decides;
+			return None;
+		if (expr.op not in BINARY_OPS or left is None):
+			return None;
+		right = evaluate(expr.right, env);
+		return intValue(BINARY_OPS[expr.op](left, right)) if right is not None else None;
+	if (isinstance(expr, c_ast.TernaryOp)):
+		cond = evaluate(expr.cond, env);
+		if (cond is None):
+			return None;
+		return evaluate(expr.iftrue if cond else expr.iffalse, env);
+	return None;
+
+
+class AssignedNames(c_ast.NodeVisitor):
+	"""Names assigned (=, op=, ++, --) or whose address is taken anywhere below a node"""
+	def __init__(self):
+		self.assigned 	= set();
+		self.addressed 	= set();
+
+	def visit_Assignment(self, node):
+		if (isinstance(node.lvalue, c_ast.ID)):
+			self.assigned.add(node.lvalue.name);
+		self.generic_visit(node);
+
+	def visit_UnaryOp(self, node):
+		if (isinstance(node.expr, c_ast.ID)):
+			if (node.op in ('++', '--', 'p++', 'p--')):
+				self.assigned.add(node.expr.name);
+			elif (node.op == '&'):
+				self.addressed.add(node.expr.name);
+		self.generic_visit(node);
+
+	def visit_Decl(self, node):
+		self.assigned.add(node.name);
+		self.generic_visit(node);
+
+
+def assignedNames(node):
+	"""AssignedNames of node"""
+	v = AssignedNames();
+	if (node is not None):
+		v.visit(node);
+	return v;
+
+
+class ConstantPropagation():
+	"""
+	Intra-procedural constant propagation over one FuncDef, walking its statements in order
+	Only plain local signed integers (TRACKED_TYPES) that are declared once, never static and never have their address taken are tracked,
+	so every value is an int and Python's arithmetic on it is C's as long as it stays in range
+	Branches are analysed with copies of the constants and joined after; anything a loop or switch assigns is unknown inside of it
+	A name declared in a block is forgotten when the block ends, after it the name is a parameter or global we know nothing of
+	Records the constants in effect where each If/loop/Switch/Ternary condition is evaluated
+	"""
+	def __init__(self, funcDef):
+		self.envs 			= {};	#Chain AST node: {name: value} when its condition is evaluated
+		self.switchValues 	= {};	#Case node: value of its Switch's condition (None if unknown)
+		self.fallsInto 		= {};	#Case node: can the statements before it fall through into it
+
+		#A goto can jump anywhere, so the order of statements tells us nothing
+		if (any(isinstance(node, (c_ast.Goto, c_ast.Label)) for node in walkNodes(funcDef.body))):
+			self.tracked = set();
+			return;
+
+		counts = {};
+		self.ranges = {};	# Name: (lowest, highest) value its type holds
+		for node in walkNodes(funcDef.body):
+			if (isinstance(node, c_ast.Decl) and isinstance(node.type, c_ast.TypeDecl) and isinstance(node.type.type, c_ast.IdentifierType)
+					and tuple(node.type.type.names) in TRACKED_TYPES and not node.type.quals):
+				counts[node.name] = counts.get(node.name, 0) + (1 if 'static' not in node.storage and 'extern' not in node.storage else 2);
+				self.ranges[node.name] = TRACKED_TYPES[tuple(node.type.type.names)];
+			elif (isinstance(node, c_ast.Decl)):
+				counts[node.name] = 2;
+		self.tracked = set(name for name, count in counts.items() if count == 1) - assignedNames(funcDef.body).addressed;
+
+		self.statement(funcDef.body, {});
+
+	def assign(self, name, value, env):
+		if (name not in self.tracked):
+			return;
+		#Storing a value the type can't hold is implementation defined, so it is unknown
+		if (value is None or not (self.ranges[name][0] <= value <= self.ranges[name][1])):
+			env.pop(name, None);
+		else:
+			env[name] = value;
+
+	def effects(self, expr, env):
+		"""Apply the assignments inside of an expression to env, in (roughly) evaluation order"""
+		if (expr is None):
+			return;
+		if (isinstance(expr, c_ast.Assignment)):
+			self.effects(expr.rvalue, env);
+			if (isinstance(expr.lvalue, c_ast.ID)):
+				name = expr.lvalue.name;
+				value = evaluate(expr.rvalue, env);
+				if (expr.op != '=' and value is not None):
+					old = env.get(name);
+					op = BINARY_OPS.get(expr.op[:-1]);
+					value = op(old, value) if (op is not None and old is not None) else None;
+				self.assign(name, value, env);
+			else:
+				self.effects(expr.lvalue, env);
+			return;
+
+		if (isinstance(expr, c_ast.UnaryOp) and expr.op in ('++', '--', 'p++', 'p--') and isinstance(expr.expr, c_ast.ID)):
+			old = env.get(expr.expr.name);
+			self.assign(expr.expr.name, (old + (1 if '+' in expr.op else -1)) if old is not None else None, env);
+			return;
+
+		if (isinstance(expr, c_ast.TernaryOp)):
+			self.envs[expr] = dict(env);
+			self.effects(expr.cond, env);
+			self.kill(assignedNames(expr.iftrue).assigned | assignedNames(expr.iffalse).assigned, env);
+			return;
+
+		for name, child in expr.children():
+			self.effects(child, env);
+
+	def kill(self, names, env):
+		for name in names:
+			env.pop(name, None);
+
+	def join(self, a, b):
+		"""Constants both branches agree on"""
+		return dict((name, value) for name, value in a.items() if b.get(name) == value);
+
+	def statement(self, node, env):
+		"""Walk one statement with the constants in env, updating env to what holds after it"""
+		if (node is None):
+			return env;
+
+		if (isinstance(node, c_ast.Compound)):
+			for item in (node.block_items or []):
+				env = self.statement(item, env);
+			self.kill([item.name for item in (node.block_items or []) if isinstance(item, c_ast.Decl)], env);
+			return env;
+
+		if (isinstance(node, c_ast.Decl)):
+			if (node.init is not None and not isinstance(node.init, c_ast.InitList)):
+				self.effects(node.init, env);
+				self.assign(node.name, evaluate(node.init, env), env);
+			else:
+				self.assign(node.name, None, env);
+			return env;
+
+		if (isinstance(node, c_ast.If)):
+			self.envs[node] = dict(env);
+			cond = evaluate(node.cond, env);
+			self.effects(node.cond, env);
+			trueEnv = self.statement(node.iftrue, dict(env));
+			falseEnv = self.statement(node.iffalse, dict(env));
+			if (cond is not None):
+				return trueEnv if cond else falseEnv;
+			return self.join(trueEnv, falseEnv);
+
+		if (isinstance(node, (c_ast.While, c_ast.DoWhile, c_ast.For))):
+			if (isinstance(node, c_ast.For)):
+				if (isinstance(node.init, c_ast.DeclList)):
+					for decl in node.init.decls:
+						env = self.statement(decl, env);
+				else:
+					self.effects(node.init, env);
+
+			#Whether the body runs at all is decided by the constants on the way in
+			self.envs[node] = dict(env);
+			assigned = assignedNames(node.stmt).assigned | assignedNames(node.cond).assigned | assignedNames(getattr(node, 'next', None)).assigned;
+			self.kill(assigned, env);
+			self.statement(node.stmt, dict(env));
+			if (isinstance(node, c_ast.For) and isinstance(node.init, c_ast.DeclList)):
+				self.kill([decl.name for decl in node.init.decls], env);
+			return env;
+
+		if (isinstance(node, c_ast.Switch)):
+			self.envs[node] = dict(env);
+			value = evaluate(node.cond, env);
+			self.effects(node.cond, env);
+			self.kill(assignedNames(node.stmt).assigned, env);
+
+			items = node.stmt.block_items if isinstance(node.stmt, c_ast.Compound) else [node.stmt];
+			previous = None;
+			for item in (items or []):
+				if (isinstance(item, c_ast.Case)):
+					self.envs[item] = dict(env);
+					self.switchValues[item] = value;
+					self.fallsInto[item] = previous is not None and not (previous.stmts and isinstance(previous.stmts[-1], JUMPS));
+				if (isinstance(item, (c_ast.Case, c_ast.Default))):
+					previous = item;
+					for stmt in (item.stmts or []):
+						self.statement(stmt, dict(env));
+				else:
+					self.statement(item, dict(env));
+			return env;
+
+		if (isinstance(node, c_ast.Return)):
+			self.effects(node.expr, env);
+			return env;
+
+		#Expression statements, and anything else we don't look inside of
+		if (isinstance(node, c_ast.Node) and not isinstance(node, (c_ast.Break, c_ast.Continue, c_ast.EmptyStatement))):
+			self.effects(node, env);
+		return env;
+
+	def feasible(self, astNode, conditionResult):
+		"""Can execution go the way (astNode, conditionResult) of a call chain says, False only if the constants rule it out"""
+		env = self.envs.get(astNode);
+		if (env is None):
+			return True;
+
+		if (isinstance(astNode, (c_ast.If, c_ast.TernaryOp))):
+			cond = evaluate(astNode.cond, env);
+			if (cond is None or conditionResult is None):
+				return True;
+			return bool(cond) == (conditionResult == 0);
+
+		if (isinstance(astNode, (c_ast.While, c_ast.For))):
+			#A loop whose condition is false on the way in never runs its body
+			cond = evaluate(astNode.cond, env) if astNode.cond is not None else 1;
+			return cond is None or bool(cond);
+
+		if (isinstance(astNode, c_ast.Case)):
+			value = self.switchValues.get(astNode);
+			label = evaluate(astNode.expr, env);
+			if (value is None or label is None or self.fallsInto.get(astNode)):
+				return True;
+			return value == label;
+
+		return True;
+
+
+def walkNodes(node):
+	"""Every AST node below (and including) node"""
+	stack = [node] if node is not None else [];
+	while (stack):
+		node = stack.pop();
+		yield node;
+		stack.extend(child for name, child in node.children());
+
+
+class Feasibility():
+	"""
+	Optional path feasibility stage: drops CallSites whose condition chain contradicts the constants of their function
+	Each FuncDef is analysed once, the first time one of its calls is checked
+	"""
+	def __init__(self):
+		self.functions 	= {};	#FuncDef node: its ConstantPropagation
+		self.pruned 	= 0;	#CallSites found infeasible so far
+
+	def feasibleSite(self, site):
+		"""Can the call of a CallSite run at all as far as the constants of its function go"""
+		analysis = self.functions.get(site.funcDef);
+		if (analysis is None):
+			analysis = self.functions[site.funcDef] = ConstantPropagation(site.funcDef);
+
+		for astNode, conditionResult in site.chain:
+			if (not analysis.feasible(astNode, conditionResult)):
+				self.pruned += 1;
+				return False;
+		return True;
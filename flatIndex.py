@@ -0,0 +1,402 @@
+from __future__ import print_function
+import sys, os, mmap, bisect
+from array import array
+
+from cfgGraph import CFGCoord
+
+
+MAGIC = b'STFFAIDX';
+
+#Bump this whenever a section is added, removed or changes meaning
+FORMAT_VERSION = 1;
+
+#Every section of the file in order, each a flat array of int32 (stringData is the UTF-8 bytes of every string)
+#A name ending in 'Offsets' is CSR style: one more entry than rows, row i spanning [offsets[i], offsets[i + 1]) of the next section
+SECTIONS = (
+	'stringOffsets', 'stringData',
+	'files',								#String IDs of the project's files, for resolveFile
+	'functionName', 'functionComponent',	#Function ID (the CallGraph's, so sorted by name): its name, its component
+	'componentLabel', 'componentPosition',	#Component: its label, its index in the CallGraph's topological order
+	'memberOffsets', 'memberIndex',			#Component: IDs of the functions in it
+	'defName', 'defFunction', 'defFile', 'defLine', 'defColumn',	#FuncDef: its name, function ID and coordinates
+	'conditionKind', 'conditionText', 'conditionFile', 'conditionLine', 'conditionColumn',	#Condition/loop node of a call chain
+	'siteOffsets', 'siteCallee', 'siteDef', 'siteFile', 'siteLine', 'siteColumn', 'siteIndirect',	#CallSites grouped by callee function ID
+	'chainOffsets', 'chainCondition', 'chainResult',	#CallSite: its chain, result -1 for None
+	'callerSiteOffsets', 'callerSiteIndex',	#Function ID: the IDs of the CallSites inside of it
+	'coordFiles',							#String IDs of the files lines and FuncDef ranges are kept for
+	'lineOffsets', 'lineNumber', 'lineColumn', 'lineKind',	#File slot: its sorted line numbers and the first node on each
+	'rangeOffsets', 'rangeFirst', 'rangeLast', 'rangeDef',	#File slot: its FuncDef line ranges sorted by first line
+);
+
+
+class StringTable():
+	"""Interned strings, in the order they were first added"""
+	def __init__(self):
+		self.strings 	= [];
+		self.stringIDs 	= {};
+
+	def add(self, string):
+		string = str(string);
+		if (string not in self.stringIDs):
+			self.stringIDs[string] = len(self.strings);
+			self.strings.append(string);
+		return self.stringIDs[string];
+
+
+def writeFlatIndex(index, fileName, describe, files=()):
+	"""
+	Write a CallSiteIndex and its CallGraph to fileName as one flat read only file, for FlatIndex to mmap
+	describe(astNode): the text of a condition/loop node of a call chain, its CFG label less the ' :: True/False' of an If
+	files: the names of the files of the project, for FlatIndex.resolveFile
+	Returns the size of the file in bytes
+	"""
+	strings = StringTable();
+	out = dict((name, array('i')) for name in SECTIONS);
+	graph = index.callGraph();
+
+	def addCoord(prefix, coord):
+		out[prefix + 'File'].append(strings.add(coord.file) if coord is not None else -1);
+		out[prefix + 'Line'].append((coord.line or 0) if coord is not None else 0);
+		out[prefix + 'Column'].append((getattr(coord, 'column', None) or 0) if coord is not None else 0);
+
+	defIDs = {};	#id(FuncDef node): its row
+	def addDef(funcDefNode):
+		if (id(funcDefNode) not in defIDs):
+			defIDs[id(funcDefNode)] = len(out['defName']);
+			out['defName'].append(strings.add(funcDefNode.decl.name));
+			out['defFunction'].append(graph.functionIDs[funcDefNode.decl.name]);
+			addCoord('def', funcDefNode.coord);
+		return defIDs[id(funcDefNode)];
+
+	conditionIDs = {};	#id(AST node): its row
+	def addCondition(astNode):
+		if (id(astNode) not in conditionIDs):
+			conditionIDs[id(astNode)] = len(out['conditionKind']);
+			out['conditionKind'].append(strings.add(astNode.__class__.__name__));
+			out['conditionText'].append(strings.add(describe(astNode)));
+			addCoord('condition', astNode.coord);
+		return conditionIDs[id(astNode)];
+
+	out['files'].extend(strings.add(filename) for filename in files);
+
+	for name in graph.functions:
+		out['functionName'].append(strings.add(name));
+	out['functionComponent'] = array('i', graph.component);
+	out['componentPosition'] = array('i', graph.position);
+	out['memberOffsets'].append(0);
+	for label, members in zip(graph.labels, graph.members):
+		out['componentLabel'].append(strings.add(label));
+		out['memberIndex'].extend(graph.functionIDs[member] for member in members);
+		out['memberOffsets'].append(len(out['memberIndex']));
+
+	callerSites = [[] for name in graph.functions];
+	out['siteOffsets'].append(0);
+	out['chainOffsets'].append(0);
+	for functionID, name in enumerate(graph.functions):
+		for site in index.callSites(name):
+			callerSites[graph.functionIDs[site.caller()]].append(len(out['siteCallee']));
+			out['siteCallee'].append(functionID);
+			out['siteDef'].append(addDef(site.funcDef));
+			addCoord('site', site.node.coord);
+			out['siteIndirect'].append(1 if site.indirect else 0);
+			for astNode, conditionResult in site.chain:
+				out['chainCondition'].append(addCondition(astNode));
+				out['chainResult'].append(conditionResult if conditionResult is not None else -1);
+			out['chainOffsets'].append(len(out['chainCondition']));
+		out['siteOffsets'].append(len(out['siteCallee']));
+
+	out['callerSiteOffsets'].append(0);
+	for sites in callerSites:
+		out['callerSiteIndex'].extend(sites);
+		out['callerSiteOffsets'].append(len(out['callerSiteIndex']));
+
+	out['lineOffsets'].append(0);
+	out['rangeOffsets'].append(0);
+	for filename in sorted(set(index.lineNodes) | set(index.funcDefRanges), key=str):
+		out['coordFiles'].append(strings.add(filename));
+		lines = index.lineNodes.get(filename, {});
+		for lineNo in sorted(lines):
+			node = lines[lineNo];
+			out['lineNumber'].append(lineNo);
+			out['lineColumn'].append(getattr(node.coord, 'column', None) or 0);
+			out['lineKind'].append(strings.add(node.__class__.__name__));
+		out['lineOffsets'].append(len(out['lineNumber']));
+
+		#Sorted the way enclosingFuncDef sorts them, so both find the same FuncDef
+		for firstLine, lastLine, funcDefNode in sorted(index.funcDefRanges.get(filename, []), key=lambda r: r[0]):
+			out['rangeFirst'].append(firstLine);
+			out['rangeLast'].append(lastLine);
+			out['rangeDef'].append(addDef(funcDefNode));
+		out['rangeOffsets'].append(len(out['rangeFirst']));
+
+	#Strings last, everything above adds to them
+	data = bytearray();
+	for string in strings.strings:
+		out['stringOffsets'].append(len(data));
+		data += string.encode('utf-8', 'surrogateescape');
+	out['stringOffsets'].append(len(data));
+	out['stringData'] = data;
+
+	#Header: magic, then version, byte order and (offset, length) of every section as int64; sections start 8 byte aligned
+	headerSize = len(MAGIC) + 8 * (2 + 2 * len(SECTIONS));
+	offsets = [];
+	position = headerSize;
+	for name in SECTIONS:
+		size = len(out[name]) * (4 if name != 'stringData' else 1);
+		offsets += [position, len(out[name])];
+		position += size + (-size % 8);
+
+	with open(fileName, 'wb') as f:
+		f.write(MAGIC);
+		f.write(array('q', [FORMAT_VERSION, 1 if sys.byteorder == 'little' else 0] + offsets).tobytes());
+		for name in SECTIONS:
+			section = out[name];
+			size = len(section) * (4 if name != 'stringData' else 1);
+			f.write(section if name == 'stringData' else section.tobytes());
+			f.write(b'\0' * (-size % 8));
+	return position;
+
+
+class FlatView():
+	"""A row of one of a FlatIndex's tables, the way a CFGNode is a (graph, ID) view: nothing is read until it is asked for"""
+	__slots__ = ('index', 'id');
+
+	def __init__(self, index, rowID):
+		self.index 	= index;	#The FlatIndex the row is in
+		self.id 	= rowID;
+
+	def __eq__(self, other):
+		return type(other) is type(self) and self.index is other.index and self.id == other.id;
+
+	def __ne__(self, other):
+		return not self.__eq__(other);
+
+	def __hash__(self):
+		return hash( (type(self), id(self.index), self.id) );
+
+
+class FlatNode():
+	"""Where an AST node (a call, or the first node on a line) was, all that is kept of it"""
+	__slots__ = ('coord',);
+
+	def __init__(self, coord):
+		self.coord = coord;		#CFGCoord of the node, kind included
+
+
+class FlatFunction(FlatView):
+	"""A FuncDef of a FlatIndex; decl is itself, so it reads like a FuncDef node where only decl.name and coord are used"""
+	__slots__ = ();
+
+	@property
+	def name(self):
+		return self.index.string(self.index.defName[self.id]);
+
+	@property
+	def decl(self):
+		return self;
+
+	@property
+	def coord(self):
+		return self.index.coord(self.index.defFile, self.index.defLine, self.index.defColumn, self.id, 'FuncDef');
+
+
+class FlatCondition(FlatView):
+	"""A condition/loop node of a call chain: its AST node type (kind), its text and its coordinates"""
+	__slots__ = ();
+
+	@property
+	def kind(self):
+		return self.index.string(self.index.conditionKind[self.id]);
+
+	@property
+	def text(self):
+		return self.index.string(self.index.conditionText[self.id]);
+
+	@property
+	def coord(self):
+		index = self.index;
+		return index.coord(index.conditionFile, index.conditionLine, index.conditionColumn, self.id, self.kind);
+
+
+class FlatSite(FlatView):
+	"""A CallSite of a FlatIndex, with the same attributes; funcDef is a FlatFunction and chain holds FlatConditions"""
+	__slots__ = ();
+
+	def __repr__(self):
+		return ("%s called by %s at %s" % (self.callee, self.caller(), self.node.coord));
+
+	@property
+	def callee(self):
+		index = self.index;
+		return index.string(index.functionName[index.siteCallee[self.id]]);
+
+	@property
+	def funcDef(self):
+		return FlatFunction(self.index, self.index.siteDef[self.id]);
+
+	@property
+	def node(self):
+		index = self.index;
+		return FlatNode(index.coord(index.siteFile, index.siteLine, index.siteColumn, self.id, 'FuncCall'));
+
+	@property
+	def indirect(self):
+		return bool(self.index.siteIndirect[self.id]);
+
+	@property
+	def chain(self):
+		index = self.index;
+		start, end = index.chainOffsets[self.id], index.chainOffsets[self.id + 1];
+		return tuple((FlatCondition(index, index.chainCondition[i]), index.chainResult[i] if index.chainResult[i] >= 0 else None) for i in range(start, end));
+
+	def caller(self):
+		return self.funcDef.name;
+
+
+class FlatCallGraph():
+	"""The parts of a CallGraph that tracing uses, answered straight from a FlatIndex"""
+	def __init__(self, index):
+		self.index = index;
+
+	def componentOf(self, function):
+		"""The component of a function, None if the index has never heard of it"""
+		functionID = self.index.functionID(function);
+		return self.index.functionComponent[functionID] if functionID is not None else None;
+
+	def label(self, function):
+		"""Name of the component function is in: the function itself, or its whole recursion cycle"""
+		component = self.componentOf(function);
+		return self.index.string(self.index.componentLabel[component]) if component is not None else function;
+
+	def callSitesInto(self, index, function):
+		"""Every FlatSite into the component of function from outside of it, as CallGraph.callSitesInto"""
+		component = self.componentOf(function);
+		if (component is None):
+			return index.callSites(function);
+
+		flat = self.index;
+		sites = [];
+		for i in range(flat.memberOffsets[component], flat.memberOffsets[component + 1]):
+			member = flat.memberIndex[i];
+			for siteID in range(flat.siteOffsets[member], flat.siteOffsets[member + 1]):
+				if (flat.functionComponent[flat.defFunction[flat.siteDef[siteID]]] != component):
+					sites.append(FlatSite(flat, siteID));
+		return sites;
+
+	def mayReach(self, source, target):
+		"""False if source can't call target (directly or not) by topological order alone, True if it might"""
+		a, b = self.componentOf(source), self.componentOf(target);
+		if (a is None or b is None):
+			return False;
+		return self.index.componentPosition[a] <= self.index.componentPosition[b];
+
+
+class FlatIndex():
+	"""
+	A file written by writeFlatIndex, mmapped and read in place: every section is an int32 memoryview attribute of the same name
+	Answers the CallSiteIndex queries tracing makes (callSites, calleeSites, lookupLine, callGraph) with small views
+	into the file, so any number of processes can share one index on disk, each holding no more than the pages it touches
+	"""
+	def __init__(self, fileName):
+		self.fileName 	= fileName;
+		with open(fileName, 'rb') as f:
+			self.map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ);
+		self.valid = self.map[:len(MAGIC)] == MAGIC;
+		if (not self.valid):
+			return;
+
+		view = memoryview(self.map);
+		header = view[len(MAGIC):len(MAGIC) + 8 * (2 + 2 * len(SECTIONS))].cast('q');
+		self.valid = header[0] == FORMAT_VERSION and header[1] == (1 if sys.byteorder == 'little' else 0);
+		if (not self.valid):
+			return;
+
+		for i, name in enumerate(SECTIONS):
+			offset, length = header[2 + 2 * i], header[3 + 2 * i];
+			if (name == 'stringData'):
+				setattr(self, name, view[offset:offset + length]);
+			else:
+				setattr(self, name, view[offset:offset + 4 * length].cast('i'));
+
+		#The only tables read out up front, one entry per file
+		self.fileSlots = dict((self.string(stringID), slot) for slot, stringID in enumerate(self.coordFiles));
+		self.graph = FlatCallGraph(self);
+
+	@staticmethod
+	def load(fileName):
+		"""FlatIndex of fileName, None if it isn't a flat index this version (and byte order) can read"""
+		try:
+			index = FlatIndex(fileName);
+		except (IOError, OSError, ValueError):
+			return None;
+		return index if index.valid else None;
+
+	def string(self, stringID):
+		return self.stringData[self.stringOffsets[stringID]:self.stringOffsets[stringID + 1]].tobytes().decode('utf-8', 'surrogateescape');
+
+	def coord(self, files, lines, columns, row, kind):
+		"""CFGCoord out of the file/line/column sections of a table, None if the row has no coordinates"""
+		if (files[row] < 0):
+			return None;
+		return CFGCoord(self.string(files[row]), lines[row], columns[row], kind);
+
+	def functionID(self, name):
+		"""ID of the function called name by binary search of the (sorted) function names, None if there is none"""
+		low, high = 0, len(self.functionName);
+		while (low < high):
+			middle = (low + high) // 2;
+			if (self.string(self.functionName[middle]) < name):
+				low = middle + 1;
+			else:
+				high = middle;
+		if (low < len(self.functionName) and self.string(self.functionName[low]) == name):
+			return low;
+		return None;
+
+	def resolveFile(self, filename):
+		"""The name a file has in the coords, as Project.resolveFile"""
+		wanted = os.path.abspath(filename);
+		for stringID in self.files:
+			name = self.string(stringID);
+			if (os.path.abspath(name) == wanted):
+				return name;
+		return filename;
+
+	def __contains__(self, callee):
+		functionID = self.functionID(callee);
+		return functionID is not None and self.siteOffsets[functionID] < self.siteOffsets[functionID + 1];
+
+	def callSites(self, callee):
+		"""FlatSites that call 'callee', in the order the CallSiteIndex had them"""
+		functionID = self.functionID(callee);
+		if (functionID is None):
+			return [];
+		return [FlatSite(self, i) for i in range(self.siteOffsets[functionID], self.siteOffsets[functionID + 1])];
+
+	def calleeSites(self, caller):
+		"""FlatSites inside of the function 'caller'"""
+		functionID = self.functionID(caller);
+		if (functionID is None):
+			return [];
+		return [FlatSite(self, self.callerSiteIndex[i]) for i in range(self.callerSiteOffsets[functionID], self.callerSiteOffsets[functionID + 1])];
+
+	def callGraph(self):
+		return self.graph;
+
+	def lookupLine(self, filename, lineNo):
+		"""(FlatNode of the first node on the line, name of the function it is in, its FlatFunction) or None, as CallSiteIndex.lookupLine"""
+		slot = self.fileSlots.get(filename);
+		if (slot is None):
+			return None;
+		start, end = self.lineOffsets[slot], self.lineOffsets[slot + 1];
+		i = bisect.bisect_left(self.lineNumber, lineNo, start, end);
+		if (i == end or self.lineNumber[i] != lineNo):
+			return None;
+		node = FlatNode(CFGCoord(filename, lineNo, self.lineColumn[i], self.string(self.lineKind[i])));
+
+		start, end = self.rangeOffsets[slot], self.rangeOffsets[slot + 1];
+		i = bisect.bisect_right(self.rangeFirst, lineNo, start, end) - 1;
+		if (i < start or lineNo > self.rangeLast[i]):
+			return (node, None, None);
+		funcDef = FlatFunction(self, self.rangeDef[i]);
+		return (node, funcDef.name, funcDef);
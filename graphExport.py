@@ -0,0 +1,190 @@
+from __future__ import print_function
+import json
+from collections import deque
+from xml.sax.saxutils import escape, quoteattr
+
+
+FORMATS = ('dot', 'json', 'graphml');
+
+
+class DOTWriter():
+	"""Writes a graph as GraphViz DOT source, nodes and edges in whatever order they come"""
+	nodesFirst = False;
+
+	def __init__(self, f):
+		self.f = f;
+
+	def begin(self):
+		self.f.write("digraph G {\n");
+
+	def node(self, key, label):
+		self.f.write("\t%s [label=%s];\n" % (dotString(key), dotString(label)));
+
+	def edge(self, fromKey, toKey):
+		self.f.write("\t%s -> %s;\n" % (dotString(fromKey), dotString(toKey)));
+
+	def end(self):
+		self.f.write("}\n");
+
+
+class JSONWriter():
+	"""Writes a graph as {"nodes": [{"id", "label"}], "edges": [{"source", "target"}]}, so every node comes before every edge"""
+	nodesFirst = True;
+
+	def __init__(self, f):
+		self.f 		= f;
+		self.first 	= True;		#Nothing written to the current list yet
+		self.inEdges = False;
+
+	def begin(self):
+		self.f.write('{"nodes": [');
+
+	def item(self, value):
+		self.f.write(("\n" if self.first else ",\n") + json.dumps(value));
+		self.first = False;
+
+	def node(self, key, label):
+		self.item({'id': key, 'label': label});
+
+	def edge(self, fromKey, toKey):
+		if (not self.inEdges):
+			self.f.write('\n], "edges": [');
+			self.first = True;
+			self.inEdges = True;
+		self.item({'source': fromKey, 'target': toKey});
+
+	def end(self):
+		if (not self.inEdges):
+			self.f.write('\n], "edges": [');
+		self.f.write("\n]}\n");
+
+
+class GraphMLWriter():
+	"""Writes a graph as GraphML, node labels in the 'label' data key"""
+	nodesFirst = True;
+
+	def __init__(self, f):
+		self.f = f;
+
+	def begin(self):
+		self.f.write('<?xml version="1.0" encoding="UTF-8"?>\n');
+		self.f.write('<graphml xmlns="http://graphml.graphdrawing.org/xmlns">\n');
+		self.f.write('\t<key id="label" for="node" attr.name="label" attr.type="string"/>\n');
+		self.f.write('\t<graph id="G" edgedefault="directed">\n');
+
+	def node(self, key, label):
+		self.f.write('\t\t<node id=%s><data key="label">%s</data></node>\n' % (quoteattr(str(key)), escape(label)));
+
+	def edge(self, fromKey, toKey):
+		self.f.write('\t\t<edge source=%s target=%s/>\n' % (quoteattr(str(fromKey)), quoteattr(str(toKey))));
+
+	def end(self):
+		self.f.write('\t</graph>\n</graphml>\n');
+
+
+WRITERS = {'dot': DOTWriter, 'json': JSONWriter, 'graphml': GraphMLWriter};
+
+
+def dotString(value):
+	"""value as a quoted DOT ID"""
+	return '"' + str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n') + '"';
+
+
+def walkGraph(root, children, key, label, tree=False, maxNodes=None, maxEdges=None, maxChildren=None):
+	"""
+	Generator of ('node', key, label) and ('edge', parentKey, childKey), breadth first from root, every node and edge once
+		children(node): the nodes below node
+		key(node): what identifies node in the output, label(node): its text
+		tree: the graph is a tree (an AST), so no set of the nodes already seen is needed
+		maxNodes / maxEdges: stop adding nodes / edges once this many are out
+		maxChildren: follow at most this many of the children of any node
+	Children that are cut by a limit are collapsed into one '+N not shown' summary node under their parent
+	Nodes are yielded before the edges that use them, and the walk is the same every time so it can be run once per pass
+	"""
+	seen = None if tree else set([key(root)]);
+	nodes = 1;
+	edges = 0;
+	yield ('node', key(root), label(root));
+
+	queue = deque([root]);
+	while (queue):
+		node = queue.popleft();
+		nodeKey = key(node);
+		hidden = 0;
+		for i, child in enumerate(children(node)):
+			childKey = key(child);
+			isNew = tree or childKey not in seen;
+			if ((maxChildren is not None and i >= maxChildren) or (maxEdges is not None and edges >= maxEdges) or (isNew and maxNodes is not None and nodes >= maxNodes)):
+				hidden += 1;
+				continue;
+
+			if (isNew):
+				if (not tree):
+					seen.add(childKey);
+				nodes += 1;
+				yield ('node', childKey, label(child));
+				queue.append(child);
+			edges += 1;
+			yield ('edge', nodeKey, childKey);
+
+		if (hidden):
+			summaryKey = "hidden" + str(nodeKey);
+			yield ('node', summaryKey, "+" + str(hidden) + " not shown");
+			yield ('edge', nodeKey, summaryKey);
+
+
+def writeGraph(fileName, fmt, walk, reverse=False):
+	"""
+	Stream a graph to fileName in format fmt ('dot', 'json' or 'graphml') :: returns (nodes, edges) written
+	walk() must return a fresh walkGraph generator, formats that list every node first walk the graph twice instead of holding it
+	reverse: write every edge child -> parent
+	"""
+	if (fmt not in WRITERS):
+		print("ERROR: unknown graph format " + str(fmt) + ", should be one of " + ", ".join(FORMATS));
+		return (0, 0);
+
+	counts = {'node': 0, 'edge': 0};
+	with open(fileName, 'w') as f:
+		writer = WRITERS[fmt](f);
+		writer.begin();
+		passes = ('node', 'edge') if writer.nodesFirst else (None,);
+		for kind in passes:
+			for element in walk():
+				if (kind is not None and element[0] != kind):
+					continue;
+				counts[element[0]] += 1;
+				if (element[0] == 'node'):
+					writer.node(element[1], element[2]);
+				elif (reverse):
+					writer.edge(element[2], element[1]);
+				else:
+					writer.edge(element[1], element[2]);
+		writer.end();
+
+	return (counts['node'], counts['edge']);
+
+
+def exportCFG(rootNode, fileName, fmt='dot', direction=0, maxNodes=None, maxEdges=None, maxChildren=None):
+	"""
+	Stream the CFG below rootNode to fileName :: returns (nodes, edges) written
+	direction: edges go from start->vulnerability (0) or vulnerability->start (1), as in render.visualize
+	"""
+	graph = rootNode.graph;
+	def walk():
+		return walkGraph(rootNode.id, graph.childIDs, int, graph.label, maxNodes=maxNodes, maxEdges=maxEdges, maxChildren=maxChildren);
+	return writeGraph(fileName, fmt, walk, reverse=(direction == 0));
+
+
+def astLabel(node):
+	"""Class name of an AST node followed by its attributes, the way visualizeAST has always named them"""
+	name = node.__class__.__name__;
+	if (node.attr_names):
+		name += (': ' + ', '.join('%s' % getattr(node, n) for n in node.attr_names));
+	return name;
+
+
+def exportAST(rootNode, fileName, fmt='dot', maxNodes=None, maxEdges=None, maxChildren=None):
+	"""Stream the AST below rootNode to fileName, one output node per AST node :: returns (nodes, edges) written"""
+	def walk():
+		return walkGraph(rootNode, lambda node: [child for name, child in node.children()], id, astLabel, tree=True, maxNodes=maxNodes, maxEdges=maxEdges, maxChildren=maxChildren);
+	return writeGraph(fileName, fmt, walk);
@@ -0,0 +1,140 @@
+from __future__ import print_function
+import os, re
+
+
+#Comments and string/char literals are matched so the identifiers inside of them are skipped,
+#an identifier is captured along with whether a '(' comes right after it
+TOKEN = re.compile(r'//[^\n]*|/\*.*?\*/|"(?:\\.|[^"\\\n])*"|\'(?:\\.|[^\'\\\n])*\'|([A-Za-z_]\w*)(\s*\()?', re.S);
+
+INCLUDE = re.compile(r'^[ \t]*#[ \t]*include[ \t]*"([^"]+)"', re.M);
+
+#A #define and every line it is continued on
+DEFINE = re.compile(r'^[ \t]*#[ \t]*define\b(?:[^\n]*\\\n)*[^\n]*', re.M);
+
+
+def scanIdentifiers(text):
+	"""(identifiers in text, the ones of them that are somewhere not followed by a '(') outside of comments and literals"""
+	names = set();
+	bare = set();
+	for match in TOKEN.finditer(text):
+		name = match.group(1);
+		if (name is None):
+			continue;
+		names.add(name);
+		if (match.group(2) is None):
+			bare.add(name);
+	return (names, bare);
+
+
+def includeDirs(filename, cppArgs):
+	"""Directories a quoted #include of filename is looked for in, in cpp's order"""
+	dirs = [os.path.dirname(filename)];
+	args = list(cppArgs);
+	for i, arg in enumerate(args):
+		if (arg.startswith('-I') and len(arg) > 2):
+			dirs.append(arg[2:]);
+		elif (arg in ('-I', '-iquote') and i + 1 < len(args)):
+			dirs.append(args[i + 1]);
+	return dirs;
+
+
+def readText(filename):
+	try:
+		with open(filename, errors='replace') as f:
+			return f.read();
+	except (IOError, OSError):
+		return None;
+
+
+class IdentifierIndex():
+	"""
+	Token level postings of the raw C files of a project: identifier -> the files it appears in
+	A file can only call a function (directly) if the function's name is in it, or in a macro of a header it #includes,
+	so this is enough to tell which files to parse when looking for the callers of a function
+	Names that show up anywhere other than right before a '(' may have their address taken, so calls to them can be anywhere
+	"""
+	def __init__(self):
+		self.files 		= [];	#File names, by file ID
+		self.fileIDs 	= {};	# FileName: file ID
+		self.postings 	= {};	# Identifier: set of IDs of the files it appears in
+		self.bare 		= set();	#Identifiers that appear somewhere not followed by '('
+		self.headers 	= {};	# HeaderName: (identifiers of its macros, bare ones, headers it includes), read once
+
+	def headerMacros(self, header, cppArgs):
+		"""Identifiers in the #defines of a header, and of the headers it includes in turn"""
+		names = set();
+		bare = set();
+		seen = set([header]);
+		stack = [header];
+		while (stack):
+			path = stack.pop();
+			if (path not in self.headers):
+				text = readText(path) or "";
+				macroNames, macroBare = scanIdentifiers("\n".join(DEFINE.findall(text)));
+				self.headers[path] = (macroNames, macroBare, self.resolveIncludes(path, text, cppArgs));
+			macroNames, macroBare, includes = self.headers[path];
+			names |= macroNames;
+			bare |= macroBare;
+			for include in includes:
+				if (include not in seen):
+					seen.add(include);
+					stack.append(include);
+		return (names, bare);
+
+	def resolveIncludes(self, filename, text, cppArgs):
+		"""Paths of the quoted #includes of a file that exist"""
+		found = [];
+		dirs = includeDirs(filename, cppArgs);
+		for include in INCLUDE.findall(text):
+			for directory in dirs:
+				path = os.path.normpath(os.path.join(directory, include));
+				if (os.path.isfile(path)):
+					found.append(path);
+					break;
+		return found;
+
+	def addFile(self, filename, cppArgs=()):
+		"""Scan one C file (its own text, plus the macros of the headers it includes) into the postings"""
+		text = readText(filename);
+		if (text is None):
+			return;
+
+		fileID = self.fileIDs.get(filename);
+		if (fileID is None):
+			fileID = self.fileIDs[filename] = len(self.files);
+			self.files.append(filename);
+
+		names, bare = scanIdentifiers(text);
+		headers = self.resolveIncludes(filename, text, cppArgs);
+		args = list(cppArgs);
+		headers += [args[i + 1] for i, arg in enumerate(args[:-1]) if arg == '-include'];
+		for header in headers:
+			macroNames, macroBare = self.headerMacros(header, cppArgs);
+			names |= macroNames;
+			bare |= macroBare;
+
+		for name in names:
+			postings = self.postings.get(name);
+			if (postings is None):
+				postings = self.postings[name] = set();
+			postings.add(fileID);
+		self.bare |= bare;
+
+	def filesMentioning(self, names):
+		"""Names of the files any of names appears in"""
+		fileIDs = set();
+		for name in names:
+			fileIDs |= self.postings.get(name, set());
+		return set(self.files[fileID] for fileID in fileIDs);
+
+	def addressTaken(self, name):
+		"""Might name be used as a value (a function pointer), so that calls to it don't have to mention it"""
+		return name in self.bare;
+
+
+def buildIdentifierIndex(files):
+	"""IdentifierIndex of [(filename, cppArgs)]"""
+	index = IdentifierIndex();
+	for filename, cppArgs in files:
+		index.addFile(filename, cppArgs);
+	return index;
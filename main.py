@@ -1,5 +1,7 @@
 from __future__ import print_function
-import sys, glob
+import sys, os, time, copy, pickle, argparse, tempfile, subprocess
+import multiprocessing, multiprocessing.pool
+from collections import deque
 
 # This is not required if you've installed pycparser into
 # your site-packages/ with setup.py
@@ -8,622 +10,1027 @@ sys.path.extend(['.', '..'])
 importError = False;
 
 try:
-	from pycparser import c_parser, c_ast, parse_file
+	from pycparser import c_ast, c_generator
+	from pycparser.c_parser import ParseError
 except ImportError:
 	print("Please install PyCParser");
 	importError = True;
 
-try:
-	import numpy as np
-except ImportError:
-	print("Please install numpy");
-	importError = True;
-
-try:
-	import graphviz as gv
-except ImportError:
-	print("Please install GraphViz");
-	importError = True;
-
-try:
-	import matplotlib.pyplot as plt
-except ImportError:
-	print("Please install MatPlotLib");
-	importError = True;
-
 if (importError):
 	sys.exit(1);
 
+from callSiteIndex import pathFunctions
+from callGraph import labelMembers
+from feasibility import Feasibility
+from cfgGraph import CFGGraph
+from projectParser import parseProject
+from parseCache import ParseCache, DEFAULT_MAX_BYTES, CACHE_VERSION, parseFile
+from graphExport import exportCFG, FORMATS
+from sinkScanner import Catalogue, readCatalogue, findSinks, sinkLines
+from pathStats import PathStats
+from flatIndex import FlatIndex, writeFlatIndex
+import profiler
 
-methodQueue = [];		#Queue of tuples (methodName, methodNode) of methods we're tracing.  methodNode is the CFGNode of the method
-rootNode 	= None;		#The root of our tree
-
-funcCalls 	= {};		# FunctionName: [List of FuncCall nodes for that function]
-						#Using a dictionary to keep track of function call nodes allows us to scale with size, rather than time
-						#The problem with using this is that we can no longer get a parent tree, we would
-						# need to find another way to deal with the upwards trace/parent links
 
-astToCfg = {}	#Ast_Node:CFGNode, to keep track of existing AST_nodes
+#Bump this whenever what IncrementalAnalysis.save pickles changes shape; the CallSites in it also follow CACHE_VERSION
+STATE_VERSION = "1";
 
-funcDefCFGNodes = {}	# FunctionName: CFGNode
-globalNodeID = 0;
+workerSession = None;	#The AnalysisSession of this process when it is a parseForCFGsParallel worker
 
-class CFGNode():
-	"""
-	Currently represents a function call
-	Root node: function as "", parents as empty, children as not empty, and info as None
-	'Root' is technically the vulnerable point we start at
-	The exit nodes will have children as empty and parents as not
-	"""
-	def __init__(self, funcname, ast_info):
-		self.function	= funcname;	#The name of the function this node represents
-		self.parents 	= [];		#List of CFGNode that call this function (who calls this function)
-		self.children 	= [];		#List of CFGNode called by this function (who this function calls)
-		self.info 		= ast_info;	#Info about said node, most likely will be the actual AST node
-		
-		global globalNodeID;
-		self.uniqueID	= str(globalNodeID);
-		globalNodeID 	+= 1;
 
-	def __repr__(self):
-		return self.function;
-
-	def __str__(self):
-		return self.function;
+class FuncCallVisitor():
+	"""Adds the calls the index finds to a function to the CFG of a session"""
+	def __init__(self, funcname, startingNode, session):
+		"""Store information we'll need here"""
+		self.funcname 		= funcname 			#The name of the function call nodes we are looking for
+		self.currentCFGNode = startingNode;		#
+		self.session 		= session;			#The AnalysisSession whose CFG we are adding to
+
+	def traceCallSite(self, isDefinedIn, chain):
+		"""Adds a call to self.funcname made inside of the FuncDef isDefinedIn to the CFG
+		   chain is the (ast_node, conditionResult) list between the call and isDefinedIn"""
+		#Check if this method is already in the parent node's children, if so we don't need to add it again, if not add it
+		#NOTE: We probably want to know all calls inside a method as well as the line numbers those calls are on
+		if (self.currentCFGNode.has_parent(self.funcname)):
+			return;
 
-	def add_child(self, child, duplicates=True):
-		"""Add a child node to this node"""
-		if (not duplicates and any(c.uniqueID == child.uniqueID for c in self.children)):
-			pass;
+		#Holds CFGNodes (in order) that represent if/else/switch/for/while.  If the entire list is false evaluations then this path is an else
+		conditionsAndLoops = [self.session.conditionCFGNode(astNode, conditionResult) for astNode, conditionResult in chain];
+
+		#Get the name of the function we are in, a whole recursion cycle is one method
+		methodName = self.session.methodLabel(isDefinedIn.decl.name);
+
+		#Something really bad happened for us to not find the name for this FuncDef node
+		if (methodName is None):
+			print("ERROR (FATAL): unable to locate function name holding call to " + self.funcname);
+			sys.exit();
+
+		session = self.session;
+		newNode = None;
+		if (methodName in session.funcDefCFGNodes.keys()):
+			newNode = session.funcDefCFGNodes[methodName];
+
+		#Make a CFG node for this "new" node, and add it to the methodQueue only if it is not already in the methodQueue or traced
+		if (methodName not in session.tracedMethods and methodName not in session.queuedMethods):
+			if (newNode is None):
+				newNode = session.newNode(methodName, isDefinedIn);			#Make the new CFGNode
+				session.funcDefCFGNodes[methodName] = newNode;
+				session.astToCfg[isDefinedIn] = newNode;
+
+			#Add the list of conditionals if we need to
+			lastNode = self.currentCFGNode.add_children_depth(conditionsAndLoops, duplicates=False);
+			lastNode.add_child(newNode, duplicates=False);				#Add the new CFGNode as a child of the current CFGNode
+			session.enqueue(methodName, newNode);		#Add the method we found it in to the methodQueue
 		else:
-			self.children.append(child);
-			child.parents.append(self);
-			#print("Adding %s (%s) to the tree as child of %s (%s)" % (child.function, child.uniqueID, self.function, self.uniqueID));
+			#Add the list of conditionals if we need to
+			lastNode = self.currentCFGNode.add_children_depth(conditionsAndLoops, duplicates=False);
+			lastNode.add_child(session.funcDefCFGNodes[methodName], duplicates=False);
+
+
+def conditionLabel(astNode, conditionResult, cache=None):
+	"""The label of an if/switch/case/loop/ternary CFG node, If nodes ending in :: True or :: False"""
+	if (isinstance(astNode, c_ast.If)):
+		return resolveToString(astNode, cache) + (" :: True" if conditionResult == 0 else " :: False");
+	return resolveToString(astNode, cache);
+
+
+def renderUnaryOp(node, strings):
+	"""Postfix ops (p++, p--) go after the expression, everything else before it"""
+	op = str(node.op);
+	if (op.startswith('p')):
+		return (strings[0] + op[1:]);
+	if (op == 'sizeof'):
+		return ("sizeof(" + strings[0] + ')');
+	return (op + strings[0]);
+
+
+def renderDecl(node, strings):
+	"""Type and name come from CGenerator (types are shallow), the initializer from resolveToString"""
+	decl = copy.copy(node);
+	decl.init = None;
+	declaration = c_generator.CGenerator().visit(decl);
+	return (declaration + " = " + strings[0]) if node.init is not None else declaration;
+
+
+def renderCompound(node, strings):
+	print("ERROR: we should never be resolving 'Compound' to a string");
+	return "";
+
+
+#How resolveToString renders each PyCParser node class:
+#	(function giving the child nodes to render first, function joining the node and those children's strings)
+#Children may be None, which render as ""
+RENDERERS = {
+	c_ast.ArrayRef: 	(lambda n: [n.name, n.subscript], 				lambda n, s: s[0] + '[' + s[1] + ']'),
+	c_ast.Assignment: 	(lambda n: [n.lvalue, n.rvalue], 				lambda n, s: s[0] + str(n.op) + s[1]),
+	c_ast.BinaryOp: 	(lambda n: [n.left, n.right], 					lambda n, s: ('(%s %s %s)' if n.op in ("&&", "||") else '%s %s %s') % (s[0], n.op, s[1])),
+	c_ast.Break: 		(lambda n: [], 									lambda n, s: "break"),
+	c_ast.Case: 		(lambda n: [n.expr], 							lambda n, s: "case " + s[0]),
+	c_ast.Cast: 		(lambda n: [n.to_type, n.expr], 				lambda n, s: '(' + s[0] + ')' + s[1]),
+	c_ast.Compound: 	(lambda n: [], 									renderCompound),
+	c_ast.Constant: 	(lambda n: [], 									lambda n, s: n.value),
+	c_ast.Continue: 	(lambda n: [], 									lambda n, s: "continue"),
+	c_ast.Decl: 		(lambda n: [n.init], 							renderDecl),
+	c_ast.DeclList: 	(lambda n: list(n.decls), 						lambda n, s: ', '.join(s)),
+	c_ast.Default: 		(lambda n: [], 									lambda n, s: "default"),
+	c_ast.DoWhile: 		(lambda n: [n.cond], 							lambda n, s: "DoWhile (" + s[0] + ')'),
+	c_ast.ExprList: 	(lambda n: list(n.exprs), 						lambda n, s: ', '.join(s)),
+	c_ast.For: 			(lambda n: [n.init, n.cond, n.next], 			lambda n, s: "for (" + s[0] + "; " + s[1] + "; " + s[2] + ")"),
+	c_ast.FuncCall: 	(lambda n: [n.name, n.args], 					lambda n, s: s[0] + '(' + s[1] + ')'),
+	c_ast.Goto: 		(lambda n: [], 									lambda n, s: "Goto " + n.name),
+	c_ast.ID: 			(lambda n: [], 									lambda n, s: n.name),
+	c_ast.If: 			(lambda n: [n.cond], 							lambda n, s: "if " + s[0]),
+	c_ast.InitList: 	(lambda n: list(n.exprs), 						lambda n, s: '{' + ', '.join(s) + '}'),
+	c_ast.Pragma: 		(lambda n: [], 									lambda n, s: "pragma " + n.string),
+	c_ast.Return: 		(lambda n: [n.expr], 							lambda n, s: ("return " + s[0]) if n.expr is not None else "return"),
+	c_ast.StructRef: 	(lambda n: [n.name, n.field], 					lambda n, s: s[0] + n.type + s[1]),
+	c_ast.Switch: 		(lambda n: [n.cond], 							lambda n, s: "switch (" + s[0] + ')'),
+	c_ast.TernaryOp: 	(lambda n: [n.cond, n.iftrue, n.iffalse], 		lambda n, s: s[0] + ' ? ' + s[1] + ' : ' + s[2]),
+	c_ast.Typename: 	(lambda n: [], 									lambda n, s: c_generator.CGenerator().visit(n)),
+	c_ast.UnaryOp: 		(lambda n: [n.expr], 							renderUnaryOp),
+	c_ast.While: 		(lambda n: [n.cond], 							lambda n, s: "while (" + s[0] + ')'),
+};
+
+
+def resolveToString(node, cache=None):
+	"""Takes the PyCParser node and returns a string representation of it
+	   cache: dict of AST node -> string, so a condition seen from many call sites is only rendered once
+	   Uses an explicit stack, so deeply nested expressions don't hit the recursion limit"""
+	if (node is None):
+		return "";
+	if (cache is not None and node in cache):
+		return cache[node];
+
+	strings = [];				#Rendered nodes waiting to be joined into their parent
+	stack = [(node, False)];	#(node, have its children been rendered yet)
+	while (stack):
+		curr, childrenDone = stack.pop();
+		if (curr is None):
+			strings.append("");
+			continue;
+
+		renderer = RENDERERS.get(curr.__class__);
+		if (renderer is None):
+			#Anything without a renderer is left to PyCParser's own C generator
+			strings.append(c_generator.CGenerator().visit(curr));
+			continue;
+
+		children, join = renderer;
+		if (not childrenDone):
+			stack.append( (curr, True) );
+			for child in reversed(children(curr)):
+				stack.append( (child, False) );
+		else:
+			count = len(children(curr));
+			childStrings = strings[len(strings) - count:];
+			del strings[len(strings) - count:];
+			strings.append(join(curr, childStrings));
 
-	def add_children_depth(self, children, duplicates=True):
-		"""Adds a list of children vertically :: returns the last child in the list"""
-		lastNode = self;
-		for child in children:
-			lastNode.add_child(child, duplicates=duplicates);
-			lastNode = child;
+	if (cache is not None):
+		cache[node] = strings[0];
+	return strings[0];
 
-		return lastNode;
 
-	def print_tree(self, spaces):
-		"""Textual version of the CFG from this node downward"""
-		print(spaces*" " + self.__str__());	#2 spaces per level
-		for child in self.children:
-			child.print_tree(spaces + 2);
+class AnalysisSession():
+	"""
+	Owns all of the state of an analysis: the CFGGraph, the methodQueue, and the AST -> CFGNode maps
+	Sessions are cheap to make and throw away, and separate sessions can run side by side in threads or processes
+	A single session must only be used by one thread at a time
+	"""
+	def __init__(self, project=None, cache=None, prune=False):
+		self.project 	= project;	#projectParser.Project to trace across, None to parse each sink's file on its own
+		self.cache 		= cache;	#parseCache.ParseCache to load ASTs from, or None
+		self.feasibility = Feasibility() if prune else None;	#Drops calls the constants of their function rule out, None to keep every call
+		self.asts 		= {};		# FileName: (ast, index, name of the file in the AST coords) of every file loaded
+		self.labelCache = {};		#AST node: resolveToString of it, kept across resets since the ASTs are too
+		self.reset();
+
+	def reset(self):
+		"""Throw away the CFG state of the last analysis so the next one starts clean"""
+		self.graph 			= CFGGraph();	#Every CFGNode made since the last reset
+		self.methodQueue 	= deque();	#Queue of tuples (methodName, methodNode) of methods we're tracing.  methodNode is the CFGNode of the method
+		self.queuedMethods 	= set();	#Names of the methods currently in the methodQueue
+		self.rootNode 		= None;		#The root of our tree
+		self.astToCfg 		= {};		#Ast_Node:CFGNode, to keep track of existing AST_nodes
+		self.funcDefCFGNodes = {};		# FunctionName: CFGNode
+		self.tracedMethods 	= set();	#Names of the methods whose funcDefCFGNodes node has had its callers traced
+		self.callGraph 		= None;		#CallGraph of the index being traced, methods are its components
+
+	def feasibleSite(self, site):
+		"""Is a CallSite kept, always True unless infeasible paths are being pruned"""
+		if (self.feasibility is None or self.feasibility.feasibleSite(site)):
+			return True;
+		profiler.count('callSitesPruned');
+		return False;
+
+	def methodLabel(self, function):
+		"""Name of the method (CallGraph component) function belongs to, its whole recursion cycle if it is in one"""
+		if (self.callGraph is None):
+			return function;
+		return self.callGraph.label(function);
+
+	def enqueue(self, methodName, methodNode):
+		"""Add a method to the back of the methodQueue"""
+		self.methodQueue.append( (methodName, methodNode) );
+		self.queuedMethods.add(methodName);
+
+	def newNode(self, funcname, ast_info):
+		"""Make a CFGNode in this session's graph, only the coordinates of ast_info are kept"""
+		return self.graph.addNode(funcname, ast_info);
+
+	def conditionCFGNode(self, astNode, conditionResult):
+		"""The CFGNode for an if/switch/case/loop/ternary AST node, made the first time it is needed
+		   conditionResult is 0 (True) or 1 (False) for If nodes and None otherwise"""
+		astToCfg = self.astToCfg;
+
+		#Each If has a node for the True path and a node for the False path
+		if (isinstance(astNode, c_ast.If)):
+			#Ensure we don't get a KeyError
+			if (astNode not in astToCfg):
+				astToCfg[astNode] = [None, None];
+
+			#Make the new node if it doesn't already exist
+			if (not astToCfg[astNode][conditionResult]):
+				with profiler.phase('labels'):
+					label = conditionLabel(astNode, conditionResult, self.labelCache);
+				astToCfg[astNode][conditionResult] = self.newNode(label, astNode);
+
+			return astToCfg[astNode][conditionResult];
+
+		#If we already have a CFGNode for this ast_node use it, don't make a new one
+		try:
+			return astToCfg[astNode];
+		except KeyError:
+			with profiler.phase('labels'):
+				label = conditionLabel(astNode, conditionResult, self.labelCache);
+			newNode = self.newNode(label, astNode);
+			astToCfg[astNode] = newNode;
+			return newNode;
+
+	def loadAST(self, filename):
+		"""Returns (ast, index, filename) for filename, filename being the name it has inside the AST coords
+		   Files are only parsed the first time this session needs them"""
+		if (self.project is not None):
+			#The AST and index already span every C file (every one parsed so far if it is lazy), so callers can come from any of them
+			astFilename = self.project.resolveFile(filename);
+			self.project.needFiles([astFilename], self.cache);
+			return (self.project.ast, self.project.index, astFilename);
+
+		if (filename not in self.asts):
+			if (self.cache is not None):
+				ast, index = self.cache.parse(filename);
+			else:
+				#Create the AST to parse, and index every function call in it once
+				ast, index = parseFile(filename);
+			self.asts[filename] = (ast, index, filename);
+
+		return self.asts[filename];
+
+	#
+	#For each methodName, methodNode in methodQueue:
+	#	Find each instance of the function call, put those in a queue
+	#	For each instance, find what function that call is inside of
+	#Repeat these steps using the new function each time until we reach main on all instances
+	#
+	def traceFromLine(self, index, lineNo, funcDefName, funcDefNode, lineNode=None, onPath=None):
+		"""Builds the CFG from the sink at lineNo (inside of funcDefName) upward :: returns its root node
+		   Methods already traced by an earlier sink on the same AST are linked to, not traced again
+		   onPath: only callers in this set are traced (see callSiteIndex.pathFunctions), None for every caller
+		   Methods are the components of the condensed call graph, so a recursion cycle is one node and the CFG is a DAG"""
+		self.callGraph = index.callGraph();
+		funcDefName = self.methodLabel(funcDefName);
+		nodesBefore, edgesBefore = len(self.graph), len(self.graph.edgeFrom);
+		self.rootNode = self.newNode("Line " + str(lineNo), lineNode);
+
+		#An earlier sink already traced this function's callers, so all we need is the link
+		if (funcDefName in self.tracedMethods):
+			self.rootNode.add_child(self.funcDefCFGNodes[funcDefName]);
+			return self.rootNode;
+
+		lineFuncNode = self.newNode(funcDefName, funcDefNode);
+		self.rootNode.add_child(lineFuncNode);
+
+		#Add those to the methodQueue
+		self.enqueue(funcDefName, lineFuncNode);
+
+		#Trace continually while we have methods to look for in the methodQueue
+		#Each method's callers come straight from the index instead of walking the whole AST again
+		v = FuncCallVisitor('', None, self);
+		iterations = 0;
+		traced = 0;
+		while (self.methodQueue):
+			iterations += 1;
+			methodName, methodNode = self.methodQueue.popleft();
+			self.queuedMethods.discard(methodName);
+			if (self.funcDefCFGNodes.get(methodName) == methodNode):
+				self.tracedMethods.add(methodName);
+			v.funcname = methodName;
+			v.currentCFGNode = methodNode;
+			for site in self.callGraph.callSitesInto(index, labelMembers(methodName)[0]):
+				if ((onPath is None or site.caller() in onPath) and self.feasibleSite(site)):
+					traced += 1;
+					v.traceCallSite(site.funcDef, site.chain);
+
+		profiler.count('worklistIterations', iterations);
+		profiler.count('callSitesTraced', traced);
+		profiler.count('cfgNodes', len(self.graph) - nodesBefore);
+		profiler.count('cfgEdges', len(self.graph.edgeFrom) - edgesBefore);
+		return self.rootNode;
+
+	def scanSinks(self, filenames, catalogue):
+		"""
+		Every call to a function of catalogue (a sinkScanner.Catalogue) in filenames :: returns [SinkHit]
+		filenames None scans every file of the project
+		The hits come from the same ASTs and indexes the traces use, so scanning and then tracing parses each file once
+		"""
+		if (self.project is not None):
+			if (self.project.lazy):
+				#Only files that mention a catalogue function can call it by name, a pointer to one can be called from anywhere
+				identifiers = self.project.identifiers;
+				names = catalogue.matching(identifiers.postings);
+				if (any(identifiers.addressTaken(name) for name in names)):
+					self.project.needFiles([filename for filename, cppArgs in self.project.files], self.cache);
+				else:
+					self.project.needFiles(identifiers.filesMentioning(names), self.cache);
+			files = None;
+			if (filenames is not None):
+				files = set(self.project.resolveFile(filename) for filename in filenames);
+			with profiler.phase('scan'):
+				return findSinks(self.project.index, catalogue, files);
+
+		hits = [];
+		for filename in filenames:
+			ast, index, astFilename = self.loadAST(filename);
+			with profiler.phase('scan', filename):
+				hits += [hit._replace(file=filename) for hit in findSinks(index, catalogue, set([astFilename]))];
+		return hits;
+
+	def needCallers(self, function):
+		"""With a lazy project, parse the files the callers of function (and theirs) may be in :: returns the project's index"""
+		self.project.needCallers(function, self.cache);
+		return self.project.index;
+
+	def parseForCFGs(self, sinks, source=None):
+		"""
+		Batch version of parseForCFG :: returns [(filename, lineNo, rootNode)], rootNode None if nothing is on that line
+		sinks is a list of (filename, lineNo); each file is parsed once
+		CFG nodes of the methods above the sinks are shared between the returned graphs, so common call chains are traced once
+		The node on each line is looked up in the file's CallSiteIndex rather than found by walking the AST
+		source: a function name (or line number in the sink's file) to trace from, only the calls on paths from it to a sink are kept
+		"""
+		self.reset();
+		return self.traceSinks(sinks, source);
+
+	def traceSinks(self, sinks, source=None):
+		"""parseForCFGs without the reset, so CFG nodes left over from earlier sinks (in project mode) are linked to"""
+		#Group the line numbers by file, keeping the order files were first given in
+		lines = {};
+		order = [];
+		for filename, lineNo in sinks:
+			if (filename not in lines):
+				lines[filename] = [];
+				order.append(filename);
+			lines[filename].append(lineNo);
+
+		roots = {};
+		for filename in order:
+			with profiler.phase('load', filename):
+				ast, index, astFilename = self.loadAST(filename);
+
+			#Different files on their own are different programs, their method names can't share CFG nodes
+			if (self.project is None):
+				self.reset();
+
+			#Every line is a lookup in the index instead of a walk of the AST
+			for lineNo in lines[filename]:
+				found = index.lookupLine(astFilename, lineNo);
+				if (found is None or found[1] is None):
+					print("ERROR: unable to retrieve node for " + filename + " line " + str(lineNo));
+					roots[(filename, lineNo)] = None;
+					continue;
+
+				vulnerableNode, funcDefName, funcDefNode = found;
+				if (self.project is not None and self.project.lazy):
+					index = self.needCallers(funcDefName);
+				onPath = None;
+				if (source is not None):
+					#The same source keeps every caller of a function to the same set, so sinks can still share nodes
+					sourceName, onPath = self.sourcePath(index, astFilename, source, funcDefName);
+					if (not onPath):
+						print("ERROR: no call path from " + str(source) + " to " + filename + " line " + str(lineNo));
+						roots[(filename, lineNo)] = None;
+						continue;
+				with profiler.phase('trace', filename):
+					roots[(filename, lineNo)] = self.traceFromLine(index, lineNo, funcDefName, funcDefNode, vulnerableNode, onPath);
+
+		return [(filename, lineNo, roots[(filename, lineNo)]) for filename, lineNo in sinks];
+
+	def invalidate(self, functions, files):
+		"""
+		Forget every CFG node whose call chain passes through one of 'functions' or was made from one of 'files'
+		Those nodes stay in the graph but are no longer linked to, so the next trace through them builds them again
+		Returns the set of stale node IDs
+		"""
+		graph = self.graph;
+		stale = set();
+		queue = deque();
+		for nodeID in range(len(graph)):
+			coord = graph.coord(nodeID);
+			if (coord is None):
+				continue;
+			if (coord.file in files or (coord.kind == 'FuncDef' and not functions.isdisjoint(labelMembers(graph.label(nodeID))))):
+				stale.add(nodeID);
+				queue.append(nodeID);
+
+		#Children are callers, so everything above a stale node in the graph was traced through it
+		while (queue):
+			for parentID in graph.parentIDs(queue.popleft()):
+				parentID = int(parentID);
+				if (parentID not in stale):
+					stale.add(parentID);
+					queue.append(parentID);
+
+		for name, node in list(self.funcDefCFGNodes.items()):
+			if (node.id in stale):
+				del self.funcDefCFGNodes[name];
+				self.tracedMethods.discard(name);
+
+		for astNode, cfgNodes in list(self.astToCfg.items()):
+			if (not isinstance(cfgNodes, list)):
+				cfgNodes = [cfgNodes];
+			if ((astNode.coord is not None and astNode.coord.file in files) or any(node is not None and node.id in stale for node in cfgNodes)):
+				del self.astToCfg[astNode];
+
+		for astNode in list(self.labelCache):
+			if (astNode.coord is not None and astNode.coord.file in files):
+				del self.labelCache[astNode];
+
+		return stale;
+
+	def sourcePath(self, index, astFilename, source, sinkFunction):
+		"""
+		(name of source, functions on a call path from it to sinkFunction), the set empty if there is no path
+		source is a function name or a line number of astFilename
+		"""
+		if (isinstance(source, int)):
+			found = index.lookupLine(astFilename, source);
+			if (found is None or found[1] is None):
+				return (None, set());
+			source = found[1];
+		return (source, pathFunctions(index, source, sinkFunction));
+
+	def parseForCFG(self, filename, lineNo, source=None):
+		"""Parse the file filename for a Control Flow Graph starting at lineNo :: returns the root node, None if nothing is on that line"""
+		return self.parseForCFGs([(filename, lineNo)], source)[0][2];
+
+	def iterPaths(self, filename, lineNo, maxDepth=None, maxPaths=None, timeBudget=None, source=None):
+		"""
+		Generator of the TracePaths from every entry point down to the sink at lineNo, one at a time
+		Paths are walked depth first straight off the CallSiteIndex, so no CFG is built and the first path comes out right away
+			maxDepth: most calls on a path, longer paths are yielded cut short with truncated set
+			maxPaths: stop after this many paths
+			timeBudget: stop after this many seconds
+			source: a function name (or line number in filename) the paths must start at, only functions on a path from it are walked
+		A caller already on the path (recursion) is not followed again
+		"""
+		deadline = (time.time() + timeBudget) if timeBudget is not None else None;
+
+		with profiler.phase('load', filename):
+			ast, index, astFilename = self.loadAST(filename);
+		found = index.lookupLine(astFilename, lineNo);
+		if (found is None or found[1] is None):
+			print("ERROR: unable to retrieve node for " + filename + " line " + str(lineNo));
+			return;
 
+		vulnerableNode, funcDefName, funcDefNode = found;
+		if (self.project is not None and self.project.lazy):
+			index = self.needCallers(funcDefName);
+		sourceName, allowed = (None, None);
+		if (source is not None):
+			sourceName, allowed = self.sourcePath(index, astFilename, source, funcDefName);
+			if (not allowed):
+				print("ERROR: no call path from " + str(source) + " to " + filename + " line " + str(lineNo));
+				return;
 
-class FuncCallVisitor(c_ast.NodeVisitor):
-	"""Used to interact with all FuncCall nodes"""
-	def __init__(self, funcname, startingNode):
-		"""Store information we'll need here"""
-		self.funcname 		= funcname 			#The name of the function call nodes we are looking for
-		self.currentCFGNode = startingNode;		#
-		self.parentList = [];	#Keeps track of the list of nodes we've seen on this path in the AST (works b/c generic_visit is DFS)
-
-	def visit_FuncCall(self, node):
-		"""Triggers every time we find a FuncCall node in PyCParser's AST"""
-		#If this node is of the function we are looking for
-		if node.name.name == self.funcname:
-			#Check if this method is already in the parent node's children, if so we don't need to add it again, if not add it
-			#NOTE: We probably want to know all calls inside a method as well as the line numbers those calls are on
-			if ( not any(x.function == node.name.name for x in self.currentCFGNode.parents) ):
-				#self.currentCFGNode.add_parent( CFGNode(node.name.name, node) );
-				
-				#Upwards trace of c_ast nodes until we find the FuncDef that 'node' is inside of
-				numberAboveCurrent = -1;
-				isDefinedIn = self.parentList[numberAboveCurrent];
-				conditionsAndLoops = [];	#Holds CFGNodes (in order) that represent if/else/switch/for/while.  If the entire list is false evaluations then this path is an else
-				inIfRecurse = False;
-				while (not isinstance(isDefinedIn, c_ast.FuncDef)):
-					if (isinstance(isDefinedIn, c_ast.FileAST)):	#If we get to the top of the AST something really bad happened
-						print("ERROR (FATAL): upward parent trace reached FileAST node");
-						sys.exit();
-
-					#Deals with if/else if[ else if [ else if...]]/else
-					if (isinstance(isDefinedIn, c_ast.If)):
-						#Get the BinaryOP and then the string representing it
-						conditionResult = None;
-
-						#Get the compound reperesenting the outcome of this if's flow that we came from
-						ifCompound = self.parentList[numberAboveCurrent + 1];
-
-						#If we're in an If recurse or the compound was the false part of the if/else, this must resolve to false
-						if (inIfRecurse or ifCompound is isDefinedIn.iffalse):
-							conditionResult = 1;
-
-						#If the compound we just came form is 1st child, the if statement BinaryOp must be true
-						elif (ifCompound is isDefinedIn.iftrue):
-							conditionResult = 0;
-
-						#Ensure we don't get a KeyError
-						if (isDefinedIn not in astToCfg):
-							astToCfg[isDefinedIn] = [None, None];
-
-						#Make the new node if it doesn't already exist
-						if (not astToCfg[isDefinedIn][conditionResult]):
-							conditionString = resolveToString(isDefinedIn);
-							newNode = None;
-							if (conditionResult == 0):
-								newNode = CFGNode(conditionString + " :: True", isDefinedIn);
-							else:
-								newNode = CFGNode(conditionString + " :: False", isDefinedIn);
-							astToCfg[isDefinedIn][conditionResult] = newNode;
-							
-						conditionsAndLoops.append(astToCfg[isDefinedIn][conditionResult]);
-
-						#Indicate we may be in an upwards recusive if/else if/else tree
-						inIfRecurse = True;
-
-					#TODO: Logic for dealing with switch statements goes here
-					elif (isinstance(isDefinedIn, c_ast.Switch)):
-						#isDefinedIn.cond is the BinaryOp object
-						inIfRecurse = False;
-
-						#Resolve our strings
-						switchString = resolveToString(isDefinedIn);
-						
-						#If we already have a CFGNode for this ast_node use it, don't make a new one
-						newNode = None;
-						try:
-							newNode = astToCfg[isDefinedIn];
-						except KeyError:
-							newNode = CFGNode(switchString, isDefinedIn);
-							astToCfg[isDefinedIn] = newNode;
-							
-						conditionsAndLoops.append(newNode);
-
-					#This should always be hit before the above Switch elif
-					elif (isinstance(isDefinedIn, c_ast.Case)):
-						caseString = resolveToString(isDefinedIn);
-
-						#If we already have a CFGNode for this ast_node use it, don't make a new one
-						newNode = None;
-						try:
-							newNode = astToCfg[isDefinedIn];
-						except KeyError:
-							newNode = CFGNode(caseString, isDefinedIn);
-							astToCfg[isDefinedIn] = newNode;
-							
-						conditionsAndLoops.append(newNode);
-
-						inIfRecurse = False;
-
-					#For loop
-					elif (isinstance(isDefinedIn, c_ast.For)):
-						inIfRecurse = False;
-						forString = resolveToString(isDefinedIn);
-
-						#If we already have a CFGNode for this ast_node use it, don't make a new one
-						newNode = None;
-						try:
-							newNode = astToCfg[isDefinedIn];
-						except KeyError:
-							newNode = CFGNode(forString, isDefinedIn);
-							astToCfg[isDefinedIn] = newNode;
-							
-						conditionsAndLoops.append(newNode);
-
-					#While loop
-					elif (isinstance(isDefinedIn, c_ast.While)):
-						inIfRecurse = False;
-						whileString = resolveToString(isDefinedIn);
-
-						#If we already have a CFGNode for this ast_node use it, don't make a new one
-						newNode = None;
-						try:
-							newNode = astToCfg[isDefinedIn];
-						except KeyError:
-							newNode = CFGNode(whileString, isDefinedIn);
-							astToCfg[isDefinedIn] = newNode;
-							
-						conditionsAndLoops.append(newNode);
-
-					#DoWhile loop
-					elif (isinstance(isDefinedIn, c_ast.DoWhile)):
-						inIfRecurse = False;
-						doWhileString = resolveToString(isDefinedIn);
-
-						#If we already have a CFGNode for this ast_node use it, don't make a new one
-						newNode = None;
-						try:
-							newNode = astToCfg[isDefinedIn];
-						except KeyError:
-							newNode = CFGNode(doWhileString, isDefinedIn);
-							astToCfg[isDefinedIn] = newNode;
-							
-						conditionsAndLoops.append(newNode);
-
-					elif (isinstance(isDefinedIn, c_ast.TernaryOp)):
-						inIfRecurse = False;
-
-						ternaryString = resolveToString(isDefinedIn);
-
-						#If we already have a CFGNode for this ast_node use it, don't make a new one
-						newNode = None;
-						try:
-							newNode = astToCfg[isDefinedIn];
-						except KeyError:
-							newNode = CFGNode(ternaryString, isDefinedIn);
-							astToCfg[isDefinedIn] = newNode;
-							
-						conditionsAndLoops.append(newNode);
-
-					else:
-						inIfRecurse = False;
-
-					numberAboveCurrent -= 1;
-					isDefinedIn = self.parentList[numberAboveCurrent];
-
-				#Get the name and location of the function we are in
-				methodName = isDefinedIn.decl.name;
-				methodLocation = isDefinedIn.decl.coord;
-
-				#Something really bad happened for us to not find the name for this FuncDef node
-				if (methodName is None):
-					print("ERROR (FATAL): unable to locate function name holding call to " + self.funcname);
-					sys.exit();
-
-				newNode = None;
-				if (methodName in funcDefCFGNodes.keys()):
-					newNode = funcDefCFGNodes[methodName];
-
-				#Make a CFG node for this "new" node, and add it to the methodQueue only if it is not already in the methodQueue
-				if (not any(entry[0] == methodName for entry in methodQueue) ):
-					if (newNode is None):
-						newNode = CFGNode(methodName, isDefinedIn);			#Make the new CFGNode
-						funcDefCFGNodes[methodName] = newNode;
-						astToCfg[isDefinedIn] = newNode;
-
-					#Add the list of conditionals if we need to
-					lastNode = self.currentCFGNode.add_children_depth(conditionsAndLoops, duplicates=False);
-					lastNode.add_child(newNode, duplicates=False);				#Add the new CFGNode as a child of the current CFGNode
-					methodQueue.append( (methodName, newNode) );		#Add the method we found it in to the methodQueue
-				else:
-					#Add the list of conditionals if we need to
-					lastNode = self.currentCFGNode.add_children_depth(conditionsAndLoops, duplicates=False);
-					lastNode.add_child(funcDefCFGNodes[methodName], duplicates=False);
+		#path holds (function, CallSite into the function below it) from the sink upward
+		#each stack frame is [iterator over the function's call sites, did any of them go further up]
+		path = [(funcDefName, None)];
+		if (funcDefName == sourceName):
+			yield TracePath(lineNo, path, False, self.labelCache);
+			return;
+		onPath = set([funcDefName]);
+		stack = [[iter(index.callSites(funcDefName)), False]];
+		count = 0;
+		while (stack):
+			if (deadline is not None and time.time() > deadline):
+				return;
 
-		#Visit all children of this node
-		FuncCallVisitor.generic_visit(self, node);
+			frame = stack[-1];
+			site = next(frame[0], None);
+
+			#Out of call sites: a function nobody (but itself) calls is where a path starts
+			if (site is None):
+				if (not frame[1] and sourceName is None):
+					yield TracePath(lineNo, path, False, self.labelCache);
+					count += 1;
+					if (maxPaths is not None and count >= maxPaths):
+						return;
+				stack.pop();
+				onPath.discard(path.pop()[0]);
+				continue;
+
+			caller = site.caller();
+			if (caller in onPath or (allowed is not None and caller not in allowed) or not self.feasibleSite(site)):
+				continue;
+			frame[1] = True;
+
+			path.append( (caller, site) );
+			if (caller == sourceName):
+				#Paths start at the source, whoever calls it
+				yield TracePath(lineNo, path, False, self.labelCache);
+				count += 1;
+				if (maxPaths is not None and count >= maxPaths):
+					return;
+				path.pop();
+			elif (maxDepth is not None and len(path) > maxDepth):
+				yield TracePath(lineNo, path, bool(index.callSites(caller)), self.labelCache);
+				count += 1;
+				if (maxPaths is not None and count >= maxPaths):
+					return;
+				path.pop();
+			else:
+				onPath.add(caller);
+				stack.append([iter(index.callSites(caller)), False]);
 
-	def generic_visit(self, node):
-		"""Overrides the standard generic_visit method to keep track of the parent listings,
-		   which are accessed while traversing"""
 
-		#We are about to move down another level, so add this node to the parentList
-		self.parentList.append(node);
-		
-		#Go through all of this node's children
-		for c_name, c in node.children():
-			self.visit(c);
+class FlatSession(AnalysisSession):
+	"""
+	AnalysisSession over a flatIndex.FlatIndex of a whole project instead of its AST, for parseForCFGsParallel workers:
+	the index is mmapped and queried in place, so a worker neither unpickles the project nor rebuilds its tables
+	Call chains hold FlatConditions that carry their own text, which is all conditionCFGNode needs of them
+	"""
+	def __init__(self, flat):
+		AnalysisSession.__init__(self);
+		self.flat = flat;	#The FlatIndex every file is traced in
+
+	def loadAST(self, filename):
+		"""(None, the FlatIndex, filename as in its coords): there is no AST, the index spans every file"""
+		return (None, self.flat, self.flat.resolveFile(filename));
+
+	def conditionCFGNode(self, condition, conditionResult):
+		"""The CFGNode for a FlatCondition, one per side of an If as in AnalysisSession.conditionCFGNode"""
+		isIf = condition.kind == 'If';
+		key = (condition, conditionResult) if isIf else condition;
+		try:
+			return self.astToCfg[key];
+		except KeyError:
+			label = condition.text + ((" :: True" if conditionResult == 0 else " :: False") if isIf else "");
+			newNode = self.newNode(label, condition);
+			self.astToCfg[key] = newNode;
+			return newNode;
+
+
+class TracePath():
+	"""
+	One path from an entry point down to a sink, as yielded by AnalysisSession.iterPaths
+	steps are (function, [conditions around the call to the next function]) from the entry point to the sink's function
+	"""
+	def __init__(self, lineNo, path, truncated, cache=None):
+		self.lineNo 	= lineNo;		#The sink's line number
+		self.truncated 	= truncated;	#True if the path was cut short by maxDepth, so steps[0] may have callers of its own
+		self.steps 		= [];
+
+		#path runs from the sink upward, each entry holding its call site into the function below it
+		for function, site in reversed(path):
+			conditions = [];
+			if (site is not None):
+				#The chain runs from the call outward, the path reads from the outside in
+				conditions = [conditionLabel(astNode, conditionResult, cache) for astNode, conditionResult in reversed(site.chain)];
+			self.steps.append( (function, conditions) );
 
-		#We just finished all children, and are about to move up a level, so remove this node from the parentList
-		self.parentList.pop(-1);
+	def __repr__(self):
+		return self.__str__();
 
+	def __str__(self):
+		parts = [];
+		for function, conditions in self.steps:
+			parts.append(function);
+			parts.extend(conditions);
+		parts.append("Line " + str(self.lineNo));
+		return (" -> ".join(parts) + (" (truncated)" if self.truncated else ""));
 
-class LineNumberVisitor(c_ast.NodeVisitor):
-	"""This class' sole purpose is to find the first c_ast node on a certain line number"""
+	def functions(self):
+		"""The functions on this path, entry point first"""
+		return [function for function, conditions in self.steps];
 
-	def __init__(self, linenumber, file):
-		self.lineno 	= linenumber;	#The line number we are looking for
-		self.fileName 	= file;			#The file in which we are looking for
-		self.ast_node 	= None;			#The node found on the specified linenumber
-		self.lastFuncDefName = None;	#The name of the function this line number is inside of
-		self.lastFuncDefNode = None;	#The FuncDef node this line number is inside of
+	def conditions(self):
+		"""Every branch condition on this path, outermost first"""
+		return [condition for function, conditions in self.steps for condition in conditions];
 
-	def generic_visit(self, node):
-		"""Overrides the standard generic_visit to find the node on the specified line number"""
 
-		#We found our node on the line, don't do anything more
-		if (self.ast_node is not None):
+class IncrementalAnalysis():
+	"""
+	Keeps a Project, its AnalysisSession and the CFG of every sink traced so far, so a change to a few C files only re-parses
+	those files and only re-traces the sinks whose call chains pass through a function that changed
+	save()/load() keep all of it in a state file between runs
+	"""
+	def __init__(self, project, cache=None):
+		self.project 	= project;	#projectParser.Project every sink is traced across
+		self.session 	= AnalysisSession(project, cache);
+		self.roots 		= {};		# (FileName, LineNumber): root CFGNode, of the sinks whose trace worked
+
+	def analyze(self, sinks):
+		"""
+		CFGs of sinks ([(filename, lineNo)]) :: returns [(filename, lineNo, rootNode)]; sinks traced before are not traced again
+		A sink whose trace failed isn't kept, so it is traced (and its error printed) again every time
+		"""
+		new = [sink for sink in sinks if self.roots.get(sink) is None];
+		for filename, lineNo, root in self.session.traceSinks(new):
+			if (root is not None):
+				self.roots[(filename, lineNo)] = root;
+		return [(filename, lineNo, self.roots.get((filename, lineNo))) for filename, lineNo in sinks];
+
+	def refresh(self, processes=None):
+		"""
+		Re-parse the files that changed since the last refresh and re-trace only the sinks their changes reach
+		Returns the list of sinks that were re-traced
+		"""
+		changedFiles, affected = self.project.refresh(processes, self.session.cache);
+		if (not changedFiles):
+			return [];
+
+		stale = self.session.invalidate(affected, changedFiles);
+		retrace = [];
+		for sink, root in self.roots.items():
+			if (root is None or root.id in stale or self.project.resolveFile(sink[0]) in changedFiles):
+				retrace.append(sink);
+
+		for sink in retrace:
+			del self.roots[sink];
+		self.analyze(retrace);
+		return retrace;
+
+	def save(self, stateFile):
+		"""Write the project, the CFGs and the sinks to stateFile"""
+		#The cache is a directory of its own and is given again on load
+		cache = self.session.cache;
+		self.session.cache = None;
+		try:
+			data = pickle.dumps( (STATE_VERSION, CACHE_VERSION, self), pickle.HIGHEST_PROTOCOL);
+		except RecursionError:
+			#pickle recurses down the ASTs, the next run parses the project again instead
+			print("ERROR: unable to save " + stateFile + ": the project is too deeply nested to pickle");
 			return;
+		finally:
+			self.session.cache = cache;
+
+		tmpPath = stateFile + '.' + str(os.getpid());
+		with open(tmpPath, 'wb') as f:
+			f.write(data);
+		os.rename(tmpPath, stateFile);
+
+	@staticmethod
+	def load(stateFile, cache=None):
+		"""An IncrementalAnalysis written by save(), None if stateFile is missing, unreadable or from another version (so it is rebuilt)"""
+		try:
+			with open(stateFile, 'rb') as f:
+				state = pickle.load(f);
+		except (IOError, OSError):
+			return None;
+		except Exception:
+			#Classes that have since been renamed or changed unpickle badly in any number of ways
+			print("Discarding unreadable state file " + stateFile);
+			return None;
+
+		if (not isinstance(state, tuple) or len(state) != 3 or state[:2] != (STATE_VERSION, CACHE_VERSION)):
+			print("Discarding state file " + stateFile + " from another version");
+			return None;
+		analysis = state[2];
+		analysis.session.cache = cache;
+		return analysis;
+
+
+def iterPaths(filename, lineNo, maxDepth=None, maxPaths=None, timeBudget=None, project=None, cache=None, source=None, prune=False):
+	"""AnalysisSession.iterPaths using a throwaway session"""
+	return AnalysisSession(project, cache, prune).iterPaths(filename, lineNo, maxDepth=maxDepth, maxPaths=maxPaths, timeBudget=timeBudget, source=source);
+
+
+def parseForCFGs(sinks, project=None, cache=None, source=None, prune=False):
+	"""Batch version of parseForCFG using a throwaway AnalysisSession, see AnalysisSession.parseForCFGs"""
+	return AnalysisSession(project, cache, prune).parseForCFGs(sinks, source);
+
+
+def parseForCFG(filename, lineNo, project=None, cache=None, source=None, prune=False):
+	"""Parse the file filename for a Control Flow Graph starting at lineNo
+	   project: a projectParser.Project to trace across every file of, instead of only filename
+	   cache: a parseCache.ParseCache to load filename's AST from when it hasn't changed
+	   source: only trace the calls on paths from this function (or line number) down to lineNo
+	   prune: leave out calls whose branch conditions are infeasible given the constants of their function (see feasibility)"""
+	root = AnalysisSession(project, cache, prune).parseForCFG(filename, lineNo, source);
+	if (root is None):
+		#traceSinks already printed why
+		sys.exit(1);
 
-		#
-		if (isinstance(node, c_ast.FuncCall)):
-			global funcCalls;
-			if (node.name not in funcCalls.keys()):
-				funcCalls[node.name] = []
-			funcCalls[node.name].append(node);
-
-		#We will never need to find the FileAST node
-		if (not isinstance(node, c_ast.FileAST)):
-			#Keeps track of the function we are currently inside of
-			if (isinstance(node, c_ast.FuncDef)):
-				self.lastFuncDefNode = node;
-
-				#Find the name of the function (based on the above processing) that 'node' is inside of
-				for c_name, child in node.children():	#Now we have the FuncDef node of the method we are in
-					if (isinstance(child, c_ast.Decl)):			#Found where the node's name is stored
-						self.lastFuncDefName = child.name;
-						break;
-
-			#Don't do anything if we've already found a node on that line number
-			if (self.ast_node is not None):
-				return;
+	print();
+	print();
+	root.print_tree(0);
 
-			#Figure out if we have a node from that line number
-			lineNumber 	= node.coord.line;
-			nodeFile 	= node.coord.file;
-			if (lineNumber is not None and lineNumber == self.lineno and nodeFile == self.fileName):
-				self.ast_node = node;
-				return;
+	return root;
 
-		#If this node didn't give us the line number, go to all its children
-		if (self.ast_node is None):
-			for c_name, c in node.children():
-				self.visit(c);
-
-
-
-def resolveToString(node):
-	"""Takes the PyCParser node and returns a string representation of it"""
-	#TODO: the better way to do this would be by anonymous function
-	#		the methods would be toStringNODECLASS(node):
-	#		You'd simply append the name of the node class to 'toString' and call it, no giant if/elif need
-	#TODO: only include the nodes we actually need (or not, as we don't know what we'll need)
-	#NOTE: Even easier would be if these classes just had a damn __str__ method!!!!!!!!
-
-	#ArrayDecl
-	#ArrayRef
-	if (isinstance(node, c_ast.ArrayRef)):
-		name = resolveToString(node.name);
-		subscript = resolveToString(node.subscript);
-		return (name + '[' + subscript + ']');
-	#Assignment
-	if (isinstance(node, c_ast.Assignment)):
-		assign = str(node.op);
-		lval = str(resolveToString(node.lvalue));
-		rval = str(resolveToString(node.rvalue));
-		return (lval + assign + rval);
-	#BinaryOp
-	if (isinstance(node, c_ast.BinaryOp)):
-		string = node.op;
-
-		#If the child is a BinaryOP we need to recurse again
-		if (isinstance(node.left, c_ast.BinaryOp)):
-			string = (resolveToString(node.left) + " " + string);
-		else:
-			string = (resolveToString(node.left) +  " " + string);
 
-		if (isinstance(node.right, c_ast.BinaryOp)):
-			string += (" " + resolveToString(node.right));
-		else:
-			string += (" " + resolveToString(node.right));
-
-		#Group if neccessary
-		if (node.op == "&&" or node.op == "||"):
-			string = ('(' + string + ')');
-
-		return string;
-	#Break
-	#Case
-	if (isinstance(node, c_ast.Case)):
-		return ("case " + resolveToString(node.expr));
-	#Cast
-	#Compound
-	if (isinstance(node, c_ast.Compound)):
-		print("ERROR: we should never be resolving 'Compound' to a string");
-		return;
-	#CompoundLiteral
-	#Constant
-	if (isinstance(node, c_ast.Constant)):
-		return (node.value);
-	#Continue
-	#Decl
-	#DeclList
-	#Default
-	#DoWhile
-	if (isinstance(node, c_ast.DoWhile)):
-		cond = resolveToString(node.cond);
-		return ("DoWhile (" + cond + ')');
-	#EllipsisParam
-	#EmptyStatement
-	#Enum
-	#Enumerator
-	#EnumeratorList
-	#ExprList
-	if (isinstance(node, c_ast.ExprList)):
-		ret = "";
-		for expr in node.exprs:
-			ret += (', ' + resolveToString(expr));
-
-		return ret[2:];
-	#FileAST
-	#For
-	if (isinstance(node, c_ast.For)):
-		init = resolveToString(node.init);
-		cond = resolveToString(node.cond);
-		nxt = resolveToString(node.next);
-		return ("for (" + init + "; " + cond + "; " + nxt + ")");
-	#FuncCall
-	if (isinstance(node, c_ast.FuncCall)):
-		name = resolveToString(node.name);
-		args = resolveToString(node.args);
-		return (name + '(' + ( args if args else '' ) + ')');
-	#FuncDecl
-	#FuncDef
-	#Goto
-	if (isinstance(node, c_ast.Goto)):
-		return ("Goto " + resolveToString(node.name));
-	#ID
-	if (isinstance(node, c_ast.ID)):
-		return node.name;
-	#IdentifierType
-	#If
-	if (isinstance(node, c_ast.If)):
-		cond = resolveToString(node.cond);
-		return ("if " + cond);
-	#InitList
-	#Label
-	#NamedInitializer
-	#ParamList
-	#PtrDecl
-	#Return
-	#Struct
-	#StructRef
-	#Switch
-	if (isinstance(node, c_ast.Switch)):
-		cond = resolveToString(node.cond);
-		return ("switch (" + cond + ')');
-	#TernaryOp
-	if (isinstance(node, c_ast.TernaryOp)):
-		cond = resolveToString(node.cond);
-		iftrue = resolveToString(node.iftrue);
-		iffalse = resolveToString(node.iffalse);
-		return (cond + ' ? ' + iftrue + ' : ' + iffalse);
-	#TypeDecl
-	#Typedef
-	#Typename
-	#UnaryOp
-	if (isinstance(node, c_ast.UnaryOp)):
-		op = str(node.op);
-		expr = resolveToString(node.expr);
-		return (expr + op[1:]);
-	#Union
-	#While
-	if (isinstance(node, c_ast.While)):
-		cond = resolveToString(node.cond);
-		return ("while (" + cond + ')');
-	#Pragma
-	if (isinstance(node, c_ast.Pragma)):
-		return ("pragma " + node.string);
-
-
-#
-#For each methodName, methodNode in methodQueue:
-#	Find each instance of the function call, put those in a queue
-#	For each instance, find what function that call is inside of
-#Repeat these steps using the new function each time until we reach main on all instances
-#
-def parseForCFG(filename, lineNo):
-	"""Parse the file filename for a Control Flow Graph starting at lineNo"""
-
-	#TODO: need to get this working with multiple C files
-	'''
-	#The root of the ast
-	ast = FileAst();
-
-	#Add to the overall AST each smaller AST file by file (recursing into all lower directories)
-	for f in glob.iglob('**/*.c', recursive=True):
-		ast.ext += CParser.parse_file(f, use_cpp=True).ext;
-	'''
-
-	#Create the AST to parse
-	ast = parse_file(filename, use_cpp=True);
-
-	#Given the line number, find the node of that line number
-	lnv = LineNumberVisitor(lineNo, filename);
-	lnv.visit(ast);
-	vulnerableNode = lnv.ast_node;	#The node on the specified line
-	if (vulnerableNode == None):
-		print("ERROR (FATAL): unable to retrieve node for line " + str(lineno));
-		sys.exit();
-	
-	global rootNode;
-	rootNode = CFGNode("Line " + str(lineNo), None);
-	lineFuncNode = CFGNode(lnv.lastFuncDefName, lnv.lastFuncDefNode);
-	rootNode.add_child(lineFuncNode);
-
-	#Add those to the methodQueue
-	methodQueue.append( (lnv.lastFuncDefName, lineFuncNode) );
-
-	#Parse continually while we have methods to look for in the methodQueue
-	v = FuncCallVisitor('', None);
-	while (methodQueue):
-		methodName, methodNode = methodQueue.pop(0);
-		v.funcname = methodName;
-		v.currentCFGNode = methodNode;
-		v.parentList = [];
-		v.visit(ast)
+def initWorker(project, cache, prune=False):
+	"""Pool initializer: every worker process keeps one AnalysisSession, so each file is parsed once per worker"""
+	global workerSession;
+	workerSession = AnalysisSession(project, cache, prune);
 
-	print();
-	print();
-	rootNode.print_tree(0);
 
-	return rootNode;
+def initFlatWorker(flatFile):
+	"""Pool initializer for a project written out by writeFlatIndex: every worker maps the same file instead of getting a copy of the project"""
+	global workerSession;
+	flat = FlatIndex.load(flatFile);
+	if (flat is None):
+		print("ERROR (FATAL): unable to read flat index " + flatFile);
+		sys.exit();
+	workerSession = FlatSession(flat);
 
 
-def visualize(fileName, rootNode, direction, strict=False):
-	"""Plots the tree starting at 'rootNode' is a visually pleasing format using GraphViz
-		fileName: the name of the file in which the visual of the graph will be stored
-		rootNode: the start of the graph to visualize
-		direction: do we display from start->vulnerability (0) or vulnerability->start (1)?
-	"""
-	G = gv.Digraph('G', filename=fileName);
+def writeFlatProject(project):
+	"""Write the index of a project to a temporary flat index file :: returns its path, for the caller to remove"""
+	labelCache = {};
+	handle, flatFile = tempfile.mkstemp(suffix='.idx', prefix='stffa');
+	os.close(handle);
+	with profiler.phase('flatIndex'):
+		writeFlatIndex(project.index, flatFile, lambda astNode: resolveToString(astNode, labelCache), [filename for filename, cppArgs in project.files]);
+	return flatFile;
 
-	stack = [rootNode];
-	G.node(rootNode.uniqueID, rootNode.function);
-	while (stack):
-		curr_node = stack.pop(0);
-
-		#Add a link from parent to child
-		for child in curr_node.children:
-			stack.append(child);
-
-			#To go from start of program to vulnerable point swap these two arguments
-			#print("Adding edge between %s (%s) and %s (%s)" % (child.function, child.uniqueID, curr_node.function, curr_node.uniqueID))
-			G.node(child.uniqueID, child.function);
-			if (direction == 0):
-				G.edge(child.uniqueID, curr_node.uniqueID);
-			elif (direction == 1):
-				G.edge(curr_node.uniqueID, child.uniqueID);
-			else:
-				print("ERROR: incorrect direction to visualize: " + str(direction));
-				print("\tDirection should be 0 or 1");
-				return;
 
-	G.view();
+def traceSinkGroup(job):
+	"""Pool job: the CFGs of a group of sinks from the same file, along with what the job profiled (see profiler.isolated)"""
+	sinks, source = job;
+	return profiler.isolated(workerSession.parseForCFGs, sinks, source);
 
 
+def traceSinkGroupThreaded(job):
+	"""Thread pool job: threads can't share a session, so each group gets its own"""
+	sinks, source, project, cache, prune = job;
+	return (AnalysisSession(project, cache, prune).parseForCFGs(sinks, source), None);
 
-def visualizeAST(rootNode, fileName):
-	G = gv.Digraph('G', filename=("AST" + fileName));
 
-	stack = [rootNode];
-	while (stack):
-		curr_node = stack.pop(0);
-		nodeName1 = curr_node.__class__.__name__;
-		if (curr_node.attr_names):
-			vlist = [getattr(curr_node, n) for n in curr_node.attr_names]
-			attrstr = ', '.join('%s' % v for v in vlist)
-			nodeName1 += (': ' + attrstr);
-		
-		for c, child in curr_node.children():
-			stack.append(child);
-
-			nodeName2 = child.__class__.__name__;
-			if (child.attr_names):
-				vlist = [getattr(child, n) for n in child.attr_names]
-				attrstr = ', '.join('%s' % v for v in vlist)
-				nodeName2 += (': ' + attrstr);
-			G.edge(nodeName1, nodeName2);
-
-	G.view();
+def parseForCFGsParallel(sinks, workers=None, threads=False, project=None, cache=None, source=None, prune=False):
+	"""
+	parseForCFGs with the sinks of each file traced in parallel, in a process pool (or a thread pool if threads)
+	Returns [(filename, lineNo, rootNode)] in the order of sinks; CFG nodes are only shared between sinks of the same file
+	A (fully parsed) project is handed to the processes as one flat index file they all map, instead of pickled to each;
+	pruning needs the AST, so with prune they get the project itself
+	"""
+	groups = {};
+	order = [];
+	for filename, lineNo in sinks:
+		if (filename not in groups):
+			groups[filename] = [];
+			order.append(filename);
+		groups[filename].append( (filename, lineNo) );
+
+	if (workers is None):
+		workers = multiprocessing.cpu_count();
+	workers = max(1, min(workers, len(order)));
+
+	flatFile = None;
+	if (threads):
+		pool = multiprocessing.pool.ThreadPool(workers);
+		jobs = [(groups[filename], source, project, cache, prune) for filename in order];
+		work = traceSinkGroupThreaded;
+	elif (project is not None and not project.lazy and not prune):
+		flatFile = writeFlatProject(project);
+		pool = multiprocessing.Pool(workers, initializer=initFlatWorker, initargs=(flatFile,));
+		jobs = [(groups[filename], source) for filename in order];
+		work = traceSinkGroup;
+	else:
+		pool = multiprocessing.Pool(workers, initializer=initWorker, initargs=(project, cache, prune));
+		jobs = [(groups[filename], source) for filename in order];
+		work = traceSinkGroup;
+
+	try:
+		results = pool.map(work, jobs, chunksize=1);
+	finally:
+		pool.close();
+		pool.join();
+		if (flatFile is not None):
+			os.remove(flatFile);
+
+	roots = {};
+	for groupResults, profile in results:
+		profiler.merge(profile);
+		for filename, lineNo, root in groupResults:
+			roots[(filename, lineNo)] = root;
+
+	return [(filename, lineNo, roots[(filename, lineNo)]) for filename, lineNo in sinks];
+
+
+def readSinks(sinkFile):
+	"""Reads a list of sinks, one 'filename linenumber' or 'filename:linenumber' per line ('#' starts a comment)"""
+	if (not os.path.isfile(sinkFile)):
+		print("ERROR (FATAL): no such file " + sinkFile);
+		sys.exit(1);
+
+	sinks = [];
+	with open(sinkFile) as f:
+		for line in f:
+			line = line.split('#', 1)[0].strip();
+			if (not line):
+				continue;
+			sinks.append(parseSink(line));
+	return sinks;
+
+
+def parseSink(sink):
+	"""'filename:linenumber' or 'filename linenumber' -> (filename, linenumber)"""
+	try:
+		#Without a line number there is nothing to split off, which is the same error
+		if (' ' in sink.strip()):
+			filename, lineNo = sink.strip().rsplit(None, 1);
+		else:
+			filename, lineNo = sink.rsplit(':', 1);
+		return (filename, int(lineNo));
+	except ValueError:
+		print("LineNumber should be an integer: " + sink);
+		sys.exit(1);
 
 
 if __name__ == "__main__":
 	try:
-		#TODO: take in another optional argument, the place we end the search at (either line number or function name)
-		#		This allows us to find flows from line# to line # or function to function
-		if len(sys.argv) == 3:	#programName filename linenumber
-			filename = sys.argv[1];
+		parser = argparse.ArgumentParser(description="Software Target Focused Flow Analysis");
+		parser.add_argument('filename', nargs='?', default='third.c', help="C file holding the vulnerable line");
+		parser.add_argument('lineno', nargs='?', default='41', help="Line number of the vulnerable line");
+		parser.add_argument('--end', help="Function name (or line number in the sink's file) the search ends at; only calls on paths from it down to the sink are traced");
+		parser.add_argument('--prune', action='store_true', help="Leave out calls behind branch conditions that the constants of their function make impossible");
+		parser.add_argument('--sink', action='append', default=[], help="Extra sink as filename:linenumber, can be given many times");
+		parser.add_argument('--sinks', help="File of sinks, one 'filename linenumber' per line; the files are parsed once for all of them");
+		parser.add_argument('--workers', type=int, default=None, help="Trace the files of a batch in this many parallel processes");
+		parser.add_argument('--threads', action='store_true', help="Use threads instead of processes for --workers");
+		parser.add_argument('--paths', type=int, default=None, help="Print up to this many entry -> sink paths as they are found instead of the whole CFG (0 for no limit)");
+		parser.add_argument('--max-depth', type=int, default=None, help="Most calls on a path printed by --paths");
+		parser.add_argument('--path-stats', type=int, nargs='?', const=5, metavar='K', help="Also print how many entry -> sink paths every CFG has, the conditions on the most of them and its K (default 5) shortest / least constrained paths, counted without expanding the paths");
+		parser.add_argument('--time-budget', type=float, default=None, help="Seconds --paths may spend looking for paths");
+		parser.add_argument('--project', help="Directory or compile_commands.json; traces callers across every C file in it");
+		parser.add_argument('--jobs', type=int, default=None, help="Processes used to parse a project (default: one per core)");
+		parser.add_argument('--cache-dir', help="Keep parsed ASTs in this directory and reuse them while the source is unchanged");
+		parser.add_argument('--cache-size', type=int, default=DEFAULT_MAX_BYTES // (1024 * 1024), help="Size cap of the parse cache in MB");
+		parser.add_argument('--clear-cache', action='store_true', help="Invalidate every entry of the parse cache first");
+		parser.add_argument('--headless', action='store_true', help="Only write the DOT files of the CFGs, never open a viewer (no Graphviz binaries needed)");
+		parser.add_argument('--format', choices=FORMATS, default='dot', help="File format the CFGs are written in, only dot is opened in a viewer");
+		parser.add_argument('--max-nodes', type=int, default=None, help="Most nodes written per CFG, the rest are collapsed into summary nodes");
+		parser.add_argument('--max-edges', type=int, default=None, help="Most edges written per CFG");
+		parser.add_argument('--max-children', type=int, default=None, help="Most children written per CFG node");
+		parser.add_argument('--scan', action='store_true', help="Find the sinks instead of giving them: every call to a dangerous API in filename (or in the whole --project), each then traced");
+		parser.add_argument('--scan-only', action='store_true', help="With --scan: only list the calls found, don't trace them");
+		parser.add_argument('--catalogue', help="File of the APIs --scan looks for, one 'name [category]' per line ('name*' for a prefix), instead of the built in list");
+		parser.add_argument('--lazy', action='store_true', help="With --project: only scan the C files for identifiers up front and parse just the ones that may hold a caller on the way up from a sink");
+		parser.add_argument('--incremental', metavar='STATEFILE', help="With --project: keep the parsed project and CFGs in STATEFILE and only re-parse/re-trace what changed since the last run");
+		parser.add_argument('--profile', action='store_true', help="Print the wall/CPU time of every phase (per file too) and counters of the run to stderr");
+		parser.add_argument('--profile-json', metavar='FILE', help="Write the profile as JSON to FILE (implies --profile)");
+		parser.add_argument('--cprofile', action='store_true', help="Also run the whole analysis under cProfile and add the heaviest functions to the profile");
+		parser.add_argument('--tracemalloc', action='store_true', help="Also trace memory allocations and add the peak and biggest allocation sites to the profile");
+		args = parser.parse_args();
+
+		args.scan = args.scan or args.scan_only;
+
+		profile = None;
+		if (args.profile or args.profile_json or args.cprofile or args.tracemalloc):
+			profile = profiler.enable(cProfile=args.cprofile, tracemalloc=args.tracemalloc);
+
+		#Batch mode, every sink from --sink/--sinks is traced sharing one parse per file
+		sinks = [parseSink(sink) for sink in args.sink];
+		if (args.sinks):
+			sinks += readSinks(args.sinks);
+
+		#Where the search ends, the source of the flows we are after
+		source = args.end;
+		if (source is not None and source.isdigit()):
+			source = int(source);
+
+		filename = args.filename;
+		if (not sinks and not args.scan):
 			try:
-				lineno = int(sys.argv[2]);
+				lineno = int(args.lineno);
 			except ValueError:
 				print("LineNumber should be an integer");
-				sys.exit();
+				sys.exit(1);
+			if (not os.path.isfile(filename)):
+				print("ERROR (FATAL): no such file " + filename);
+				sys.exit(1);
+
+			print("FileName: " + filename);
+			print("LineNo: " + str(lineno));
+
+		cache = None;
+		if (args.cache_dir):
+			cache = ParseCache(args.cache_dir, args.cache_size * 1024 * 1024);
+			if (args.clear_cache):
+				cache.clear();
+
+		project = None;
+		analysis = None;
+		if (args.incremental):
+			if (not args.project or args.lazy):
+				print("--incremental needs --project, and can't be used with --lazy");
+				sys.exit(1);
+
+			#The state file has the parsed project, only the files changed since the last run are parsed again
+			analysis = IncrementalAnalysis.load(args.incremental, cache);
+			if (analysis is None or analysis.project.path != args.project):
+				analysis = IncrementalAnalysis(parseProject(args.project, processes=args.jobs, cache=cache), cache);
+			else:
+				for filename, lineno in analysis.refresh(processes=args.jobs):
+					print("Re-traced: " + filename + " " + str(lineno));
+			project = analysis.project;
+			print("Project: " + str(len(project.files)) + " C files");
+		elif (args.project):
+			project = parseProject(args.project, processes=args.jobs, cache=cache, lazy=args.lazy);
+			print("Project: " + str(len(project.files)) + " C files");
+
+		def draw(name, CFG):
+			"""Open (or with --headless only write) the DOT file of a CFG, or write it in --format"""
+			limits = {'maxNodes': args.max_nodes, 'maxEdges': args.max_edges, 'maxChildren': args.max_children};
+			with profiler.phase('render', name):
+				if (args.format == 'dot'):
+					#GraphViz is only imported when a CFG is drawn
+					from render import visualize;
+					visualize(name + "DOT", CFG, 0, strict=True, view=not args.headless, **limits);
+				else:
+					exportCFG(CFG, name + "." + args.format, args.format, 0, **limits);
+
+		def printPathStats(CFG):
+			"""With --path-stats: the path counts and top paths of a CFG"""
+			if (args.path_stats is not None and CFG is not None):
+				with profiler.phase('pathStats'):
+					summary = PathStats(CFG).summary(args.path_stats);
+				print(summary);
+
+		session = None;
+		if (args.scan):
+			#The same session scans and traces, so every file is parsed (or loaded from the cache) once
+			catalogue = readCatalogue(args.catalogue) if args.catalogue else Catalogue();
+			session = analysis.session if analysis is not None else AnalysisSession(project, cache, args.prune);
+			hits = session.scanSinks(None if project is not None else [filename], catalogue);
+			for hit in hits:
+				print("Sink: " + hit.file + ":" + str(hit.line) + " in " + str(hit.function) + " calls " + hit.callee + (" (" + hit.category + ")" if hit.category else ""));
+			print("Found " + str(len(hits)) + " calls on " + str(len(sinkLines(hits))) + " lines");
+			sinks += sinkLines(hits);
+			if (args.scan_only):
+				sinks = [];
+
+		if (analysis is not None):
+			#Sinks already in the state file are only traced again if a change reached them
+			for filename, lineno, CFG in analysis.analyze(sinks if (sinks or args.scan) else [(filename, lineno)]):
+				print();
+				print("FileName: " + filename + " LineNo: " + str(lineno));
+				if (CFG is not None):
+					CFG.print_tree(0);
+					printPathStats(CFG);
+			analysis.save(args.incremental);
+		elif (sinks):
+			if (args.workers):
+				results = parseForCFGsParallel(sinks, workers=args.workers, threads=args.threads, project=project, cache=cache, source=source, prune=args.prune);
+			elif (session is not None):
+				results = session.parseForCFGs(sinks, source);
+			else:
+				results = parseForCFGs(sinks, project=project, cache=cache, source=source, prune=args.prune);
+
+			for filename, lineno, CFG in results:
+				print();
+				print("FileName: " + filename + " LineNo: " + str(lineno));
+				if (CFG is not None):
+					CFG.print_tree(0);
+					printPathStats(CFG);
+					draw(filename + "_" + str(lineno), CFG);
+		elif (args.scan):
+			#Nothing was found, or only the list was asked for
+			pass;
+		elif (args.paths is not None):
+			#Paths are printed as they are found, so the first ones show up before the search is over
+			for path in iterPaths(filename, lineno, maxDepth=args.max_depth, maxPaths=(args.paths or None), timeBudget=args.time_budget, project=project, cache=cache, source=source, prune=args.prune):
+				print(path);
+				sys.stdout.flush();
 		else:
-			filename = 'third.c';
-			lineno = 41;
-
-		print("FileName: " + filename);
-		print("LineNo: " + str(lineno));
-
-		CFG = parseForCFG(filename, lineno)
-		visualize(filename + "DOT", CFG, 0, strict=True);
+			CFG = parseForCFG(filename, lineno, project=project, cache=cache, source=source, prune=args.prune)
+			printPathStats(CFG);
+			draw(filename, CFG);
+
+		if (project is not None and project.lazy):
+			print("Parsed " + str(len(project.stamps)) + " of " + str(len(project.files)) + " C files");
+		if (cache is not None):
+			print(cache.summary());
+
+		if (profile is not None):
+			#On stderr, so the profile never mixes with the CFGs/paths on stdout
+			profile.finish();
+			print(profile.summary(), file=sys.stderr);
+			if (args.profile_json):
+				profile.dump(args.profile_json);
+	except (ParseError, subprocess.CalledProcessError) as e:
+		#A file that doesn't preprocess or parse, cpp has already said why on stderr if it was cpp
+		print("ERROR (FATAL): unable to parse: " + str(e));
+		sys.exit(1);
 	except KeyboardInterrupt:
-		exit();
\ No newline at end of file
+		exit();
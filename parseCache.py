@@ -0,0 +1,179 @@
+from __future__ import print_function
+import sys, os, time, hashlib, pickle, zlib
+
+try:
+	import pycparser
+	from pycparser import c_parser, preprocess_file
+except ImportError:
+	print("Please install PyCParser");
+	sys.exit(1);
+
+from callSiteIndex import buildCallSiteIndex
+import profiler
+
+
+#Bump this whenever what we pickle changes shape (CallSiteIndex, CallSite, ...) so old entries are never loaded
+CACHE_VERSION = "6";
+
+DEFAULT_CACHE_DIR 	= os.path.join(os.path.expanduser('~'), '.cache', 'stffa');
+DEFAULT_MAX_BYTES 	= 512 * 1024 * 1024;
+ENTRY_SUFFIX 		= '.ast';
+
+
+class ParseCache():
+	"""
+	On-disk cache of parsed FileASTs and their CallSiteIndex
+	Entries are keyed by a hash of the preprocessed source and the cpp arguments, so an unchanged file is never parsed twice
+	Least recently used entries are removed once the directory grows past maxBytes
+	"""
+	def __init__(self, directory=DEFAULT_CACHE_DIR, maxBytes=DEFAULT_MAX_BYTES):
+		self.directory 	= directory;
+		self.maxBytes 	= maxBytes;
+
+		#Counters for this process, see stats()
+		self.hits 			= 0;
+		self.misses 		= 0;
+		self.evictions 		= 0;
+		self.uncacheable 	= 0;	#Parses too deeply nested to pickle, see store()
+		self.secondsSaved 	= 0.0;	#Parse time the hits would have cost
+
+		if (not os.path.isdir(directory)):
+			os.makedirs(directory);
+
+	def key(self, text, cppPath, cppArgs):
+		"""Hash of everything that decides what the parse of a file looks like"""
+		h = hashlib.sha256();
+		for part in (CACHE_VERSION, pycparser.__version__, cppPath, '\0'.join(cppArgs), text):
+			h.update(part.encode('utf-8'));
+			h.update(b'\0');
+		return h.hexdigest();
+
+	def entryPath(self, key):
+		return os.path.join(self.directory, key + ENTRY_SUFFIX);
+
+	def load(self, key):
+		"""Returns (ast, index) for key, or None if it isn't cached"""
+		path = self.entryPath(key);
+		try:
+			with open(path, 'rb') as f:
+				seconds, ast, index = pickle.loads(zlib.decompress(f.read()));
+		except (IOError, OSError, EOFError, zlib.error, pickle.UnpicklingError, RecursionError):
+			return None;
+
+		#Mark it as recently used for eviction
+		try:
+			os.utime(path, None);
+		except OSError:
+			pass;
+
+		self.hits += 1;
+		self.secondsSaved += seconds;
+		profiler.count('cacheHits');
+		return (ast, index);
+
+	def store(self, key, ast, index, seconds):
+		"""Write an entry (seconds is how long the parse took), then evict if we're over the size cap"""
+		#pickle recurses down the AST, an expression nested deeper than the recursion limit can't be stored
+		try:
+			data = zlib.compress(pickle.dumps((seconds, ast, index), pickle.HIGHEST_PROTOCOL), 1);
+		except RecursionError:
+			self.uncacheable += 1;
+			profiler.count('cacheUncacheable');
+			return;
+
+		#Write to a temporary file and rename it so other processes never read half an entry
+		tmpPath = self.entryPath(key) + '.' + str(os.getpid());
+		with open(tmpPath, 'wb') as f:
+			f.write(data);
+		os.rename(tmpPath, self.entryPath(key));
+
+		self.evict();
+
+	def entries(self):
+		"""[(mtime, size, path)] of every entry, least recently used first"""
+		entries = [];
+		for name in os.listdir(self.directory):
+			if (not name.endswith(ENTRY_SUFFIX)):
+				continue;
+			path = os.path.join(self.directory, name);
+			try:
+				st = os.stat(path);
+			except OSError:		#Another process evicted it
+				continue;
+			entries.append( (st.st_mtime, st.st_size, path) );
+		entries.sort();
+		return entries;
+
+	def evict(self):
+		"""Remove least recently used entries until the cache fits in maxBytes"""
+		entries = self.entries();
+		total = sum(size for mtime, size, path in entries);
+		for mtime, size, path in entries:
+			if (total <= self.maxBytes):
+				break;
+			try:
+				os.remove(path);
+				self.evictions += 1;
+			except OSError:
+				pass;
+			total -= size;
+
+	def clear(self):
+		"""Invalidate every entry"""
+		for mtime, size, path in self.entries():
+			try:
+				os.remove(path);
+			except OSError:
+				pass;
+
+	def parse(self, filename, cppPath='cpp', cppArgs=()):
+		"""Drop in for parse_file(use_cpp=True) + buildCallSiteIndex :: returns (ast, index)"""
+		cppArgs = list(cppArgs);
+		with profiler.phase('cpp', filename):
+			text = preprocess_file(filename, cppPath, cppArgs);
+		key = self.key(text, cppPath, cppArgs);
+
+		with profiler.phase('cacheLoad', filename):
+			cached = self.load(key);
+		if (cached is not None):
+			return cached;
+
+		self.misses += 1;
+		profiler.count('cacheMisses');
+		start = time.time();
+		ast, index = parseText(text, filename);
+		with profiler.phase('cacheStore', filename):
+			self.store(key, ast, index, time.time() - start);
+		return (ast, index);
+
+	def stats(self):
+		"""Counters of what this cache has done, see addStats()"""
+		return {'hits': self.hits, 'misses': self.misses, 'evictions': self.evictions, 'uncacheable': self.uncacheable, 'secondsSaved': self.secondsSaved};
+
+	def addStats(self, stats):
+		"""Add the counters of a copy of this cache used in another process"""
+		self.hits 			+= stats['hits'];
+		self.misses 		+= stats['misses'];
+		self.evictions 		+= stats['evictions'];
+		self.uncacheable 	+= stats['uncacheable'];
+		self.secondsSaved 	+= stats['secondsSaved'];
+
+	def summary(self):
+		"""One line description of the counters"""
+		return ("Cache: %d hits, %d misses, %d evictions, %d uncacheable, %.2fs of parsing saved" % (self.hits, self.misses, self.evictions, self.uncacheable, self.secondsSaved));
+
+
+def parseText(text, filename):
+	"""Parse preprocessed source and index it :: returns (ast, index)"""
+	with profiler.phase('parse', filename):
+		ast = c_parser.CParser().parse(text, filename);
+	with profiler.phase('index', filename):
+		index = buildCallSiteIndex(ast);
+	return (ast, index);
+
+
+def parseFile(filename, cppPath='cpp', cppArgs=()):
+	"""parse_file(use_cpp=True) + buildCallSiteIndex without a cache, each step timed on its own :: returns (ast, index)"""
+	with profiler.phase('cpp', filename):
+		text = preprocess_file(filename, cppPath, list(cppArgs));
+	return parseText(text, filename);
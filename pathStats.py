@@ -0,0 +1,208 @@
+from __future__ import print_function
+import heapq
+from collections import namedtuple
+
+from cfgGraph import CFGNode
+
+
+#Rankings topPaths() can order paths by: (what is fewest first, what breaks ties)
+RANKINGS = {
+	'shortest': ('calls', 'conditions'),
+	'least-constrained': ('conditions', 'calls'),
+};
+
+
+class RankedPath(namedtuple('RankedPath', ['calls', 'conditions', 'nodes'])):
+	"""One entry -> sink path of a CFG: how many functions and branch conditions are on it, and its CFGNodes entry point first"""
+	def __str__(self):
+		return " -> ".join(str(node) for node in self.nodes);
+
+
+def formatCount(count):
+	"""An exact path count as text, in scientific notation once it is too long to read"""
+	digits = str(count);
+	if (len(digits) <= 15):
+		return digits;
+	return digits[0] + "." + digits[1:4] + "e+" + str(len(digits) - 1);
+
+
+class PathStats():
+	"""
+	Exact numbers on every root -> leaf path of a backward CFG (as parseForCFG returns it: the sink at the root, entry points at the leaves)
+	without walking the paths themselves, so the cost is linear in the edges however many paths there are
+		pathsTo / pathsFrom: paths from the root down to a node / from a node down to a leaf, by dynamic programming in topological order
+		the paths through a node are pathsTo * pathsFrom of it, the total is pathsFrom of the root
+	Counts are Python ints, so they stay exact when there are exponentially many paths
+	Paths are counted the way print_tree expands them: an edge added twice is two paths
+	"""
+	def __init__(self, rootNode):
+		self.graph 	= rootNode.graph;
+		self.root 	= rootNode.id;
+		childOffsets, childIndex, parentOffsets, parentIndex = self.graph.buildCSR();
+		self.childOffsets = childOffsets.tolist();
+		self.childIndex = childIndex.tolist();
+
+		self.order 		= [];	#Node IDs below the root, parents before children
+		self.backEdges 	= 0;	#Edges closing a cycle, which are left out (the CFG of a session should have none)
+		self.topologicalOrder();
+
+		funcDef = self.graph.stringIDs.get('FuncDef');
+		self.isCondition = {};	# NodeID: True for branch conditions, False for functions (and the root)
+		for nodeID in self.order:
+			kind = self.graph.nodeKind[nodeID];
+			self.isCondition[nodeID] = nodeID != self.root and kind >= 0 and kind != funcDef;
+
+		self.pathsTo 	= dict.fromkeys(self.order, 0);
+		self.pathsTo[self.root] = 1;
+		for nodeID in self.order:
+			count = self.pathsTo[nodeID];
+			for child in self.children(nodeID):
+				self.pathsTo[child] += count;
+
+		self.pathsFrom 	= {};
+		for nodeID in reversed(self.order):
+			children = self.children(nodeID);
+			self.pathsFrom[nodeID] = sum(self.pathsFrom[child] for child in children) if children else 1;
+
+		self.paths = self.pathsFrom[self.root];
+
+	def children(self, nodeID):
+		return self.childIndex[self.childOffsets[nodeID]:self.childOffsets[nodeID + 1]];
+
+	def topologicalOrder(self):
+		"""Reverse postorder of an iterative depth first walk from the root, edges back into the walk's stack are dropped"""
+		childOffsets, childIndex = self.childOffsets, self.childIndex;
+		postorder = [];
+		state = {self.root: 1};	#1 on the stack, 2 done
+		stack = [(self.root, childOffsets[self.root])];
+		while (stack):
+			nodeID, position = stack[-1];
+			if (position == childOffsets[nodeID + 1]):
+				stack.pop();
+				state[nodeID] = 2;
+				postorder.append(nodeID);
+				continue;
+
+			stack[-1] = (nodeID, position + 1);
+			child = childIndex[position];
+			if (child not in state):
+				state[child] = 1;
+				stack.append( (child, childOffsets[child]) );
+			elif (state[child] == 1):
+				self.backEdges += 1;
+
+		if (self.backEdges):
+			#children() leaves them out too, so every pass below only ever looks forward in the order
+			kept = [];
+			offsets = [0] * (len(childOffsets));
+			position = {nodeID: i for i, nodeID in enumerate(reversed(postorder))};
+			for nodeID in range(len(childOffsets) - 1):
+				for child in childIndex[childOffsets[nodeID]:childOffsets[nodeID + 1]]:
+					if (nodeID not in position or position[child] > position[nodeID]):
+						kept.append(child);
+				offsets[nodeID + 1] = len(kept);
+			self.childOffsets, self.childIndex = offsets, kept;
+
+		self.order = postorder[::-1];
+
+	def through(self, node):
+		"""Number of root -> leaf paths through node (a CFGNode or node ID)"""
+		nodeID = node.id if isinstance(node, CFGNode) else node;
+		return self.pathsTo.get(nodeID, 0) * self.pathsFrom.get(nodeID, 0);
+
+	def entries(self):
+		"""[(CFGNode of an entry point, paths from it to the sink)], most paths first"""
+		leaves = [nodeID for nodeID in self.order if not self.children(nodeID)];
+		leaves.sort(key=lambda nodeID: (-self.pathsTo[nodeID], nodeID));
+		return [(CFGNode(self.graph, nodeID), self.pathsTo[nodeID]) for nodeID in leaves];
+
+	def conditions(self, top=None):
+		"""[(CFGNode of a branch condition, paths through it)], the conditions on most paths first"""
+		found = [nodeID for nodeID in self.order if self.isCondition[nodeID]];
+		found.sort(key=lambda nodeID: (-self.through(nodeID), nodeID));
+		return [(CFGNode(self.graph, nodeID), self.through(nodeID)) for nodeID in found[:top]];
+
+	def pathLengths(self):
+		"""(fewest, most) functions on a path, the sink's own function included"""
+		shortest = {};
+		longest = {};
+		for nodeID in reversed(self.order):
+			own = 0 if (self.isCondition[nodeID] or nodeID == self.root) else 1;
+			children = self.children(nodeID);
+			shortest[nodeID] = own + (min(shortest[child] for child in children) if children else 0);
+			longest[nodeID] = own + (max(longest[child] for child in children) if children else 0);
+		return (shortest[self.root], longest[self.root]);
+
+	def topPaths(self, k, rankBy='shortest'):
+		"""
+		The k best root -> leaf paths by rankBy (see RANKINGS) :: returns [RankedPath], best first
+		Best first search over partial paths, each one's priority being its cost so far plus the exact cost of the
+		cheapest way from its last node to a leaf (from one more DP pass), so complete paths come off the heap in order
+		and only about k * (path length) * (children per node) partial paths are ever made
+		"""
+		primary, secondary = RANKINGS[rankBy];
+		#One int per node: the ranked count times more than any path can hold, plus the tie breaking one
+		scale = len(self.order) + 1;
+		weight = {};
+		for nodeID in self.order:
+			if (nodeID == self.root):
+				weight[nodeID] = 0;
+			else:
+				counts = {'calls': 0 if self.isCondition[nodeID] else 1, 'conditions': 1 if self.isCondition[nodeID] else 0};
+				weight[nodeID] = counts[primary] * scale + counts[secondary];
+
+		rest = {};	# NodeID: cheapest cost of the nodes below it down to a leaf
+		for nodeID in reversed(self.order):
+			children = self.children(nodeID);
+			rest[nodeID] = min(weight[child] + rest[child] for child in children) if children else 0;
+
+		found = [];
+		tieBreak = 0;
+		#(priority, tie break, cost so far, node, the partial path up to node as a (node, rest of the path) chain)
+		#Ties go to the newest partial path, so equally good ones are finished depth first instead of all grown side by side
+		heap = [(rest[self.root], tieBreak, 0, self.root, (self.root, None))];
+		while (heap and len(found) < k):
+			priority, ignored, cost, nodeID, chain = heapq.heappop(heap);
+			children = self.children(nodeID);
+			if (not children):
+				found.append(self.rankedPath(chain));
+				continue;
+			for child in children:
+				tieBreak -= 1;
+				childCost = cost + weight[child];
+				heapq.heappush(heap, (childCost + rest[child], tieBreak, childCost, child, (child, chain)));
+		return found;
+
+	def rankedPath(self, chain):
+		"""RankedPath of a (node, rest of the path) chain that starts at a leaf"""
+		nodes = [];
+		while (chain is not None):
+			nodes.append(CFGNode(self.graph, chain[0]));
+			chain = chain[1];
+		conditions = sum(1 for node in nodes if self.isCondition[node.id]);
+		return RankedPath(len(nodes) - 1 - conditions, conditions, nodes);
+
+	def summary(self, top=5):
+		"""Text report: the path count, the entry points and conditions with the most paths, and the top paths of every ranking"""
+		lines = [];
+		fewest, most = self.pathLengths();
+		lines.append("Paths: " + formatCount(self.paths) + " (" + str(fewest) + " to " + str(most) + " functions long)");
+		if (self.backEdges):
+			lines.append("  " + str(self.backEdges) + " edges closing a cycle left out");
+
+		lines.append("Entry points:");
+		for node, count in self.entries()[:top]:
+			lines.append("  %-20s %s" % (formatCount(count), node));
+
+		conditions = self.conditions(top);
+		if (conditions):
+			lines.append("Conditions on the most paths:");
+			for node, count in conditions:
+				line = ("line " + str(node.info.line)) if node.info is not None else "";
+				lines.append("  %-20s %5.1f%%  %s (%s)" % (formatCount(count), count * 100 / self.paths, node, line));
+
+		for rankBy in sorted(RANKINGS):
+			lines.append("Top " + str(top) + " " + rankBy + " paths:");
+			for path in self.topPaths(top, rankBy):
+				lines.append("  [" + str(path.calls) + " calls, " + str(path.conditions) + " conditions] " + str(path));
+		return "\n".join(lines);
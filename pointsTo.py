@@ -0,0 +1,173 @@
+from __future__ import print_function
+import sys
+
+try:
+	from pycparser import c_ast
+except ImportError:
+	print("Please install PyCParser");
+	sys.exit(1);
+
+
+#
+#Flow insensitive address-taken analysis for calls through function pointers
+#Every place a function pointer can be kept is a slot:
+#	('var', name) 			a variable or array (all elements are one slot), by name across every scope
+#	('field', name) 		a struct/union field, by field name across every struct
+#	('arg', function, i) 	the i-th parameter of function
+#A slot points to functions ('fn', name) and to the slots that were copied into it
+#
+
+def slotOf(expr):
+	"""The slot an lvalue or the callee of an indirect call reads/writes, None if it isn't one we follow"""
+	if (isinstance(expr, c_ast.ID)):
+		return ('var', expr.name);
+	if (isinstance(expr, c_ast.StructRef)):
+		return ('field', expr.field.name);
+	if (isinstance(expr, c_ast.ArrayRef)):
+		return slotOf(expr.name);
+	if (isinstance(expr, c_ast.UnaryOp) and expr.op == '*'):
+		return slotOf(expr.expr);
+	if (isinstance(expr, c_ast.Cast)):
+		return slotOf(expr.expr);
+	return None;
+
+
+def valuesOf(expr):
+	"""
+	What an rvalue can hold a function pointer from: [('id', name)] for names that may be functions or variables,
+	or the slots it reads, [] if it can't hold one
+	"""
+	if (isinstance(expr, c_ast.ID)):
+		return [('id', expr.name)];
+	if (isinstance(expr, c_ast.UnaryOp) and expr.op == '&'):
+		return valuesOf(expr.expr);
+	if (isinstance(expr, c_ast.TernaryOp)):
+		return valuesOf(expr.iftrue) + valuesOf(expr.iffalse);
+	slot = slotOf(expr);
+	return [slot] if slot is not None else [];
+
+
+class PointsToIndex():
+	"""
+	Where the address of every function flows (variables, struct fields, arrays and parameters) and every indirect call
+	Built in the same pass as the CallSiteIndex it belongs to; resolve() maps each indirect call to its candidate targets
+	"""
+	def __init__(self):
+		self.flows 			= {};		# Slot: set of ('fn', name) and slots copied into it
+		self.indirectCalls 	= [];		#[(slots the callee is read from, FuncCall node, FuncDef node, chain)]
+		self.functions 		= set();	#Names of every function declared or defined
+		self.structs 		= {};		# StructName: [field names in order], for positional initializers
+		self.typedefs 		= {};		# TypedefName: type node
+
+	def flow(self, slot, values):
+		"""Record that each of values can end up in slot"""
+		if (slot is None or not values):
+			return;
+		if (slot not in self.flows):
+			self.flows[slot] = set();
+		self.flows[slot].update(values);
+
+	def addStruct(self, node):
+		"""Remember the field order of a struct/union definition"""
+		if (node.name is not None and node.decls is not None):
+			self.structs[node.name] = [decl.name for decl in node.decls];
+
+	def structFields(self, typeNode):
+		"""Field names of the struct a (TypeDecl) type is, following typedefs, None if it isn't a known struct"""
+		while (isinstance(typeNode, c_ast.TypeDecl)):
+			typeNode = typeNode.type;
+			if (isinstance(typeNode, c_ast.IdentifierType) and len(typeNode.names) == 1):
+				typeNode = self.typedefs.get(typeNode.names[0]);
+			elif (isinstance(typeNode, c_ast.Typedef)):
+				typeNode = typeNode.type;
+
+		if (isinstance(typeNode, (c_ast.Struct, c_ast.Union))):
+			if (typeNode.decls is not None):
+				return [decl.name for decl in typeNode.decls];
+			return self.structs.get(typeNode.name);
+		return None;
+
+	def addInit(self, slot, typeNode, init):
+		"""Record the flows of a Decl initializer, walking initializer lists into the struct fields and arrays they fill"""
+		if (not isinstance(init, c_ast.InitList)):
+			self.flow(slot, valuesOf(init));
+			return;
+
+		if (isinstance(typeNode, c_ast.ArrayDecl)):
+			for expr in init.exprs:
+				self.addInit(slot, typeNode.type, expr);
+			return;
+
+		fields = self.structFields(typeNode);
+		for i, expr in enumerate(init.exprs):
+			if (isinstance(expr, c_ast.NamedInitializer)):
+				self.addInit(('field', expr.name[-1].name), None, expr.expr);
+			elif (fields is not None and i < len(fields)):
+				self.addInit(('field', fields[i]), None, expr);
+			else:
+				self.addInit(slot, None, expr);
+
+	def addCallArgs(self, callee, args):
+		"""Record the arguments of a direct call as flowing into callee's parameters"""
+		if (args is None):
+			return;
+		for i, arg in enumerate(args.exprs):
+			self.flow(('arg', callee, i), valuesOf(arg));
+
+	def addIndirectCall(self, callNode, funcDefNode, chain):
+		"""Record a call through anything but a function name, along with the slots its callee comes from"""
+		slot = slotOf(callNode.name);
+		if (slot is None):
+			return;
+		slots = [slot];
+
+		#A call through a parameter also calls whatever the callers passed in for it
+		if (slot[0] == 'var'):
+			params = funcDefNode.decl.type.args;
+			if (params is not None):
+				for i, param in enumerate(params.params):
+					if (getattr(param, 'name', None) == slot[1]):
+						slots.append(('arg', funcDefNode.decl.name, i));
+		self.indirectCalls.append( (tuple(slots), callNode, funcDefNode, chain) );
+
+	def finish(self):
+		"""Once a file is walked: names that are functions become ('fn', name), every other name is the variable slot it reads"""
+		for slot, values in self.flows.items():
+			resolved = set();
+			for value in values:
+				if (value[0] == 'id'):
+					value = ('fn', value[1]) if value[1] in self.functions else ('var', value[1]);
+				resolved.add(value);
+			self.flows[slot] = resolved;
+
+	def merge(self, other):
+		"""Add the flows and indirect calls of another (finished) file's PointsToIndex"""
+		for slot, values in other.flows.items():
+			self.flow(slot, values);
+		self.indirectCalls.extend(other.indirectCalls);
+		self.functions.update(other.functions);
+
+	def targets(self, slots):
+		"""Names of every function that can flow into any of slots"""
+		found = set();
+		seen = set(slots);
+		stack = list(slots);
+		while (stack):
+			for value in self.flows.get(stack.pop(), ()):
+				if (value[0] == 'fn'):
+					found.add(value[1]);
+				elif (value not in seen):
+					seen.add(value);
+					stack.append(value);
+		return found;
+
+	def resolve(self):
+		"""[(target function, FuncCall node, FuncDef node, chain)] for every indirect call and every function it may call"""
+		memo = {};
+		resolved = [];
+		for slots, callNode, funcDefNode, chain in self.indirectCalls:
+			if (slots not in memo):
+				memo[slots] = sorted(self.targets(slots));
+			for target in memo[slots]:
+				resolved.append( (target, callNode, funcDefNode, chain) );
+		return resolved;
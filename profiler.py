@@ -0,0 +1,205 @@
+from __future__ import print_function
+import time, json
+
+
+active = None;	#The Profile being recorded, None when not profiling (every hook is then a no-op)
+
+
+class Profile():
+	"""
+	Wall and CPU time per phase (and per file within a phase) and named counters of one run
+	Phases nest, so a phase's time includes the phases run inside of it
+	"""
+	def __init__(self):
+		self.phases 	= {};	# PhaseName: [calls, wall seconds, CPU seconds]
+		self.files 		= {};	# PhaseName: {FileName: [calls, wall seconds, CPU seconds]}
+		self.counters 	= {};	# CounterName: count
+		self.started 	= (time.time(), time.process_time());
+		self.wall 		= None;		#Seconds the whole run took, set by finish()
+		self.cpu 		= None;
+		self.extra 		= {};	#Results of cProfile/tracemalloc, filled by finish()
+
+		self.cProfile 		= None;
+		self.tracemalloc 	= None;
+
+	def add(self, name, fileName, wall, cpu):
+		"""Record one run of phase 'name' (on fileName, or None)"""
+		totals = self.phases.get(name);
+		if (totals is None):
+			totals = self.phases[name] = [0, 0.0, 0.0];
+		totals[0] += 1;
+		totals[1] += wall;
+		totals[2] += cpu;
+
+		if (fileName is not None):
+			perFile = self.files.setdefault(name, {});
+			totals = perFile.get(fileName);
+			if (totals is None):
+				totals = perFile[fileName] = [0, 0.0, 0.0];
+			totals[0] += 1;
+			totals[1] += wall;
+			totals[2] += cpu;
+
+	def count(self, name, n=1):
+		self.counters[name] = self.counters.get(name, 0) + n;
+
+	def merge(self, data):
+		"""Add the phases and counters of toDict() of a Profile recorded in another process"""
+		for name, (calls, wall, cpu) in data['phases'].items():
+			totals = self.phases.setdefault(name, [0, 0.0, 0.0]);
+			totals[0] += calls;
+			totals[1] += wall;
+			totals[2] += cpu;
+		for name, perFile in data['files'].items():
+			for fileName, (calls, wall, cpu) in perFile.items():
+				totals = self.files.setdefault(name, {}).setdefault(fileName, [0, 0.0, 0.0]);
+				totals[0] += calls;
+				totals[1] += wall;
+				totals[2] += cpu;
+		for name, n in data['counters'].items():
+			self.count(name, n);
+
+	def startCProfile(self):
+		import cProfile;
+		self.cProfile = cProfile.Profile();
+		self.cProfile.enable();
+
+	def startTracemalloc(self):
+		import tracemalloc;
+		self.tracemalloc = tracemalloc;
+		tracemalloc.start();
+
+	def finish(self, top=20):
+		"""Stop the run's clocks, cProfile and tracemalloc, keeping the 'top' heaviest functions / allocation sites"""
+		self.wall = time.time() - self.started[0];
+		self.cpu = time.process_time() - self.started[1];
+
+		if (self.cProfile is not None):
+			import pstats;
+			self.cProfile.disable();
+			stats = pstats.Stats(self.cProfile).stats;
+			heaviest = sorted(stats.items(), key=lambda item: item[1][3], reverse=True)[:top];
+			self.extra['cProfile'] = [{'function': "%s:%d(%s)" % func, 'calls': s[1], 'tottime': s[2], 'cumtime': s[3]} for func, s in heaviest];
+			self.cProfile = None;
+
+		if (self.tracemalloc is not None):
+			current, peak = self.tracemalloc.get_traced_memory();
+			snapshot = self.tracemalloc.take_snapshot();
+			self.tracemalloc.stop();
+			self.extra['tracemalloc'] = {
+				'currentBytes': current,
+				'peakBytes': peak,
+				'top': [{'line': str(stat.traceback[0]), 'bytes': stat.size, 'blocks': stat.count} for stat in snapshot.statistics('lineno')[:top]],
+			};
+			self.tracemalloc = None;
+
+	def toDict(self):
+		"""JSON friendly copy of everything recorded"""
+		return {
+			'wall': self.wall,
+			'cpu': self.cpu,
+			'phases': dict((name, list(totals)) for name, totals in self.phases.items()),
+			'files': dict((name, dict((f, list(totals)) for f, totals in perFile.items())) for name, perFile in self.files.items()),
+			'counters': dict(self.counters),
+			'extra': self.extra,
+		};
+
+	def dump(self, fileName):
+		"""Write toDict() to fileName as JSON"""
+		with open(fileName, 'w') as f:
+			json.dump(self.toDict(), f, indent=1, sort_keys=True);
+
+	def summary(self):
+		"""Human readable table of the phases, the slowest files of each, the counters and anything finish() kept"""
+		lines = ["Profile: %.3fs wall, %.3fs CPU" % (self.wall, self.cpu)];
+		lines.append("%-14s %8s %10s %10s" % ("phase", "calls", "wall s", "CPU s"));
+		for name, (calls, wall, cpu) in sorted(self.phases.items(), key=lambda item: -item[1][1]):
+			lines.append("%-14s %8d %10.4f %10.4f" % (name, calls, wall, cpu));
+			perFile = self.files.get(name, {});
+			if (len(perFile) > 1):
+				for fileName, (calls, wall, cpu) in sorted(perFile.items(), key=lambda item: -item[1][1])[:5]:
+					lines.append("%-14s %8d %10.4f %10.4f  %s" % ("", calls, wall, cpu, fileName));
+
+		for name in sorted(self.counters):
+			lines.append("%-30s %d" % (name, self.counters[name]));
+
+		for entry in self.extra.get('cProfile', []):
+			lines.append("%10.4f %10.4f %8d  %s" % (entry['cumtime'], entry['tottime'], entry['calls'], entry['function']));
+
+		memory = self.extra.get('tracemalloc');
+		if (memory is not None):
+			lines.append("Memory: %.1f MB peak" % (memory['peakBytes'] / (1024.0 * 1024.0)));
+			for entry in memory['top']:
+				lines.append("%10d KB  %s" % (entry['bytes'] // 1024, entry['line']));
+		return "\n".join(lines);
+
+
+class phase():
+	"""
+	with phase('parse', fileName): ... records the wall and CPU time of the block in the active Profile
+	Costs next to nothing when profiling is off
+	"""
+	__slots__ = ('name', 'fileName', 'wall', 'cpu');
+
+	def __init__(self, name, fileName=None):
+		self.name 		= name;
+		self.fileName 	= fileName;
+
+	def __enter__(self):
+		self.wall = None;
+		if (active is not None):
+			self.wall = time.time();
+			self.cpu = time.process_time();
+		return self;
+
+	def __exit__(self, excType, excValue, traceback):
+		if (active is not None and self.wall is not None):
+			active.add(self.name, self.fileName, time.time() - self.wall, time.process_time() - self.cpu);
+		return False;
+
+
+def count(name, n=1):
+	"""Add n to counter 'name' of the active Profile"""
+	if (active is not None):
+		active.count(name, n);
+
+
+def enable(cProfile=False, tracemalloc=False):
+	"""Start recording into a new Profile :: returns it"""
+	global active;
+	active = Profile();
+	if (tracemalloc):
+		active.startTracemalloc();
+	if (cProfile):
+		active.startCProfile();
+	return active;
+
+
+def disable():
+	"""Stop recording, the hooks go back to doing nothing"""
+	global active;
+	active = None;
+
+
+def isolated(function, *args):
+	"""
+	Run function(*args) recording into a fresh Profile :: returns (result, toDict() of that Profile or None when not profiling)
+	Used by pool jobs, whose process may have inherited the parent's Profile, so only the job's own work is sent back
+	"""
+	global active;
+	if (active is None):
+		return (function(*args), None);
+
+	outer = active;
+	active = Profile();
+	try:
+		result = function(*args);
+		return (result, active.toDict());
+	finally:
+		active = outer;
+
+
+def merge(data):
+	"""Add the toDict() of a Profile from another process to the active one"""
+	if (active is not None and data is not None):
+		active.merge(data);
@@ -0,0 +1,401 @@
+from __future__ import print_function
+import sys, os, glob, json, pickle, shlex, subprocess
+import multiprocessing, threading
+
+try:
+	from pycparser import c_ast, c_generator
+	from pycparser.c_parser import ParseError
+except ImportError:
+	print("Please install PyCParser");
+	sys.exit(1);
+
+from callSiteIndex import CallSiteIndex
+from parseCache import ParseCache, parseFile
+from identifierIndex import buildIdentifierIndex
+import profiler
+
+
+#cpp flags from a compile command that change what the preprocessor produces, and whether they take a path
+CPP_FLAGS = {'-I': True, '-isystem': True, '-iquote': True, '-include': True, '-D': False, '-U': False};
+
+
+class Project():
+	"""
+	Every C file of a project parsed into one AST and one cross-file CallSiteIndex
+	The AST and index of each file are kept too, so refresh() only has to parse the files that changed
+	A lazy project starts out with only an IdentifierIndex of the raw files; needFiles()/needCallers() parse
+	just the files a trace can reach, and the AST and index span only those
+	Threads can share a lazy project: loading holds its lock, and the merged AST and index are only swapped in once complete
+	"""
+	lazy = False;	#Also the default of Projects pickled before there were lazy ones
+
+	def __init__(self, path, cppArgs=(), lazy=False):
+		self.path 		= path;				#Directory or compile_commands.json the files come from
+		self.cppArgs 	= list(cppArgs);	#Extra cpp arguments for every file
+		self.lazy 		= lazy;
+		self.processes 	= None;				#Processes files are parsed with
+		self.identifiers = None;			#identifierIndex.IdentifierIndex of every file, lazy projects only
+		self.files 		= [];				#[(filename, cppArgs)] of every file we tried to parse, in order
+		self.failed 	= [];				#[(filename, error string)] of the files that did not parse
+
+		self.fileASTs 		= {};	# FileName: FileAST
+		self.fileIndexes 	= {};	# FileName: CallSiteIndex
+		self.stamps 		= {};	# FileName: (mtime, size) when it was parsed
+
+		self.ast 	= c_ast.FileAST([]);	#FileAST holding the top level nodes of every file
+		self.index 	= CallSiteIndex();		#CallSiteIndex across every file
+		self.lock 	= threading.RLock();	#Held while a lazy project loads files
+
+	def __getstate__(self):
+		#Locks don't pickle, the other side makes its own
+		state = self.__dict__.copy();
+		state.pop('lock', None);
+		return state;
+
+	def __setstate__(self, state):
+		self.__dict__.update(state);
+		self.lock = threading.RLock();
+
+	def resolveFile(self, filename):
+		"""The name a file has in the AST coords, so sinks can be given as relative or absolute paths"""
+		wanted = os.path.abspath(filename);
+		for name, cppArgs in self.files:
+			if (os.path.abspath(name) == wanted):
+				return name;
+		return filename;
+
+	def parse(self, files, processes=None, cache=None):
+		"""(Re)parse files ([(filename, cppArgs)]) into fileASTs/fileIndexes"""
+		for filename, fileAst, fileIndex, error in parseSourceFiles(files, processes, cache):
+			self.failed = [f for f in self.failed if f[0] != filename];
+			self.fileASTs.pop(filename, None);
+			self.fileIndexes.pop(filename, None);
+			self.stamps[filename] = fileStamp(filename);
+			if (error is not None):
+				print("ERROR: unable to parse " + filename + ": " + error);
+				self.failed.append( (filename, error) );
+				continue;
+			self.fileASTs[filename] = fileAst;
+			self.fileIndexes[filename] = fileIndex;
+
+	def needFiles(self, filenames, cache=None):
+		"""Lazy projects: parse whichever of filenames haven't been tried yet and merge them in :: returns how many were parsed"""
+		if (not self.lazy):
+			return 0;
+		with self.lock:
+			wanted = set(filenames);
+			files = [(filename, cppArgs) for filename, cppArgs in self.files if filename in wanted and filename not in self.stamps];
+			if (files):
+				self.parse(files, self.processes, cache);
+				self.merge();
+			return len(files);
+
+	def needCallers(self, function, cache=None):
+		"""
+		Lazy projects: parse every file that could hold a call on some call chain up to function, so its callers,
+		their callers and so on are all in the index :: returns how many files were parsed
+		The files are found a level of callers at a time in the IdentifierIndex
+		A function that may have its address taken can be called from anywhere, so that parses every file
+		"""
+		if (not self.lazy):
+			return 0;
+		with self.lock:
+			parsed = 0;
+			seen = set([function]);
+			level = [function];
+			while (level):
+				if (any(self.identifiers.addressTaken(name) for name in level)):
+					parsed += self.needFiles([filename for filename, cppArgs in self.files], cache);
+				else:
+					parsed += self.needFiles(self.identifiers.filesMentioning(level), cache);
+
+				callers = [];
+				for name in level:
+					for site in self.index.callSites(name):
+						caller = site.caller();
+						if (caller not in seen):
+							seen.add(caller);
+							callers.append(caller);
+				level = callers;
+			return parsed;
+
+	def merge(self):
+		"""Rebuild the project wide AST and CallSiteIndex from the per file ones"""
+		with profiler.phase('merge'):
+			self.mergeIndexes();
+
+	def mergeIndexes(self):
+		#Built aside, so a thread still tracing in the old AST and index never sees them half merged
+		ast = c_ast.FileAST([]);
+		index = CallSiteIndex();
+		for filename, cppArgs in self.files:
+			if (filename in self.fileIndexes):
+				ast.ext += self.fileASTs[filename].ext;
+				index.merge(self.fileIndexes[filename]);
+		#A pointer set in one file and called through in another only looks like one with every file's flows merged
+		index.findPointerCalls();
+		index.resolveIndirectCalls();
+		index.callGraph();
+		self.ast = ast;
+		self.index = index;
+
+	def refresh(self, processes=None, cache=None):
+		"""
+		Re-parse only the files added, removed or modified since they were last parsed
+		Returns (changed file names, names of the functions whose definition or callers changed)
+		"""
+		files = findSourceFiles(self.path, self.cppArgs);
+		current = set(filename for filename, cppArgs in files);
+		changed = [(filename, cppArgs) for filename, cppArgs in files if self.stamps.get(filename) != fileStamp(filename)];
+		removed = [filename for filename, cppArgs in self.files if filename not in current];
+		if (self.lazy):
+			#Files never parsed stay that way, their identifiers are only scanned again for the next needCallers()
+			for filename, cppArgs in changed:
+				self.identifiers.addFile(filename, cppArgs);
+			changed = [(filename, cppArgs) for filename, cppArgs in changed if filename in self.stamps];
+
+		before = {};
+		for filename, cppArgs in changed:
+			before[filename] = self.fileIndexes.get(filename);
+		for filename in removed:
+			before[filename] = self.fileIndexes.pop(filename, None);
+			self.fileASTs.pop(filename, None);
+			self.stamps.pop(filename, None);
+
+		self.files = files;
+		self.parse(changed, processes, cache);
+
+		affected = set();
+		for filename, oldIndex in before.items():
+			affected |= diffIndexes(oldIndex, self.fileIndexes.get(filename));
+
+		if (before):
+			#A function pointer set in one file and called through in another changes the callers of functions in neither
+			oldIndirect = indirectSignatures(self.index);
+			self.merge();
+			newIndirect = indirectSignatures(self.index);
+			for callee in set(oldIndirect) | set(newIndirect):
+				if (oldIndirect.get(callee) != newIndirect.get(callee)):
+					affected.add(callee);
+		return (set(before), affected);
+
+
+def fileStamp(filename):
+	"""(mtime, size) of a file, None if it is gone"""
+	try:
+		st = os.stat(filename);
+	except OSError:
+		return None;
+	return (st.st_mtime, st.st_size);
+
+
+def chainKey(astNode, conditionResult):
+	"""What a condition/loop node of a call chain looks like, without rendering its body"""
+	generator = c_generator.CGenerator();
+	parts = [astNode.__class__.__name__, conditionResult];
+	for name in ('cond', 'expr', 'init', 'next'):
+		child = getattr(astNode, name, None);
+		if (isinstance(child, c_ast.Node)):
+			parts.append(generator.visit(child));
+	return tuple(parts);
+
+
+def indexSignatures(index):
+	"""
+	(callers, definitions) of a file's CallSiteIndex, for diffIndexes
+	callers is callee name: frozenset of (caller, line, chain) of every call to it, definitions is function name: line
+	"""
+	callers = {};
+	for callee, sites in index.sites.items():
+		callers[callee] = frozenset((site.caller(), site.node.coord.line, tuple(chainKey(n, r) for n, r in site.chain)) for site in sites);
+	definitions = dict((name, funcDef.coord.line if funcDef.coord is not None else None) for name, funcDef in index.funcDefs.items());
+	return (callers, definitions);
+
+
+def indirectSignatures(index):
+	"""callee name: frozenset of (caller, file, line) of the indirect calls that may call it"""
+	callers = {};
+	for callee, sites in index.sites.items():
+		indirect = frozenset((site.caller(), site.node.coord.file, site.node.coord.line) for site in sites if site.indirect);
+		if (indirect):
+			callers[callee] = indirect;
+	return callers;
+
+
+def diffIndexes(oldIndex, newIndex):
+	"""Names of the functions whose definition or set of call sites differ between two versions of a file's index"""
+	oldCallers, oldDefinitions = indexSignatures(oldIndex) if oldIndex is not None else ({}, {});
+	newCallers, newDefinitions = indexSignatures(newIndex) if newIndex is not None else ({}, {});
+
+	affected = set();
+	for callee in set(oldCallers) | set(newCallers):
+		if (oldCallers.get(callee) != newCallers.get(callee)):
+			affected.add(callee);
+	for name in set(oldDefinitions) | set(newDefinitions):
+		if (oldDefinitions.get(name) != newDefinitions.get(name)):
+			affected.add(name);
+	return affected;
+
+
+def cppArgsFromCommand(entry):
+	"""Pulls the preprocessor flags out of one compile_commands.json entry, making include paths absolute"""
+	directory = entry.get('directory', '.');
+	if ('arguments' in entry):
+		tokens = list(entry['arguments']);
+	else:
+		tokens = shlex.split(entry.get('command', ''));
+
+	cppArgs = [];
+	i = 0;
+	while (i < len(tokens)):
+		token = tokens[i];
+		for flag, isPath in CPP_FLAGS.items():
+			if (not token.startswith(flag)):
+				continue;
+
+			#Either '-Ifoo' or '-I foo'
+			value = token[len(flag):];
+			if (not value and i + 1 < len(tokens)):
+				i += 1;
+				value = tokens[i];
+
+			if (isPath):
+				value = os.path.normpath(os.path.join(directory, value));
+			if (len(flag) == 2):
+				cppArgs.append(flag + value);
+			else:
+				cppArgs.extend([flag, value]);
+			break;
+		i += 1;
+
+	return cppArgs;
+
+
+def findSourceFiles(path, cppArgs=()):
+	"""
+	Returns [(filename, cppArgs)] for every C file of a project
+	path is either a directory (searched recursively for .c files) or a compile_commands.json
+	"""
+	if (os.path.isdir(path)):
+		files = sorted(glob.iglob(os.path.join(path, '**', '*.c'), recursive=True));
+		return [(os.path.normpath(f), list(cppArgs)) for f in files];
+
+	if (not os.path.isfile(path)):
+		print("ERROR (FATAL): no such file or directory " + path);
+		sys.exit(1);
+
+	files = [];
+	seen = set();
+	try:
+		with open(path) as f:
+			commands = json.load(f);
+		for entry in commands:
+			filename = os.path.normpath(os.path.join(entry.get('directory', '.'), entry['file']));
+			if (not filename.endswith('.c') or filename in seen):
+				continue;
+			seen.add(filename);
+			files.append( (filename, cppArgsFromCommand(entry) + list(cppArgs)) );
+	except (ValueError, KeyError, TypeError, AttributeError) as e:
+		#Not JSON, or not a list of {"directory", "file", "command"/"arguments"} entries
+		print("ERROR (FATAL): unable to read compile commands from " + path + ": " + str(e));
+		sys.exit(1);
+
+	return files;
+
+
+def parseSourceFile(job):
+	"""
+	Pool worker: preprocess and parse one C file, then index it
+	job is (filename, cppArgs, cacheDirectory, cacheMaxBytes), cacheDirectory None meaning no ParseCache
+	Returns ((filename, FileAST, CallSiteIndex, error, cacheStats), profile); the AST and index are pickled together so the index keeps pointing into the AST
+	profile is the toDict() of what the job recorded when profiling, None otherwise
+	"""
+	return profiler.isolated(parseOneFile, job);
+
+
+def parseSourceFilePickled(job):
+	"""
+	parseSourceFile for a pool worker, its result pickled here instead of by the pool
+	pickle recurses down the AST, so a file nested deeper than the recursion limit becomes an error for that file
+	where the pool would leave the parent waiting on a result that never comes
+	"""
+	(filename, ast, index, error, cacheStats), profile = parseSourceFile(job);
+	try:
+		return pickle.dumps( ((filename, ast, index, error, cacheStats), profile), pickle.HIGHEST_PROTOCOL);
+	except RecursionError:
+		error = "too deeply nested to send back from a worker process, parse it with --jobs 1";
+		return pickle.dumps( ((filename, None, None, error, cacheStats), profile), pickle.HIGHEST_PROTOCOL);
+
+
+def parseOneFile(job):
+	filename, cppArgs, cacheDirectory, cacheMaxBytes = job;
+	cache = None;
+	if (cacheDirectory is not None):
+		cache = ParseCache(cacheDirectory, cacheMaxBytes);
+
+	try:
+		if (cache is not None):
+			ast, index = cache.parse(filename, cppArgs=cppArgs);
+		else:
+			ast, index = parseFile(filename, cppArgs=cppArgs);
+	except (ParseError, subprocess.CalledProcessError, RuntimeError, OSError) as e:
+		return (filename, None, None, str(e), None);
+
+	return (filename, ast, index, None, cache.stats() if cache is not None else None);
+
+
+def parseSourceFiles(files, processes=None, cache=None):
+	"""
+	Parses [(filename, cppArgs)] in a multiprocessing pool :: returns [(filename, FileAST, CallSiteIndex, error)]
+	cache: a parseCache.ParseCache, files whose preprocessed source is unchanged are loaded from it instead of parsed
+	"""
+	if (not files):
+		return [];
+	jobs = [(filename, fileArgs, cache.directory if cache else None, cache.maxBytes if cache else None) for filename, fileArgs in files];
+
+	#Parsing is independent per file, so it is spread across every core unless told otherwise
+	if (processes is None):
+		processes = multiprocessing.cpu_count();
+	processes = max(1, min(processes, len(files)));
+
+	if (processes == 1):
+		results = [parseSourceFile(job) for job in jobs];
+	else:
+		pool = multiprocessing.Pool(processes);
+		try:
+			#Unpickling doesn't recurse, however deep the AST is
+			results = [pickle.loads(data) for data in pool.imap(parseSourceFilePickled, jobs, chunksize=1)];
+		finally:
+			pool.close();
+			pool.join();
+
+	parsed = [];
+	for (filename, fileAst, fileIndex, error, cacheStats), profile in results:
+		profiler.merge(profile);
+		if (cacheStats is not None):
+			cache.addStats(cacheStats);
+		parsed.append( (filename, fileAst, fileIndex, error) );
+	return parsed;
+
+
+def parseProject(path, processes=None, cppArgs=(), cache=None, lazy=False):
+	"""
+	Parses every C file of a directory or compile_commands.json in a multiprocessing pool
+	Returns a Project whose AST and CallSiteIndex span every file that parsed
+	cache: a parseCache.ParseCache, files whose preprocessed source is unchanged are loaded from it instead of parsed
+	lazy: only scan the files for identifiers, they are parsed when a trace needs them (see Project.needCallers)
+	"""
+	project = Project(path, cppArgs, lazy);
+	project.processes = processes;
+	project.files = findSourceFiles(path, cppArgs);
+	if (not project.files):
+		print("ERROR: no C files found in " + path);
+
+	if (lazy):
+		with profiler.phase('scan'):
+			project.identifiers = buildIdentifierIndex(project.files);
+		return project;
+
+	project.parse(project.files, processes, cache);
+	project.merge();
+	return project;
@@ -0,0 +1,42 @@
+from __future__ import print_function
+import sys
+
+from graphExport import exportCFG, exportAST
+
+
+def show(fileName, view):
+	"""Render the DOT file fileName with GraphViz and open it, unless headless"""
+	if (not view):
+		return;
+
+	#Rendering is kept out of main so computing a CFG never has to import GraphViz
+	try:
+		import graphviz as gv
+	except ImportError:
+		print("Please install GraphViz");
+		sys.exit(1);
+	gv.view(gv.render('dot', 'pdf', fileName));
+
+
+def visualize(fileName, rootNode, direction, strict=False, view=True, maxNodes=None, maxEdges=None, maxChildren=None):
+	"""Plots the tree starting at 'rootNode' is a visually pleasing format using GraphViz
+		fileName: the name of the file in which the visual of the graph will be stored
+		rootNode: the start of the graph to visualize
+		direction: do we display from start->vulnerability (0) or vulnerability->start (1)?
+		view: open the rendered graph, otherwise only the DOT source is written (headless, no Graphviz binaries needed)
+		maxNodes, maxEdges, maxChildren: limits of the drawing, see graphExport.walkGraph
+	"""
+	if (direction not in (0, 1)):
+		print("ERROR: incorrect direction to visualize: " + str(direction));
+		print("\tDirection should be 0 or 1");
+		return;
+
+	#Every node and edge is written once straight to the file, however many paths share it
+	exportCFG(rootNode, fileName, 'dot', direction, maxNodes=maxNodes, maxEdges=maxEdges, maxChildren=maxChildren);
+	show(fileName, view);
+
+
+def visualizeAST(rootNode, fileName, view=True, maxNodes=None, maxEdges=None, maxChildren=None):
+	"""Plots the AST starting at 'rootNode' using GraphViz, see visualize for view and the limits"""
+	exportAST(rootNode, "AST" + fileName, 'dot', maxNodes=maxNodes, maxEdges=maxEdges, maxChildren=maxChildren);
+	show("AST" + fileName, view);
@@ -0,0 +1,210 @@
+from __future__ import print_function
+import sys, os, json, signal, argparse
+import multiprocessing, socketserver
+
+# This is not required if you've installed pycparser into
+# your site-packages/ with setup.py
+sys.path.extend(['.', '..'])
+
+from main import AnalysisSession, IncrementalAnalysis
+from projectParser import parseProject, fileStamp
+from parseCache import ParseCache, DEFAULT_MAX_BYTES
+
+
+serverWorker = None;	#The ServerWorker of this process when it is a TraceServer pool worker
+
+
+class ServerWorker():
+	"""
+	The warm state of one server worker process: parsed ASTs, call-site indexes and the answers to queries already made
+	Files are re-parsed only when their mtime/size changes, so most queries never touch the parser
+	"""
+	def __init__(self, project=None, cache=None):
+		self.session 	= AnalysisSession(None, cache);					#Used when there is no project, keeps the AST of every file queried
+		self.analysis 	= IncrementalAnalysis(project, cache) if project is not None else None;
+		self.stamps 	= {};	# FileName: (mtime, size) of the AST in self.session
+		self.answers 	= {};	# (file, line, end, paths, maxDepth): response of a query
+
+	def refresh(self, filename, everything=False):
+		"""
+		Forget everything that came from filename if it changed since it was parsed
+		With a project the whole tree is only looked at again (globbed and stat'ed) if everything, or if filename itself changed
+		"""
+		if (self.analysis is not None):
+			project = self.analysis.project;
+			name = project.resolveFile(filename);
+			if (everything or project.stamps.get(name) != fileStamp(name)):
+				if (self.analysis.refresh(processes=1)):
+					self.answers = {};
+			return;
+
+		stamp = fileStamp(filename);
+		if (self.stamps.get(filename, stamp) != stamp):
+			self.session.asts.pop(filename, None);
+			self.answers = dict((key, answer) for key, answer in self.answers.items() if key[0] != filename);
+		self.stamps[filename] = stamp;
+
+	def query(self, request):
+		"""Answer one trace request, see TraceServer for what requests and responses look like"""
+		filename = request['file'];
+		lineNo = int(request['line']);
+		end = request.get('end');
+		paths = request.get('paths');
+		maxDepth = request.get('maxDepth');
+
+		self.refresh(filename, bool(request.get('refresh')));
+		key = (filename, lineNo, end, paths, maxDepth);
+		if (key not in self.answers):
+			session = self.session;
+			if (self.analysis is not None and end is None):
+				session = self.analysis.session;
+				root = self.analysis.analyze([(filename, lineNo)])[0][2];
+			else:
+				#A search from 'end' keeps fewer callers, so it can't share the incremental CFGs; the project's ASTs are still warm
+				if (self.analysis is not None):
+					session = AnalysisSession(self.analysis.project, session.cache);
+				root = session.parseForCFG(filename, lineNo, end);
+			if (root is None):
+				return {'error': "unable to retrieve node for " + filename + " line " + str(lineNo)};
+
+			answer = {'file': filename, 'line': lineNo, 'cfg': cfgToDict(root)};
+			if (paths is not None or end is not None):
+				answer['paths'] = tracePaths(session, filename, lineNo, end, paths, maxDepth);
+			self.answers[key] = answer;
+
+		return self.answers[key];
+
+
+def cfgToDict(root):
+	"""JSON friendly {'nodes': [...], 'edges': [[parent, child]]} of the CFG below root, every shared node listed once"""
+	nodes = [];
+	edges = [];
+	seen = set([root.id]);
+	queue = [root];
+	for node in queue:
+		info = node.info;
+		nodes.append({'id': node.id, 'function': node.function, 'file': info.file if info else None, 'line': info.line if info else None});
+		for child in node.children:
+			edges.append([node.id, child.id]);
+			if (child.id not in seen):
+				seen.add(child.id);
+				queue.append(child);
+	return {'root': root.id, 'nodes': nodes, 'edges': edges};
+
+
+def tracePaths(session, filename, lineNo, end, maxPaths, maxDepth):
+	"""The entry -> sink paths of a sink as strings, only the ones starting at the function 'end' if it is given"""
+	return [str(path) for path in session.iterPaths(filename, lineNo, maxDepth=maxDepth, maxPaths=(maxPaths or None), source=end)];
+
+
+def initServerWorker(project, cache):
+	"""Pool initializer: every worker keeps one ServerWorker for as long as the server runs"""
+	global serverWorker;
+	serverWorker = ServerWorker(project, cache);
+
+	#stdout may be the JSON-lines stream, so anything the analysis prints goes to stderr
+	sys.stdout = sys.stderr;
+
+
+def answerLine(line):
+	"""Pool job: one JSON request line -> one JSON response line"""
+	request = None;
+	try:
+		request = json.loads(line);
+		response = serverWorker.query(request);
+	except (ValueError, KeyError, TypeError) as e:
+		response = {'error': "bad request: " + str(e)};
+	except (IOError, OSError, RuntimeError) as e:
+		response = {'error': str(e)};
+	except (Exception, SystemExit) as e:
+		#Anything else (a file that doesn't parse, a fatal error in the analysis) is this request's problem only,
+		#letting it out would take the worker, and every request waiting on the pool, down with it
+		response = {'error': e.__class__.__name__ + ": " + str(e)};
+
+	if (isinstance(request, dict) and 'id' in request):
+		response = dict(response, id=request['id']);
+	return json.dumps(response);
+
+
+class TraceServer():
+	"""
+	Long running STFFA: answers trace requests out of a pool of warm worker processes
+	Requests and responses are one JSON object per line
+		request: {"id": anything, "file": "x.c", "line": 41, "end": "main", "paths": 10, "maxDepth": 20, "refresh": true}, only file and line are required
+		response: {"id": ..., "file": ..., "line": ..., "cfg": {"root": ..., "nodes": [...], "edges": [...]}, "paths": [...]} or {"id": ..., "error": "..."}
+	"paths" is only answered when paths or end is asked for; with end only the calls on paths from that function down to the sink are traced
+	With a project, files other than the one asked about are only checked for changes when "refresh" is true
+	"""
+	def __init__(self, workers=None, project=None, cache=None):
+		if (workers is None):
+			workers = multiprocessing.cpu_count();
+		self.pool = multiprocessing.Pool(max(1, workers), initializer=initServerWorker, initargs=(project, cache));
+
+	def close(self):
+		self.pool.close();
+		self.pool.join();
+
+	def serveStream(self, inStream, outStream):
+		"""Answer the requests of inStream in order on outStream, the pool works on many of them at once"""
+		lines = (line for line in inStream if line.strip());
+		for response in self.pool.imap(answerLine, lines, chunksize=1):
+			outStream.write(response + "\n");
+			outStream.flush();
+
+	def serveSocket(self, path):
+		"""Answer requests on a Unix socket, one thread per client handing its requests to the pool"""
+		pool = self.pool;
+
+		class Handler(socketserver.StreamRequestHandler):
+			def handle(self):
+				for line in self.rfile:
+					line = line.decode('utf-8');
+					if (not line.strip()):
+						continue;
+					self.wfile.write((pool.apply(answerLine, (line,)) + "\n").encode('utf-8'));
+					self.wfile.flush();
+
+		if (os.path.exists(path)):
+			os.remove(path);
+		server = socketserver.ThreadingUnixStreamServer(path, Handler);
+		server.daemon_threads = True;
+		try:
+			server.serve_forever();
+		finally:
+			server.server_close();
+			os.remove(path);
+
+
+if __name__ == "__main__":
+	parser = argparse.ArgumentParser(description="STFFA server: keeps ASTs, call-site indexes and CFGs warm and answers JSON-lines trace requests");
+	parser.add_argument('--socket', help="Listen on this Unix socket instead of reading requests from stdin");
+	parser.add_argument('--workers', type=int, default=None, help="Worker processes answering requests (default: one per core)");
+	parser.add_argument('--project', help="Directory or compile_commands.json; traces callers across every C file in it");
+	parser.add_argument('--jobs', type=int, default=None, help="Processes used to parse the project at startup (default: one per core)");
+	parser.add_argument('--cache-dir', help="Keep parsed ASTs in this directory and reuse them while the source is unchanged");
+	parser.add_argument('--cache-size', type=int, default=DEFAULT_MAX_BYTES // (1024 * 1024), help="Size cap of the parse cache in MB");
+	args = parser.parse_args();
+
+	cache = None;
+	if (args.cache_dir):
+		cache = ParseCache(args.cache_dir, args.cache_size * 1024 * 1024);
+
+	#The project is parsed once here and handed to every worker
+	project = None;
+	if (args.project):
+		project = parseProject(args.project, processes=args.jobs, cache=cache);
+		print("Project: " + str(len(project.files)) + " C files", file=sys.stderr);
+
+	server = TraceServer(args.workers, project, cache);
+
+	#kill should still remove the socket file
+	signal.signal(signal.SIGTERM, lambda signum, frame: sys.exit(0));
+	try:
+		if (args.socket):
+			server.serveSocket(args.socket);
+		else:
+			server.serveStream(sys.stdin, sys.stdout);
+	except KeyboardInterrupt:
+		pass;
+	finally:
+		server.close();
@@ -0,0 +1,94 @@
+from __future__ import print_function
+from collections import namedtuple
+
+
+#Calls worth tracing back from: category (what can go wrong) -> function names
+#A name ending in '*' matches every function starting with the rest of it
+DEFAULT_CATALOGUE = {
+	'overflow': ['strcpy', 'strcat', 'strncpy', 'strncat', 'stpcpy', 'wcscpy', 'wcscat', 'sprintf', 'vsprintf', 'gets', 'memcpy',
+				'memmove', 'scanf', 'sscanf', 'fscanf', 'vscanf', 'vsscanf', 'vfscanf', 'realpath', 'getwd', 'alloca'],
+	'format': ['syslog', 'vsyslog', 'vprintf', 'vfprintf', 'vsnprintf'],
+	'command': ['system', 'popen', 'execl', 'execle', 'execlp', 'execv', 'execve', 'execvp', 'execvpe', 'fexecve', 'dlopen'],
+	'race': ['tmpnam', 'tempnam', 'mktemp', 'chown', 'chmod'],
+};
+
+
+#One call of a catalogue function: where it is, the function it is in, what it calls and why that is a sink
+SinkHit = namedtuple('SinkHit', ['file', 'line', 'function', 'callee', 'category']);
+
+
+class Catalogue():
+	"""
+	The dangerous APIs to look for: a set of exact names, and a trie-like set of prefixes keyed by their length,
+	so matching a callee is a few set lookups however long the catalogue is
+	"""
+	def __init__(self, entries=None):
+		self.names 			= {};	# Name: category
+		self.prefixes 		= {};	# Prefix: category
+		self.prefixLengths 	= [];	#Lengths of every prefix, longest first
+		if (entries is None):
+			entries = [(name, category) for category, names in DEFAULT_CATALOGUE.items() for name in names];
+		for name, category in entries:
+			self.add(name, category);
+
+	def add(self, name, category=None):
+		if (name.endswith('*')):
+			self.prefixes[name[:-1]] = category;
+			self.prefixLengths = sorted(set(len(prefix) for prefix in self.prefixes), reverse=True);
+		else:
+			self.names[name] = category;
+
+	def match(self, callee):
+		"""(True, category) if callee is in the catalogue, (False, None) if it isn't"""
+		if (callee in self.names):
+			return (True, self.names[callee]);
+		for length in self.prefixLengths:
+			if (length <= len(callee) and callee[:length] in self.prefixes):
+				return (True, self.prefixes[callee[:length]]);
+		return (False, None);
+
+	def matching(self, names):
+		"""The names out of names that are in the catalogue"""
+		return [name for name in names if self.match(name)[0]];
+
+
+def readCatalogue(fileName):
+	"""Catalogue of a file with one 'name [category]' per line, '#' starting a comment"""
+	entries = [];
+	with open(fileName) as f:
+		for line in f:
+			parts = line.split('#', 1)[0].split();
+			if (not parts):
+				continue;
+			entries.append( (parts[0], parts[1] if len(parts) > 1 else None) );
+	return Catalogue(entries);
+
+
+def findSinks(index, catalogue, files=None):
+	"""
+	Every call to a catalogue function in a CallSiteIndex :: returns [SinkHit] sorted by file and line
+	Only the callees the index has are matched against the catalogue, so this never walks the AST
+	files: only keep the hits in these files (names as in the AST coords), None for all of them
+	Calls through function pointers that may reach a catalogue function are hits too
+	"""
+	hits = [];
+	for callee in catalogue.matching(index.sites):
+		category = catalogue.match(callee)[1];
+		for site in index.callSites(callee):
+			coord = site.node.coord;
+			if (coord is None or (files is not None and coord.file not in files)):
+				continue;
+			hits.append(SinkHit(coord.file, coord.line, site.caller(), callee, category));
+	hits.sort(key=lambda hit: (hit.file, hit.line, hit.callee));
+	return hits;
+
+
+def sinkLines(hits):
+	"""The (file, line) of every hit, once per line, in order: the sinks to hand to a batch trace"""
+	sinks = [];
+	seen = set();
+	for hit in hits:
+		if ((hit.file, hit.line) not in seen):
+			seen.add( (hit.file, hit.line) );
+			sinks.append( (hit.file, hit.line) );
+	return sinks;
@@ -0,0 +1,50 @@
+import os, sys, unittest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from parseCache import parseText
+from callGraph import labelMembers
+
+
+SOURCE = """
+void sink(void);
+void pong(int n);
+void ping(int n) { if (n) pong(n - 1); else sink(); }
+void pong(int n) { ping(n); }
+void start(void) { ping(3); }
+int main(void) { start(); pong(1); return 0; }
+void unused(void) { }
+"""
+
+
+class CallGraphTest(unittest.TestCase):
+	def setUp(self):
+		ast, self.index = parseText(SOURCE, 'graph.c');
+		self.graph = self.index.callGraph();
+
+	def test_recursion_cycle_is_one_component(self):
+		self.assertEqual(self.graph.componentOf('ping'), self.graph.componentOf('pong'));
+		self.assertEqual(self.graph.label('ping'), 'ping <-> pong');
+		self.assertEqual(labelMembers(self.graph.label('pong')), ['ping', 'pong']);
+		self.assertEqual(self.graph.label('start'), 'start');
+		self.assertIsNone(self.graph.componentOf('nosuch'));
+
+	def test_topological_order_puts_callers_first(self):
+		position = lambda name: self.graph.position[self.graph.componentOf(name)];
+		self.assertLess(position('main'), position('start'));
+		self.assertLess(position('start'), position('ping'));
+		self.assertLess(position('ping'), position('sink'));
+
+	def test_call_sites_into_a_cycle_come_from_outside_of_it(self):
+		callers = sorted(site.caller() for site in self.graph.callSitesInto(self.index, 'ping'));
+		self.assertEqual(callers, ['main', 'start']);
+
+	def test_may_reach(self):
+		self.assertTrue(self.graph.mayReach('main', 'sink'));
+		self.assertTrue(self.graph.mayReach('pong', 'ping'));
+		self.assertFalse(self.graph.mayReach('sink', 'main'));
+		self.assertFalse(self.graph.mayReach('nosuch', 'sink'));
+
+
+if __name__ == '__main__':
+	unittest.main();
@@ -0,0 +1,81 @@
+import os, sys, random, unittest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+import callMatrix
+from callMatrix import CallMatrix
+from parseCache import parseText
+
+
+def randomProgram(functions, calls, seed):
+	"""C source of functions f0 .. f<functions - 1> making 'calls' random calls (recursion included), plus calls to an undefined g :: returns (source, {caller: set of callees})"""
+	rng = random.Random(seed);
+	names = ["f" + str(i) for i in range(functions)];
+	callees = dict((name, set()) for name in names + ['g']);
+	callees['f0'].add('g');
+	for i in range(calls):
+		callees[rng.choice(names)].add(rng.choice(names + ['g']));
+
+	lines = ["void g(void);"] + ["void " + name + "(void);" for name in names];
+	for name in names:
+		lines.append("void " + name + "(void) { " + " ".join(callee + "();" for callee in sorted(callees[name])) + " }");
+	return ("\n".join(lines) + "\n", callees);
+
+
+def reachable(edges, start):
+	"""Every node a path of one or more edges leads to from start"""
+	found = set();
+	stack = list(edges[start]);
+	while (stack):
+		node = stack.pop();
+		if (node not in found):
+			found.add(node);
+			stack.extend(edges[node]);
+	return found;
+
+
+class CallMatrixTest(unittest.TestCase):
+	def check(self, functions, calls, seed):
+		source, callees = randomProgram(functions, calls, seed);
+		ast, index = parseText(source, 'random.c');
+		matrix = CallMatrix(index.callGraph());
+		functionIDs = matrix.graph.functionIDs;
+
+		callers = dict((name, set()) for name in callees);
+		for caller, names in callees.items():
+			for callee in names:
+				callers[callee].add(caller);
+		reaches = dict((name, reachable(callees, name)) for name in callees);
+		reachedBy = dict((name, reachable(callers, name)) for name in callees);
+		#An entry point is only called from inside of its own recursion cycle, if at all
+		entryPoints = [name for name in callees if reachedBy[name] <= reaches[name]];
+
+		self.assertEqual(sorted(functionIDs), sorted(callees));
+		for name, functionID in functionIDs.items():
+			expected = {
+				'fanIn': len(callers[name] - set([name])),
+				'fanOut': len(callees[name] - set([name])),
+				'reachedBy': len(reachedBy[name]),
+				'reaches': len(reaches[name]),
+				'entries': len([entry for entry in entryPoints if entry == name or name in reaches[entry]]),
+			};
+			found = dict((key, int(getattr(matrix, key)[functionID])) for key in expected);
+			self.assertEqual(found, expected, name + " of seed " + str(seed));
+
+	def test_random_graphs(self):
+		for seed in range(10):
+			self.check(30, 45, seed);
+
+	def test_random_graphs_in_small_chunks(self):
+		#Enough columns for several chunks and several words in each
+		chunk = callMatrix.COLUMN_CHUNK;
+		callMatrix.COLUMN_CHUNK = 70;
+		try:
+			for seed in range(3):
+				self.check(200, 260, seed);
+		finally:
+			callMatrix.COLUMN_CHUNK = chunk;
+
+
+if __name__ == '__main__':
+	unittest.main();
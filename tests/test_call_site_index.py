@@ -0,0 +1,28 @@
+import os, sys, unittest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from parseCache import parseText
+
+
+class CallSiteIndexTest(unittest.TestCase):
+	def test_deeply_nested_condition(self):
+		#1500 terms nest 1500 BinaryOps deep, well past the recursion limit
+		terms = " || ".join("x == " + str(i) for i in range(1500));
+		source = "void sink(void); void f(int x) { if (" + terms + ") sink(); }";
+		ast, index = parseText(source, 'nested.c');
+		sites = index.callSites('sink');
+		self.assertEqual([site.caller() for site in sites], ['f']);
+		self.assertEqual(len(sites[0].chain), 1);
+
+	def test_function_line_range(self):
+		source = "void sink(void);\nvoid f(int x)\n{\n\tif (x)\n\t\tsink();\n}\n";
+		ast, index = parseText(source, 'range.c');
+		self.assertEqual(index.enclosingFuncDef('range.c', 5).decl.name, 'f');
+		self.assertIsNone(index.enclosingFuncDef('range.c', 1));
+		self.assertEqual(index.lookupLine('range.c', 6), None);
+		self.assertEqual(index.lookupLine('range.c', 4)[1], 'f');
+
+
+if __name__ == '__main__':
+	unittest.main();
@@ -0,0 +1,90 @@
+import os, sys, shutil, subprocess, tempfile, unittest
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..');
+
+
+def run(*args):
+	"""(exit code, output lines) of main.py run on args, killed if it takes over two minutes"""
+	process = subprocess.Popen([sys.executable, os.path.join(ROOT, 'main.py'), '--headless'] + list(args), cwd=ROOT, stdout=subprocess.PIPE, stderr=subprocess.STDOUT, universal_newlines=True);
+	try:
+		output = process.communicate(timeout=120)[0];
+	except subprocess.TimeoutExpired:
+		process.kill();
+		process.communicate();
+		raise;
+	return (process.returncode, output.splitlines());
+
+
+class ErrorPathTest(unittest.TestCase):
+	def test_missing_file(self):
+		code, lines = run('nosuch.c', '3');
+		self.assertEqual(code, 1);
+		self.assertEqual([line for line in lines if 'ERROR' in line], ["ERROR (FATAL): no such file nosuch.c"]);
+
+	def test_line_outside_of_a_function(self):
+		code, lines = run('testCFile.c', '200');
+		self.assertEqual(code, 1);
+		self.assertEqual([line for line in lines if 'ERROR' in line], ["ERROR: unable to retrieve node for testCFile.c line 200"]);
+
+
+	def test_sink_without_a_line_number(self):
+		code, lines = run('--sink', 'testCFile.c');
+		self.assertEqual(code, 1);
+		self.assertEqual(lines, ["LineNumber should be an integer: testCFile.c"]);
+
+	def test_missing_sinks_file(self):
+		code, lines = run('--sinks', 'nosuch.txt');
+		self.assertEqual(code, 1);
+		self.assertEqual(lines, ["ERROR (FATAL): no such file nosuch.txt"]);
+
+
+	def test_missing_project(self):
+		code, lines = run('--project', 'nosuchdir', 'testCFile.c', '58');
+		self.assertEqual(code, 1);
+		self.assertEqual([line for line in lines if 'ERROR' in line], ["ERROR (FATAL): no such file or directory nosuchdir"]);
+
+	def test_malformed_compile_commands(self):
+		directory = tempfile.mkdtemp();
+		try:
+			commands = os.path.join(directory, 'compile_commands.json');
+			with open(commands, 'w') as f:
+				f.write('[{"file": "a.c",');
+			code, lines = run('--project', commands, 'testCFile.c', '58');
+		finally:
+			shutil.rmtree(directory);
+		self.assertEqual(code, 1);
+		errors = [line for line in lines if 'ERROR' in line];
+		self.assertEqual(len(errors), 1);
+		self.assertTrue(errors[0].startswith("ERROR (FATAL): unable to read compile commands from " + commands));
+
+
+class DeepProjectTest(unittest.TestCase):
+	def setUp(self):
+		self.directory = tempfile.mkdtemp();
+		#1500 terms nest 1500 BinaryOps deep, too deep for a worker process to pickle
+		terms = " || ".join("x == " + str(i) for i in range(1500));
+		files = {
+			'deep.c': "void sink(void);\nvoid f(int x) {\n\tif (" + terms + ") sink();\n}\n",
+			'main.c': "void sink(void) { }\nint main(void) {\n\tsink();\n\treturn 0;\n}\n",
+		};
+		for name, source in files.items():
+			with open(os.path.join(self.directory, name), 'w') as f:
+				f.write(source);
+
+	def tearDown(self):
+		shutil.rmtree(self.directory);
+
+	def test_deep_file_is_an_error_with_jobs(self):
+		code, lines = run('--project', self.directory, '--jobs', '2', os.path.join(self.directory, 'main.c'), '3');
+		self.assertEqual(code, 0);
+		self.assertIn("ERROR: unable to parse " + os.path.join(self.directory, 'deep.c') + ": too deeply nested to send back from a worker process, parse it with --jobs 1", lines);
+		self.assertIn("  main", lines);
+
+	def test_deep_file_traces_with_one_job(self):
+		code, lines = run('--project', self.directory, '--jobs', '1', os.path.join(self.directory, 'deep.c'), '3');
+		self.assertEqual(code, 0);
+		self.assertIn("  f", lines);
+
+
+if __name__ == '__main__':
+	unittest.main();
@@ -0,0 +1,67 @@
+import os, sys, unittest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from parseCache import parseText
+from feasibility import Feasibility
+
+
+def keptCallers(source, callee='sink'):
+	"""Callers of callee whose call Feasibility keeps, one entry per call"""
+	ast, index = parseText(source, 'feasibility.c');
+	feasibility = Feasibility();
+	return [site.caller() for site in index.callSites(callee) if feasibility.feasibleSite(site)];
+
+
+class FeasibilityTest(unittest.TestCase):
+	def test_constant_false_branch_is_pruned(self):
+		source = "void sink(void); void f(void) { int x = 1; if (x > 5) sink(); }";
+		self.assertEqual(keptCallers(source), []);
+
+	def test_constant_true_branch_is_kept(self):
+		source = "void sink(void); void f(void) { int x = 10; if (x > 5) sink(); }";
+		self.assertEqual(keptCallers(source), ['f']);
+
+	def test_float_is_not_folded_as_int(self):
+		#f/2 is 0.5 in C, integer division would make the branch look dead
+		source = "void sink(void); void f(void) { float f = 1; if (f/2 > 0) sink(); }";
+		self.assertEqual(keptCallers(source), ['f']);
+
+	def test_unsigned_wraps_around(self):
+		#u-1 is UINT_MAX in C
+		source = "void sink(void); void f(void) { unsigned u = 0; if (u-1 > 5) sink(); }";
+		self.assertEqual(keptCallers(source), ['f']);
+
+	def test_unsigned_constant_is_not_folded(self):
+		#-1 < 1u compares as unsigned, so it is false in C
+		source = "void sink(void); void f(void) { int x = -1; if (x < 1u) sink(); }";
+		self.assertEqual(keptCallers(source), ['f']);
+
+	def test_int_overflow_is_unknown(self):
+		source = "void sink(void); void f(void) { int x = 2147483647; if (x + 1 > 0) sink(); }";
+		self.assertEqual(keptCallers(source), ['f']);
+
+	def test_short_out_of_range_store_is_unknown(self):
+		source = "void sink(void); void f(void) { short s = 40000; if (s == 40000) sink(); }";
+		self.assertEqual(keptCallers(source), ['f']);
+
+	def test_block_local_shadowing_a_parameter(self):
+		#The x of the if is the parameter, the constant x went out of scope with its block
+		source = "void sink(void); void f(int x) { { int x = 1; } if (x > 5) sink(); }";
+		self.assertEqual(keptCallers(source), ['f']);
+
+	def test_block_local_shadowing_a_global(self):
+		source = "void sink(void); int g; void f(void) { { int g = 1; } if (g > 5) sink(); }";
+		self.assertEqual(keptCallers(source), ['f']);
+
+	def test_for_local_goes_out_of_scope(self):
+		source = "void sink(void); int i; void f(void) { for (int i = 9; i < 0; ) { } if (i < 5) sink(); }";
+		self.assertEqual(keptCallers(source), ['f']);
+
+	def test_block_local_is_known_inside_of_its_block(self):
+		source = "void sink(void); void f(int x) { { int x = 1; if (x > 5) sink(); } }";
+		self.assertEqual(keptCallers(source), []);
+
+
+if __name__ == '__main__':
+	unittest.main();
@@ -0,0 +1,97 @@
+import os, sys, json, shutil, tempfile, unittest
+import xml.etree.ElementTree as ElementTree
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from cfgGraph import CFGGraph
+from graphExport import exportCFG, exportAST
+from parseCache import parseText
+
+
+def ladder(rungs):
+	"""CFG of 'rungs' diamonds in a row, 2 ** rungs root -> leaf paths over 3 * rungs + 1 nodes :: returns its root"""
+	graph = CFGGraph();
+	root = top = graph.addNode("Line 1");
+	for i in range(rungs):
+		left, right, bottom = graph.addNode("left" + str(i)), graph.addNode("right" + str(i)), graph.addNode("join" + str(i));
+		top.add_child(left);
+		top.add_child(right);
+		left.add_child(bottom);
+		right.add_child(bottom);
+		top = bottom;
+	return root;
+
+
+class GraphExportTest(unittest.TestCase):
+	def setUp(self):
+		self.directory = tempfile.mkdtemp();
+
+	def tearDown(self):
+		shutil.rmtree(self.directory);
+
+	def export(self, root, fmt, **limits):
+		fileName = os.path.join(self.directory, 'cfg.' + fmt);
+		counts = exportCFG(root, fileName, fmt, **limits);
+		return (counts, fileName);
+
+	def test_every_node_and_edge_once(self):
+		#2 ** 20 paths, but only the 61 nodes and 80 edges are written
+		(counts, fileName) = self.export(ladder(20), 'json');
+		self.assertEqual(counts, (61, 80));
+		with open(fileName) as f:
+			cfg = json.load(f);
+		self.assertEqual(len(cfg['nodes']), 61);
+		self.assertEqual(len(set(node['id'] for node in cfg['nodes'])), 61);
+		self.assertEqual(len(set((edge['source'], edge['target']) for edge in cfg['edges'])), 80);
+
+	def test_edges_point_at_the_vulnerability_by_default(self):
+		(counts, fileName) = self.export(ladder(1), 'json');
+		with open(fileName) as f:
+			cfg = json.load(f);
+		labels = dict((node['id'], node['label']) for node in cfg['nodes']);
+		edges = set((labels[edge['source']], labels[edge['target']]) for edge in cfg['edges']);
+		self.assertEqual(edges, set([("left0", "Line 1"), ("right0", "Line 1"), ("join0", "left0"), ("join0", "right0")]));
+
+	def test_limits_collapse_into_summary_nodes(self):
+		(counts, fileName) = self.export(ladder(20), 'json', maxNodes=5);
+		with open(fileName) as f:
+			cfg = json.load(f);
+		labels = [node['label'] for node in cfg['nodes']];
+		self.assertEqual(len([label for label in labels if not label.endswith("not shown")]), 5);
+		self.assertIn("+1 not shown", labels);
+
+	def test_max_children(self):
+		(counts, fileName) = self.export(ladder(1), 'json', maxChildren=1);
+		with open(fileName) as f:
+			labels = [node['label'] for node in json.load(f)['nodes']];
+		self.assertEqual(labels, ["Line 1", "left0", "+1 not shown", "join0"]);
+
+	def test_graphml_and_dot(self):
+		(counts, fileName) = self.export(ladder(3), 'graphml');
+		graph = ElementTree.parse(fileName).getroot()[1];
+		self.assertEqual(len([e for e in graph if e.tag.endswith('node')]), 10);
+		self.assertEqual(len([e for e in graph if e.tag.endswith('edge')]), 12);
+
+		(counts, fileName) = self.export(ladder(3), 'dot');
+		with open(fileName) as f:
+			lines = f.read().splitlines();
+		self.assertEqual((lines[0], lines[-1]), ("digraph G {", "}"));
+		self.assertEqual(len([line for line in lines if ' -> ' in line]), 12);
+
+	def test_ast(self):
+		ast, index = parseText("int main(void) { return 0; }", 'export.c');
+		fileName = os.path.join(self.directory, 'ast.json');
+		#A tree: one node per AST node, one edge less
+		nodes = 0;
+		stack = [ast];
+		while (stack):
+			node = stack.pop();
+			nodes += 1;
+			stack.extend(child for name, child in node.children());
+		self.assertEqual(exportAST(ast, fileName, 'json'), (nodes, nodes - 1));
+		#FileAST, FuncDef and Decl, with a summary under each of the two whose children were cut
+		self.assertEqual(exportAST(ast, fileName, 'json', maxNodes=3), (5, 4));
+
+
+if __name__ == '__main__':
+	unittest.main();
@@ -0,0 +1,132 @@
+import os, sys, shutil, tempfile, unittest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from projectParser import parseProject
+from main import AnalysisSession, parseForCFGsParallel
+from benchmark import generateProgram, writeProgram
+from test_project import writeFiles
+
+
+FILES = {
+	'a.c': "void sink(const char *s);\n"
+		"void handler(int v);\n"
+		"void (*g_cb)(int) = handler;\n"
+		"int helper(int x) {\n"
+		"	if (x > 2) {\n"
+		"		sink(\"a\");\n"
+		"	}\n"
+		"	return x;\n"
+		"}\n"
+		"void ping(int n);\n"
+		"void pong(int n) {\n"
+		"	if (n) ping(n - 1);\n"
+		"	else sink(\"b\");\n"
+		"}\n",
+	'b.c': "int helper(int x);\n"
+		"void pong(int n);\n"
+		"extern void (*g_cb)(int);\n"
+		"void loop(int n) {\n"
+		"	while (n > 0) {\n"
+		"		helper(n);\n"
+		"		n--;\n"
+		"	}\n"
+		"}\n"
+		"void ping(int n) { pong(n); }\n"
+		"void handler(int v) {\n"
+		"	switch (v) {\n"
+		"	case 1: helper(v); break;\n"
+		"	default: loop(v);\n"
+		"	}\n"
+		"}\n"
+		"int main(void) { ping(3); g_cb(2); return 0; }\n",
+	'c.c': "int helper(int x);\n"
+		"void other(void) {\n"
+		"	int i;\n"
+		"	for (i = 0; i < 3; i++)\n"
+		"		helper(i);\n"
+		"}\n",
+};
+
+SINKS = [('a.c', 6), ('a.c', 13), ('b.c', 6), ('b.c', 13), ('c.c', 5)];
+
+
+def shape(root):
+	"""[(label, coord, child positions)] of every node of a CFG in breadth first order, None for a missing one"""
+	if (root is None):
+		return None;
+	graph = root.graph;
+	positions = {root.id: 0};
+	order = [root.id];
+	nodes = [];
+	for nodeID in order:
+		children = [int(child) for child in graph.childIDs(nodeID)];
+		for child in children:
+			if (child not in positions):
+				positions[child] = len(order);
+				order.append(child);
+		nodes.append( (graph.label(nodeID), graph.coord(nodeID), [positions[child] for child in children]) );
+	return nodes;
+
+
+class FlatWorkerParityTest(unittest.TestCase):
+	"""Worker processes tracing from the flat index have to make the CFGs a serial session makes from the project"""
+	def setUp(self):
+		self.directory = tempfile.mkdtemp();
+		writeFiles(self.directory, FILES);
+		self.project = parseProject(self.directory, processes=1);
+		self.sinks = [(os.path.join(self.directory, filename), lineNo) for filename, lineNo in SINKS];
+
+	def tearDown(self):
+		shutil.rmtree(self.directory);
+
+	def serial(self, source):
+		"""Each file's sinks in a session of their own, the way parseForCFGsParallel groups them"""
+		roots = {};
+		for filename in sorted(set(filename for filename, lineNo in self.sinks)):
+			group = [sink for sink in self.sinks if sink[0] == filename];
+			for filename, lineNo, root in AnalysisSession(self.project).parseForCFGs(group, source):
+				roots[(filename, lineNo)] = root;
+		return [shape(roots[sink]) for sink in self.sinks];
+
+	def parallel(self, source):
+		return [shape(root) for filename, lineNo, root in parseForCFGsParallel(self.sinks, workers=2, project=self.project, source=source)];
+
+	def test_same_cfgs(self):
+		expected = self.serial(None);
+		self.assertTrue(all(expected));
+		self.assertEqual(self.parallel(None), expected);
+
+	def test_same_cfgs_from_source(self):
+		self.assertEqual(self.parallel('main'), self.serial('main'));
+
+
+class LazyProjectThreadsTest(unittest.TestCase):
+	"""Thread workers all load files into the same lazy project as they trace"""
+	def setUp(self):
+		self.directory = tempfile.mkdtemp();
+		sources, sink = generateProgram(60, 3, 2, 2, 0.1, 6, 1);
+		writeProgram(self.directory, sources);
+		self.project = parseProject(self.directory, processes=1);
+		index = self.project.index;
+		calls = sorted(set((site.node.coord.file, site.node.coord.line) for sites in index.sites.values() for site in sites));
+		self.sinks = [(filename, lineNo) for filename, lineNo in calls if index.lookupLine(filename, lineNo)[1] is not None][::3];
+
+	def tearDown(self):
+		shutil.rmtree(self.directory);
+
+	def test_same_cfgs_as_a_parsed_project(self):
+		expected = [shape(root) for filename, lineNo, root in parseForCFGsParallel(self.sinks, workers=1, threads=True, project=self.project)];
+		lazy = parseProject(self.directory, processes=1, lazy=True);
+		#Switching threads as often as possible, so they load files in the middle of each other's traces
+		interval = sys.getswitchinterval();
+		sys.setswitchinterval(1e-6);
+		try:
+			roots = parseForCFGsParallel(self.sinks, workers=8, threads=True, project=lazy);
+		finally:
+			sys.setswitchinterval(interval);
+		self.assertEqual([shape(root) for filename, lineNo, root in roots], expected);
+
+
+if __name__ == '__main__':
+	unittest.main();
@@ -0,0 +1,41 @@
+import os, sys, shutil, tempfile, unittest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from parseCache import ParseCache
+
+
+SHALLOW = "void sink(void);\nvoid f(int x) { if (x == 1) sink(); }\n";
+#1500 terms nest 1500 BinaryOps deep, too deep to pickle
+DEEP = "void sink(void);\nvoid f(int x) { if (" + " || ".join("x == " + str(i) for i in range(1500)) + ") sink(); }\n";
+
+
+class ParseCacheTest(unittest.TestCase):
+	def setUp(self):
+		self.directory = tempfile.mkdtemp();
+		self.cache = ParseCache(os.path.join(self.directory, 'cache'));
+
+	def tearDown(self):
+		shutil.rmtree(self.directory);
+
+	def parse(self, source):
+		filename = os.path.join(self.directory, 'file.c');
+		with open(filename, 'w') as f:
+			f.write(source);
+		ast, index = self.cache.parse(filename);
+		return [site.caller() for site in index.callSites('sink')];
+
+	def test_unchanged_file_is_a_hit(self):
+		self.assertEqual(self.parse(SHALLOW), ['f']);
+		self.assertEqual(self.parse(SHALLOW), ['f']);
+		self.assertEqual((self.cache.hits, self.cache.misses, self.cache.uncacheable), (1, 1, 0));
+
+	def test_deep_condition_is_uncacheable(self):
+		self.assertEqual(self.parse(DEEP), ['f']);
+		self.assertEqual(self.parse(DEEP), ['f']);
+		self.assertEqual((self.cache.hits, self.cache.misses, self.cache.uncacheable), (0, 2, 2));
+		self.assertEqual(self.cache.entries(), []);
+
+
+if __name__ == '__main__':
+	unittest.main();
@@ -0,0 +1,95 @@
+import os, sys, random, unittest
+from collections import namedtuple
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from cfgGraph import CFGGraph, CFGCoord
+from pathStats import PathStats, RANKINGS, formatCount
+
+
+#Stands in for the AST node a CFG node is made from, only its coord (and the kind in it) is kept
+Located = namedtuple('Located', ['coord']);
+
+
+def randomCFG(nodes, edges, seed):
+	"""A random backward CFG (a DAG, edges only go to later nodes, some twice) of functions and If conditions :: returns its root"""
+	rng = random.Random(seed);
+	graph = CFGGraph();
+	cfg = [graph.addNode("Line 1")];
+	for i in range(1, nodes):
+		kind = rng.choice(['FuncDef', 'If']);
+		cfg.append(graph.addNode(kind + str(i), Located(CFGCoord('cfg.c', i, 0, kind))));
+	#Every node is below the root
+	for i in range(1, nodes):
+		cfg[rng.randrange(i)].add_child(cfg[i]);
+	for i in range(edges):
+		a = rng.randrange(nodes - 1);
+		cfg[a].add_child(cfg[rng.randrange(a + 1, nodes)]);
+	return cfg[0];
+
+
+def allPaths(root):
+	"""Every root -> leaf path as a list of node IDs, written out one by one"""
+	graph = root.graph;
+	paths = [];
+	stack = [[root.id]];
+	while (stack):
+		path = stack.pop();
+		children = [int(child) for child in graph.childIDs(path[-1])];
+		if (not children):
+			paths.append(path);
+		for child in children:
+			stack.append(path + [child]);
+	return paths;
+
+
+class PathStatsTest(unittest.TestCase):
+	def check(self, root):
+		stats = PathStats(root);
+		paths = allPaths(root);
+		self.assertEqual(stats.paths, len(paths));
+
+		for nodeID in stats.order:
+			self.assertEqual(stats.through(nodeID), len([path for path in paths if nodeID in path]));
+
+		leaves = dict((path[-1], 0) for path in paths);
+		for path in paths:
+			leaves[path[-1]] += 1;
+		self.assertEqual(sorted((node.id, count) for node, count in stats.entries()), sorted(leaves.items()));
+
+		def counts(path):
+			conditions = len([nodeID for nodeID in path[1:] if stats.isCondition[nodeID]]);
+			return {'calls': len(path) - 1 - conditions, 'conditions': conditions};
+		functions = [counts(path)['calls'] for path in paths];
+		self.assertEqual(stats.pathLengths(), (min(functions), max(functions)));
+
+		for rankBy, (primary, secondary) in RANKINGS.items():
+			best = sorted((counts(path)[primary], counts(path)[secondary]) for path in paths)[:5];
+			found = stats.topPaths(5, rankBy);
+			self.assertEqual([(getattr(path, primary), getattr(path, secondary)) for path in found], best);
+			for path in found:
+				#Entry point first
+				self.assertIn([node.id for node in reversed(path.nodes)], paths);
+
+	def test_random_cfgs(self):
+		for seed in range(20):
+			self.check(randomCFG(12, 18, seed));
+
+	def test_exponentially_many_paths(self):
+		graph = CFGGraph();
+		root = top = graph.addNode("Line 1");
+		for i in range(100):
+			bottom = graph.addNode("f" + str(i));
+			top.add_child(graph.addNode("a" + str(i)));
+			top.add_child(graph.addNode("b" + str(i)));
+			for node in top.children[-2:]:
+				node.add_child(bottom);
+			top = bottom;
+		stats = PathStats(root);
+		self.assertEqual(stats.paths, 2 ** 100);
+		self.assertEqual(formatCount(stats.paths), "1.267e+30");
+		self.assertEqual(len(stats.topPaths(3)), 3);
+
+
+if __name__ == '__main__':
+	unittest.main();
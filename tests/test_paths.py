@@ -0,0 +1,76 @@
+import os, sys, shutil, tempfile, types, unittest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from main import AnalysisSession
+
+
+SOURCE = """void sink(void);
+void c(int x) {
+	sink();
+}
+void a(int x) {
+	if (x)
+		c(x);
+}
+void b(int x) {
+	while (x > 0)
+		c(x--);
+}
+void r(int n) {
+	if (n) r(n - 1);
+	a(n);
+}
+int main(void) {
+	a(1);
+	b(2);
+	r(3);
+	return 0;
+}
+"""
+
+
+class IterPathsTest(unittest.TestCase):
+	def setUp(self):
+		self.directory = tempfile.mkdtemp();
+		self.filename = os.path.join(self.directory, 'paths.c');
+		with open(self.filename, 'w') as f:
+			f.write(SOURCE);
+		self.session = AnalysisSession();
+
+	def tearDown(self):
+		shutil.rmtree(self.directory);
+
+	def paths(self, **limits):
+		return [str(path) for path in self.session.iterPaths(self.filename, 3, **limits)];
+
+	def test_every_path_with_its_conditions(self):
+		self.assertEqual(self.paths(), [
+			"main -> r -> a -> if x :: True -> c -> Line 3",
+			"main -> a -> if x :: True -> c -> Line 3",
+			"main -> b -> while (x > 0) -> c -> Line 3",
+		]);
+
+	def test_paths_are_yielded_lazily(self):
+		paths = self.session.iterPaths(self.filename, 3);
+		self.assertIsInstance(paths, types.GeneratorType);
+		self.assertEqual(next(paths).functions(), ['main', 'r', 'a', 'c']);
+
+	def test_max_paths(self):
+		self.assertEqual(len(self.paths(maxPaths=2)), 2);
+
+	def test_max_depth_truncates(self):
+		self.assertEqual(self.paths(maxDepth=1), [
+			"a -> if x :: True -> c -> Line 3 (truncated)",
+			"b -> while (x > 0) -> c -> Line 3 (truncated)",
+		]);
+
+	def test_source(self):
+		self.assertEqual(self.paths(source='a'), ["a -> if x :: True -> c -> Line 3"]);
+
+	def test_spent_time_budget(self):
+		self.assertEqual(self.paths(timeBudget=0), []);
+
+
+if __name__ == '__main__':
+	unittest.main();
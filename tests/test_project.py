@@ -0,0 +1,76 @@
+import os, sys, io, pickle, shutil, tempfile, unittest, contextlib
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from projectParser import parseProject
+from main import IncrementalAnalysis
+
+
+def writeFiles(directory, files):
+	for name, source in files.items():
+		with open(os.path.join(directory, name), 'w') as f:
+			f.write(source);
+
+
+class CrossFilePointerTest(unittest.TestCase):
+	def setUp(self):
+		self.directory = tempfile.mkdtemp();
+
+	def tearDown(self):
+		shutil.rmtree(self.directory);
+
+	def test_pointer_set_in_one_file_called_in_another(self):
+		writeFiles(self.directory, {
+			'a.c': "void target(int v) { }\nvoid (*g_handler)(int);\nvoid install(void) { g_handler = target; }\n",
+			'b.c': "extern void (*g_handler)(int);\nvoid dispatch(int v) { g_handler(v); }\n",
+		});
+		project = parseProject(self.directory, processes=1);
+		index = project.index;
+		self.assertEqual(index.callSites('g_handler'), []);
+		sites = index.callSites('target');
+		self.assertEqual([site.caller() for site in sites], ['dispatch']);
+		self.assertTrue(sites[0].indirect);
+
+	def test_pickled_project_loads_files(self):
+		writeFiles(self.directory, {
+			'a.c': "void sink(void);\nvoid f(void) { sink(); }\n",
+			'b.c': "void f(void);\nint main(void) { f(); return 0; }\n",
+		});
+		project = pickle.loads(pickle.dumps(parseProject(self.directory, processes=1, lazy=True)));
+		project.needCallers('sink');
+		self.assertEqual([site.caller() for site in project.index.callSites('f')], ['main']);
+
+
+
+class IncrementalAnalysisTest(unittest.TestCase):
+	def setUp(self):
+		self.directory = tempfile.mkdtemp();
+		writeFiles(self.directory, {'a.c': "void sink(void);\nvoid f(void) {\n\tsink();\n}\n"});
+		self.filename = os.path.join(self.directory, 'a.c');
+
+	def tearDown(self):
+		shutil.rmtree(self.directory);
+
+	def analyze(self, analysis, sinks):
+		"""(roots, output lines) of analysis.analyze(sinks)"""
+		output = io.StringIO();
+		with contextlib.redirect_stdout(output):
+			results = analysis.analyze(sinks);
+		return ([root for filename, lineNo, root in results], output.getvalue().splitlines());
+
+	def test_failed_sink_is_traced_again(self):
+		analysis = IncrementalAnalysis(parseProject(self.directory, processes=1));
+		stateFile = os.path.join(self.directory, 'state');
+		error = "ERROR: unable to retrieve node for " + self.filename + " line 9";
+		for run in range(2):
+			roots, lines = self.analyze(analysis, [(self.filename, 3), (self.filename, 9)]);
+			self.assertIsNotNone(roots[0]);
+			self.assertIsNone(roots[1]);
+			self.assertEqual(lines, [error]);
+			analysis.save(stateFile);
+			analysis = IncrementalAnalysis.load(stateFile);
+		self.assertEqual(list(analysis.roots), [(self.filename, 3)]);
+
+
+if __name__ == '__main__':
+	unittest.main();
@@ -0,0 +1,26 @@
+import os, sys, unittest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from sinkScanner import Catalogue
+
+
+class CatalogueTest(unittest.TestCase):
+	def test_exec_family(self):
+		catalogue = Catalogue();
+		for name in ['execl', 'execle', 'execlp', 'execv', 'execve', 'execvp', 'execvpe']:
+			self.assertEqual(catalogue.match(name), (True, 'command'));
+
+	def test_exec_prefix_is_not_a_sink(self):
+		catalogue = Catalogue();
+		self.assertEqual(catalogue.match('executeQuery'), (False, None));
+		self.assertEqual(catalogue.match('exec'), (False, None));
+
+	def test_prefix_entry(self):
+		catalogue = Catalogue([('str*', 'overflow')]);
+		self.assertEqual(catalogue.match('strcpy'), (True, 'overflow'));
+		self.assertEqual(catalogue.match('memcpy'), (False, None));
+
+
+if __name__ == '__main__':
+	unittest.main();